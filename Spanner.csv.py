@@ -1,19 +1,46 @@
-import configparser
-import csv
 import os
 import subprocess
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from google.cloud import spanner
-from google.oauth2 import service_account
+from google.cloud.spanner_v1 import ExecuteSqlRequest
+import config_loader
+import output_writers
+import result_cache
+import spanner_partitioned
+import spanner_snapshot
+import sql_reader
+import telemetry
+import watermark
 
 # === VARIABLES TO CONFIGURE ===
 CONFIG_PATH = "../config/config.ini"
 SQL_FILE = "./Spanner.csv.sql"
 OUTPUT_DIR = "./output"
+OUTPUT_FORMAT = "csv"  # Options: "csv", "csv.gz", "csv.zst" or "parquet"
 EMAIL_RECIPIENT = 'recipient@example.com'  # Email recipient
 EMAIL_SENDER = 'sender@example.com'  # Email sender (set to '' to omit -r)
 EMAIL_SUBJECT = 'BigQuery SELECT Results'  # Email subject
+PROGRESS_EVERY_ROWS = 100000  # Log a progress line every N rows written
+PARTITIONED_MODE = False  # Export through query partitions of a batch snapshot
+PARTITION_WORKERS = 4  # Worker processes for partitioned exports
+MERGE_SHARDS = True  # Merge partition shard files into one file per query
+RESULT_CACHE_DIR = result_cache.DEFAULT_CACHE_DIR  # Shared on-disk result cache
+RESULT_CACHE_TTL = 300  # Seconds a cached result stays valid ("-- cache_ttl: N" overrides)
+RESULT_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used entries are evicted above this size
+RESULT_CACHE_BYPASS = False  # Always query Spanner and do not store results
+TELEMETRY_FILE = 'telemetry.jsonl'  # JSON record per statement is appended here ('' logs records only)
+QUERY_PROFILE = True  # Run queries in PROFILE mode so their query stats are recorded
+READ_MODE = "strong"  # "strong", "exact_staleness", "max_staleness" or "read_timestamp"
+STALENESS_SECONDS = 10  # Staleness bound of the exact_staleness and max_staleness read modes
+READ_TIMESTAMP = ""  # RFC 3339 timestamp of the read_timestamp read mode, e.g. "2024-01-31T23:59:59Z"
+QUERY_WORKERS = 4  # Queries running at once on the shared snapshot
+WRITE_METADATA = True  # Write <output file>.metadata.json recording the read timestamp
+WATERMARK_STATE_FILE = watermark.DEFAULT_STATE_FILE  # Last exported position of "-- watermark: column TYPE" queries
+WATERMARK_OUTPUT = "delta"  # New rows of incremental queries: "delta" writes a dated file, "append" adds to one file
 
 # === FUNCTIONS ===
 
@@ -22,55 +49,215 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 def read_config(path):
-    config = configparser.ConfigParser()
-    config.read(path)
-    return config
+    return config_loader.load_config(path, 'spanner')
 
 def get_spanner_client(config):
-    credentials_path = config['Spanner']['service_account_file']
-    credentials = service_account.Credentials.from_service_account_file(credentials_path)
-    client = spanner.Client(project=config['Spanner']['project_id'], credentials=credentials)
+    credentials = config_loader.load_credentials(config)
+    client = spanner.Client(project=config['project_id'], credentials=credentials)
     return client
 
+def get_database(client, config, pool=None):
+    """Return the configured Spanner database, optionally backed by a custom session pool."""
+    instance = client.instance(config['instance_id'])
+    return instance.database(config['database_id'], pool=pool)
+
+def get_target(config):
+    """Return the project/instance/database identifying the database in result cache keys."""
+    return {key: config[key] for key in ('project_id', 'instance_id', 'database_id')}
+
 def read_sql_file(filepath):
-    with open(filepath, 'r') as f:
-        content = f.read()
-    queries = [q.strip() for q in content.split(';') if q.strip()]
-    return queries
-
-def execute_queries(client, config, queries):
-    instance = client.instance(config['Spanner']['instance_id'])
-    database = instance.database(config['Spanner']['database_id'])
-
-    results = []
-    with database.snapshot() as snapshot:
-        for idx, query in enumerate(queries):
-            print(f"Executing query {idx + 1}: {query}")
-            result = snapshot.execute_sql(query)
-            columns = result.metadata.row_type.fields
-            rows = list(result)
-            results.append((idx + 1, columns, rows))
-    return results
-
-def write_results_to_csvs(results):
+    # Split on semicolons outside strings, comments and scripting blocks; statements are read as they run
+    return sql_reader.iter_statements(filepath)
+
+def read_options():
+    """Return the Database.snapshot options of READ_MODE."""
+    return spanner_snapshot.snapshot_options(READ_MODE, STALENESS_SECONDS, READ_TIMESTAMP)
+
+def execute_query(snapshot, query_num, query, target, cache=None, recorder=None, watermarks=None):
+    """
+    Start one query on snapshot and return (query_number, columns, rows, cache_entry, record, mark).
+    
+    rows iterates the live StreamedResultSet. A query with a fresh result
+    cache entry is not executed; columns and rows are None. record is the
+    query's telemetry record, finished by write_result; with QUERY_PROFILE the
+    query stats are added once all rows were read. With a WatermarkStore, a
+    query declaring "-- watermark: column TYPE" only reads the rows past its
+    stored position; mark is its Watermark (None for other queries), advanced
+    by write_result. Incremental queries bypass the result cache.
+    """
+    recorder = recorder or telemetry.Recorder('Spanner.csv')
+    query_mode = ExecuteSqlRequest.QueryMode.PROFILE if QUERY_PROFILE else ExecuteSqlRequest.QueryMode.NORMAL
+    record = recorder.start_statement(query_num, query)
+    try:
+        mark = watermarks.prepare(query, target) if watermarks is not None else None
+        if mark is not None:
+            watermark.check_output_mode(WATERMARK_OUTPUT, OUTPUT_FORMAT)
+    except ValueError as e:
+        recorder.finish(record, e)
+        raise
+    entry = None
+    if cache is not None and mark is None:
+        # The read mode is part of the key: a stale or pinned read is not the same result as a strong one
+        entry = cache.lookup(query, target, read_options(), fmt=OUTPUT_FORMAT)
+        if entry.hit:
+            print(f"Query {query_num} served from result cache")
+            record.status = 'cached'
+            return query_num, None, None, entry, record, None
+    sql = mark.sql if mark is not None else query
+    print(f"Executing query {query_num}: {sql}")
+    try:
+        result = snapshot.execute_sql(sql, query_mode=query_mode)
+        # Result metadata only arrives with the first response, so pull one row first
+        rows = iter(result)
+        first_row = next(rows, None)
+    except Exception as e:
+        recorder.finish(record, e)
+        raise
+    columns = result.fields
+    if first_row is not None:
+        rows = chain([first_row], rows)
+    return query_num, columns, _with_query_stats(rows, result, record), entry, record, mark
+
+def execute_queries(database, target, queries, cache=None, recorder=None, watermarks=None):
+    """
+    Execute queries one at a time on a shared snapshot, yielding each result as it streams.
+    
+    Yields the tuples of execute_query with the snapshot's read timestamp
+    appended. Each item must be consumed before the next one is requested,
+    so only the rows currently in flight are held in memory.
+    """
+    with spanner_snapshot.shared_snapshot(database, read_options()) as (snapshot, read_timestamp):
+        for idx, query in enumerate(queries, 1):
+            yield execute_query(snapshot, idx, query, target, cache, recorder, watermarks) + (read_timestamp,)
+
+def _with_query_stats(rows, result, record):
+    """Pass rows through and copy the query stats into record once the result set is exhausted."""
+    yield from rows
+    record.add_spanner_stats(result)
+
+def write_result(result, timestamp, cache=None, recorder=None):
+    """
+    Write one result of execute_queries to its output file and return the file name.
+    
+    With WRITE_METADATA, a metadata file next to the output records the read
+    timestamp (unknown for results restored from the cache).
+    """
+    query_num, columns, rows, entry, record, mark, read_timestamp = result
+    recorder = recorder or telemetry.Recorder('Spanner.csv')
+    extension = output_writers.output_extension(OUTPUT_FORMAT)
+    append = mark is not None and WATERMARK_OUTPUT == "append"
+    if append:
+        filename = watermark.output_filename(mark.key, extension)
+    else:
+        filename = f"query_{query_num}_{timestamp}{extension}"
+    full_path = os.path.join(OUTPUT_DIR, filename)
+    record.output_file = full_path
+    if entry is not None and entry.hit:
+        cache.restore(entry, full_path)
+        if WRITE_METADATA:
+            spanner_snapshot.write_metadata(full_path, None, cached=True, query=record.statement)
+        recorder.finish(record)
+        print(f"Saved: {full_path} (from cache)")
+        return full_path
+    start = time.monotonic()
+    row_count = 0
+    headers = [field.name for field in columns]
+    arrow_schema = output_writers.arrow_schema_from_spanner(columns) if OUTPUT_FORMAT == 'parquet' else None
+    try:
+        if mark is not None:
+            mark.bind(headers)
+        with output_writers.RowWriter(full_path, OUTPUT_FORMAT, headers, arrow_schema, append=append) as writer:
+            for row in rows:
+                if mark is not None:
+                    mark.observe(row)
+                writer.write_row(row)
+                row_count += 1
+                if row_count % PROGRESS_EVERY_ROWS == 0:
+                    log_progress(query_num, row_count, start)
+    except Exception as e:
+        record.rows = row_count
+        recorder.finish(record, e)
+        raise
+    record.rows = row_count
+    if mark is not None:
+        mark.commit()
+    if WRITE_METADATA:
+        spanner_snapshot.write_metadata(full_path, read_timestamp, read_mode=READ_MODE, query=record.statement,
+                                        rows=row_count)
+    recorder.finish(record)
+    log_progress(query_num, row_count, start, done=True)
+    print(f"Saved: {full_path}")
+    if entry is not None:
+        cache.store(entry, full_path)
+    return full_path
+
+def write_results_to_csvs(results, cache=None, recorder=None):
+    """Write the results of execute_queries one after the other and return the output files."""
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_files = []
-
-    for idx, (query_num, columns, rows) in enumerate(results):
-        filename = f"query_{query_num}_{timestamp}.csv"
-        full_path = os.path.join(OUTPUT_DIR, filename)
-        with open(full_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            headers = [field.name for field in columns]
-            writer.writerow(headers)
-            for row in rows:
-                writer.writerow(row)
-        csv_files.append(full_path)
-        print(f"Saved: {full_path}")
+    return [write_result(result, timestamp, cache, recorder) for result in results]
+
+def export_queries(database, target, queries, cache=None, recorder=None, watermarks=None, workers=QUERY_WORKERS):
+    """
+    Run up to workers queries at once on one shared snapshot and write each to its output file.
     
+    Every query reads at the same timestamp, so all files of a run reflect
+    the same point in time. Each worker streams its own result set, so memory
+    stays bounded by the rows in flight.
+    
+    Returns:
+        list: Output files in query order
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with spanner_snapshot.shared_snapshot(database, read_options()) as (snapshot, read_timestamp):
+        def export(item):
+            idx, query = item
+            result = execute_query(snapshot, idx, query, target, cache, recorder, watermarks)
+            return write_result(result + (read_timestamp,), timestamp, cache, recorder)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(export, enumerate(queries, 1)))
+
+def export_queries_partitioned(config, queries, recorder=None, database=None):
+    """
+    Export every query through Spanner query partitions in a process pool.
+    
+    All partitions read from one batch snapshot at the READ_MODE timestamp,
+    so every file reflects the same read timestamp. Each partition is written
+    to its own shard file; shards are merged into one file per query when
+    MERGE_SHARDS is set. The batch snapshot begins on database (default: a
+    new client from config); the worker processes connect from config.
+    """
+    database = database or get_database(get_spanner_client(config), config)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    exports = []
+    for idx, query in enumerate(queries):
+        if watermark.parse_directive(query):
+            logger.warning(f"Watermark directive of query {idx + 1} is ignored in PARTITIONED_MODE; "
+                           f"it exports all rows")
+        print(f"Executing query {idx + 1} (partitioned): {query}")
+        filename = f"query_{idx + 1}_{timestamp}{output_writers.output_extension(OUTPUT_FORMAT)}"
+        exports.append((query, os.path.join(OUTPUT_DIR, filename)))
+
+    batch_snapshot, read_timestamp = spanner_snapshot.begin_batch_snapshot(database, read_options())
+    output_files = spanner_partitioned.export_queries(database, config, exports, PARTITION_WORKERS, MERGE_SHARDS,
+                                                      OUTPUT_FORMAT, recorder, batch_snapshot=batch_snapshot)
+    csv_files = [path for files in output_files for path in files]
+    for path in csv_files:
+        if WRITE_METADATA:
+            spanner_snapshot.write_metadata(path, read_timestamp, read_mode=READ_MODE, partitioned=True)
+        print(f"Saved: {path}")
     return csv_files
 
+def log_progress(query_num, row_count, start, done=False):
+    """Log rows written so far and the rows per second for one query."""
+    elapsed = time.monotonic() - start
+    rate = row_count / elapsed if elapsed > 0 else 0.0
+    state = "finished" if done else "in progress"
+    logger.info(f"Query {query_num} {state}: {row_count} rows written in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
 def send_email(csv_files, recipient, sender, subject):
     """Send email with CSV files as attachments using Linux mail command."""
     try:
@@ -107,10 +294,21 @@ def send_email(csv_files, recipient, sender, subject):
         
 def main():
     config = read_config(CONFIG_PATH)
-    client = get_spanner_client(config)
     queries = read_sql_file(SQL_FILE)
-    results = execute_queries(client, config, queries)
-    csv_files = write_results_to_csvs(results)
+    recorder = telemetry.Recorder('Spanner.csv', TELEMETRY_FILE)
+    try:
+        if PARTITIONED_MODE:
+            csv_files = export_queries_partitioned(config, queries, recorder)
+        else:
+            client = get_spanner_client(config)
+            cache = result_cache.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES,
+                                             RESULT_CACHE_TTL, RESULT_CACHE_BYPASS)
+            watermarks = watermark.WatermarkStore(WATERMARK_STATE_FILE)
+            csv_files = export_queries(get_database(client, config), get_target(config), queries, cache, recorder,
+                                       watermarks)
+            cache.log_summary()
+    finally:
+        recorder.log_summary()
     send_email(csv_files, EMAIL_RECIPIENT, EMAIL_SENDER, EMAIL_SUBJECT)
 
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+import datetime
+import time
+
+try:
+    import pyarrow
+except ImportError:  # Only needed by the Storage Read API fakes
+    pyarrow = None
+
+# Column types of synthetic tables, repeated to reach the requested width
+COLUMN_TYPES = ('INT64', 'STRING', 'FLOAT64', 'TIMESTAMP', 'BOOL')
+
+_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+def column_types(width):
+    """Return the types of a synthetic table with width columns."""
+    return [COLUMN_TYPES[i % len(COLUMN_TYPES)] for i in range(width)]
+
+def synthetic_row(number, types):
+    """Return a deterministic row of values for the given column types."""
+    row = []
+    for position, type_ in enumerate(types):
+        if type_ == 'INT64':
+            row.append(number * 31 + position)
+        elif type_ == 'STRING':
+            row.append(f"value-{number:08d}-{position}")
+        elif type_ == 'FLOAT64':
+            row.append(number / 7 + position)
+        elif type_ == 'TIMESTAMP':
+            row.append(_EPOCH + datetime.timedelta(seconds=number))
+        else:
+            row.append(number % 2 == 0)
+    return row
+
+class FakeSchemaField:
+    """BigQuery SchemaField stand-in."""
+
+    def __init__(self, name, field_type):
+        self.name = name
+        self.field_type = field_type
+        self.mode = 'NULLABLE'
+        self.fields = ()
+
+class FakeRow:
+    """BigQuery Row stand-in."""
+
+    def __init__(self, names, values):
+        self._names = names
+        self._values = values
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return zip(self._names, self._values)
+
+class FakeRowIterator:
+    """BigQuery RowIterator stand-in that generates rows page by page, like tabledata.list."""
+
+    def __init__(self, rows, width, page_size):
+        self.total_rows = rows
+        self._types = column_types(width)
+        self.schema = [FakeSchemaField(f"col_{i}", type_) for i, type_ in enumerate(self._types)]
+        self._page_size = page_size
+
+    @property
+    def pages(self):
+        names = [field.name for field in self.schema]
+        for start in range(0, self.total_rows, self._page_size):
+            yield [FakeRow(names, synthetic_row(n, self._types))
+                   for n in range(start, min(start + self._page_size, self.total_rows))]
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+class FakeTableReference:
+    """BigQuery TableReference stand-in."""
+
+    def __init__(self, project, dataset_id, table_id):
+        self.project = project
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+
+class FakeQueryJob:
+    """
+    BigQuery QueryJob stand-in; DML statements report affected rows, queries return synthetic rows.
+
+    Queries have an anonymous destination table, so their results can also
+    be read through FakeBigQueryReadClient.
+    """
+
+    def __init__(self, sql, job_config, rows, width, page_size, latency, project='benchmark'):
+        self.sql = sql
+        self.query = sql
+        self.job_id = f"fake_{id(self):x}"
+        self.total_bytes_processed = rows * width * 8
+        self.total_bytes_billed = self.total_bytes_processed
+        self.slot_millis = 0
+        self.cache_hit = False
+        self._rows = rows
+        self._width = width
+        self._page_size = page_size
+        self._latency = latency
+        self._dry_run = getattr(job_config, 'dry_run', False)
+        is_dml = sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'MERGE'))
+        self.num_dml_affected_rows = 1 if is_dml else None
+        self.destination = None
+        if not is_dml and not self._dry_run:
+            self.destination = FakeTableReference(project, '_anonymous', f"anon_{self.job_id}")
+
+    def result(self, page_size=None, **kwargs):
+        if not self._dry_run and self._latency:
+            time.sleep(self._latency)
+        if self.num_dml_affected_rows is not None:
+            return FakeRowIterator(0, self._width, self._page_size)
+        return FakeRowIterator(self._rows, self._width, page_size or self._page_size)
+
+class FakeBigQueryClient:
+    """
+    BigQuery Client stand-in serving synthetic results of a configurable size.
+
+    Every query returns rows x width values in pages of page_size rows; every
+    job takes latency seconds to finish.
+    """
+
+    def __init__(self, rows=100000, width=10, page_size=10000, latency=0.0, project='benchmark'):
+        self.project = project
+        self.rows = rows
+        self.width = width
+        self.page_size = page_size
+        self.latency = latency
+
+    def query(self, sql, job_config=None, **kwargs):
+        return FakeQueryJob(sql, job_config, self.rows, self.width, self.page_size, self.latency, self.project)
+
+def arrow_schema(width):
+    """Return the pyarrow schema of a synthetic table with width columns."""
+    arrow_types = {'INT64': pyarrow.int64(), 'STRING': pyarrow.string(), 'FLOAT64': pyarrow.float64(),
+                   'TIMESTAMP': pyarrow.timestamp('us', tz='UTC'), 'BOOL': pyarrow.bool_()}
+    return pyarrow.schema([(f"col_{i}", arrow_types[type_]) for i, type_ in enumerate(column_types(width))])
+
+class _FakeArrowSchema:
+    def __init__(self, schema):
+        self.serialized_schema = schema.serialize().to_pybytes()
+
+class FakeReadStream:
+    """Storage API ReadStream stand-in serving every stream_count-th batch of a synthetic table."""
+
+    def __init__(self, name, number, stream_count):
+        self.name = name
+        self.number = number
+        self.stream_count = stream_count
+
+class FakeReadSession:
+    """Storage API ReadSession stand-in."""
+
+    def __init__(self, table, schema, streams):
+        self.table = table
+        self.arrow_schema = _FakeArrowSchema(schema)
+        self.streams = streams
+
+class _FakeArrowPage:
+    def __init__(self, batch):
+        self._batch = batch
+
+    def to_arrow(self):
+        return self._batch
+
+class _FakeReadRowsIterable:
+    def __init__(self, pages):
+        self.pages = pages
+
+class _FakeReadRowsStream:
+    def __init__(self, pages):
+        self._pages = pages
+
+    def rows(self, session):
+        return _FakeReadRowsIterable(self._pages)
+
+class FakeBigQueryReadClient:
+    """
+    BigQueryReadClient stand-in serving synthetic tables as Arrow record batches.
+
+    Every table has rows x width values (the same rows FakeBigQueryClient
+    returns) cut into batches of batch_rows rows. A session gets up to
+    max_stream_count streams; stream n serves batches n, n + streams, ...
+    so a single stream returns the rows in order. Requested sessions are
+    kept in sessions.
+    """
+
+    def __init__(self, rows=100000, width=10, batch_rows=10000):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required by FakeBigQueryReadClient")
+        self.rows = rows
+        self.width = width
+        self.batch_rows = batch_rows
+        self.schema = arrow_schema(width)
+        self.sessions = []
+
+    def create_read_session(self, parent, read_session, max_stream_count=0):
+        table = read_session['table'] if isinstance(read_session, dict) else read_session.table
+        batch_count = -(-self.rows // self.batch_rows)
+        stream_count = max(1, min(max_stream_count or batch_count, batch_count))
+        streams = [FakeReadStream(f"{table}/streams/{n}", n, stream_count) for n in range(stream_count)]
+        session = FakeReadSession(table, self.schema, streams)
+        self.sessions.append((parent, table, max_stream_count, session))
+        return session
+
+    def _stream(self, name):
+        for _, _, _, session in self.sessions:
+            for stream in session.streams:
+                if stream.name == name:
+                    return stream
+        raise KeyError(f"Unknown read stream {name}")
+
+    def read_rows(self, name, offset=0):
+        stream = self._stream(name)
+        types = column_types(self.width)
+        starts = range(stream.number * self.batch_rows, self.rows, stream.stream_count * self.batch_rows)
+        pages = (
+            _FakeArrowPage(pyarrow.RecordBatch.from_pylist(
+                [dict(zip(self.schema.names, synthetic_row(n, types)))
+                 for n in range(start, min(start + self.batch_rows, self.rows))],
+                schema=self.schema
+            ))
+            for start in starts
+        )
+        return _FakeReadRowsStream(pages)
+
+class _TypeCode:
+    def __init__(self, name):
+        self.name = name
+
+class _SpannerType:
+    def __init__(self, code):
+        self.code = _TypeCode(code)
+
+class FakeSpannerField:
+    """Spanner StructType.Field stand-in."""
+
+    def __init__(self, name, code):
+        self.name = name
+        self.type_ = _SpannerType(code)
+
+class FakeStreamedResultSet:
+    """Spanner StreamedResultSet stand-in; fields are only set once iteration starts, as with the real one."""
+
+    def __init__(self, rows, width):
+        self._rows = rows
+        self._types = column_types(width)
+        self.fields = None
+        self.stats = None
+
+    def __iter__(self):
+        self.fields = [FakeSpannerField(f"col_{i}", type_) for i, type_ in enumerate(self._types)]
+        for n in range(self._rows):
+            yield synthetic_row(n, self._types)
+
+class FakeSnapshot:
+    def __init__(self, database):
+        self._database = database
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def begin(self):
+        self._transaction_read_timestamp = datetime.datetime.now(datetime.timezone.utc)
+        return b'fake-transaction'
+
+    def execute_sql(self, sql, **kwargs):
+        return FakeStreamedResultSet(self._database.rows, self._database.width)
+
+class FakeBatchUpdateStatus:
+    code = 0
+    message = ''
+
+class FakeTransaction:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def batch_update(self, statements):
+        if self._latency:
+            time.sleep(self._latency)
+        return FakeBatchUpdateStatus(), [1] * len(statements)
+
+class FakeSpannerDatabase:
+    """
+    Spanner Database stand-in serving synthetic results of a configurable size.
+
+    Queries return rows x width values; partitioned DML and batch_update
+    calls take latency seconds and report one affected row per statement.
+    """
+
+    def __init__(self, rows=100000, width=10, latency=0.0):
+        self.rows = rows
+        self.width = width
+        self.latency = latency
+
+    def snapshot(self, **kwargs):
+        return FakeSnapshot(self)
+
+    def execute_partitioned_dml(self, statement, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return 1
+
+    def run_in_transaction(self, func, *args, **kwargs):
+        return func(FakeTransaction(self.latency), *args, **kwargs)
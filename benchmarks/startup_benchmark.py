@@ -0,0 +1,56 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Repository root, added to PYTHONPATH of every measured interpreter
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Measured startups: name -> code run by a fresh interpreter
+CASES = {
+    'interpreter only': "pass",
+    'eager (all command scripts)': (
+        "import report_cli\n"
+        "for command, backend in report_cli.COMMAND_SCRIPTS:\n"
+        "    report_cli.load_command(command, backend)"
+    ),
+    'lazy dml --backend bigquery': "import report_cli; report_cli.load_command('dml', 'bigquery')",
+    'lazy pdml --backend spanner': "import report_cli; report_cli.load_command('pdml', 'spanner')",
+    'lazy query --backend bigquery': "import report_cli; report_cli.load_command('query', 'bigquery')",
+}
+
+def time_startup(python, code, runs, work_dir):
+    """Run code in a fresh interpreter runs times and return the wall times in seconds."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        # Scripts that configure file logging create their log files in work_dir
+        subprocess.run([python, '-c', code], cwd=work_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI startup time with eager and lazy imports.")
+    parser.add_argument('--runs', type=int, default=10, help="Interpreter starts per case")
+    parser.add_argument('--python', default=sys.executable, help="Interpreter to measure")
+    args = parser.parse_args()
+
+    print(f"{'Case':<32}  {'min ms':>8}  {'median ms':>9}  {'max ms':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, code in CASES.items():
+            try:
+                timings = time_startup(args.python, code, args.runs, work_dir)
+            except subprocess.CalledProcessError as e:
+                error = e.stderr.decode(errors='replace').strip().splitlines()
+                print(f"{name:<32}  failed: {error[-1] if error else e}")
+                continue
+            ms = [t * 1000 for t in timings]
+            print(f"{name:<32}  {min(ms):>8.1f}  {statistics.median(ms):>9.1f}  {max(ms):>8.1f}")
+
+if __name__ == "__main__":
+    main()
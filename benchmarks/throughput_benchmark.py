@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Repository root, added to sys.path of every measured interpreter
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+# Stored results that later runs are compared against
+DEFAULT_BASELINES = os.path.join(BENCHMARK_DIR, 'baselines.json')
+# Allowed relative regression before a case fails
+DEFAULT_TOLERANCE = 0.25
+# Tables the DML statements are spread over, so the parallel executors have independent work
+DML_TABLES = 50
+
+def load(filename):
+    """Load a report script the way report_cli does."""
+    import config_loader
+    return config_loader.load_script(filename)
+
+def output_size(path):
+    """Return the total size in bytes of the files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def write_config(work_dir, section):
+    """Write a config file for scripts that read one; the credentials file is never opened."""
+    path = os.path.join(work_dir, 'benchmark_config.ini')
+    with open(path, 'w') as f:
+        f.write(f"[{section}]\nproject_id = benchmark\ninstance_id = benchmark\ndatabase_id = benchmark\n"
+                f"dataset_id = benchmark\ncredentials_path = {os.path.join(work_dir, 'unused.json')}\n")
+    return path
+
+def write_dml_file(work_dir, statements):
+    """Write a one-statement-per-line DML file spread over DML_TABLES tables."""
+    path = os.path.join(work_dir, 'benchmark_dml.txt')
+    with open(path, 'w') as f:
+        for n in range(statements):
+            f.write(f"UPDATE `@dataset@.table_{n % DML_TABLES}` SET amount = {n} WHERE id = {n}\n")
+    return path
+
+def bench_bigquery_export(args, work_dir, out_dir):
+    """bigQ.csv.py execute_select_statements on one synthetic query."""
+    from fake_backends import FakeBigQueryClient
+    script = load('bigQ.csv.py')
+    script.OUTPUT_DIR = out_dir
+    script.OUTPUT_FORMAT = args.format
+    client = FakeBigQueryClient(args.rows, args.width, args.page_size, args.latency)
+    script.execute_select_statements(client, [(1, 'SELECT * FROM benchmark.synthetic')])
+    return args.rows
+
+def bench_bigquery_storage_export(args, work_dir, out_dir):
+    """bigQ.csv.py execute_select_statements reading the results through the Storage Read API fake."""
+    from fake_backends import FakeBigQueryClient, FakeBigQueryReadClient
+    script = load('bigQ.csv.py')
+    script.OUTPUT_DIR = out_dir
+    script.OUTPUT_FORMAT = args.format
+    client = FakeBigQueryClient(args.rows, args.width, args.page_size, args.latency)
+    read_client = FakeBigQueryReadClient(args.rows, args.width, args.page_size)
+    script.execute_select_statements(client, [(1, 'SELECT * FROM benchmark.synthetic')], read_client)
+    return args.rows
+
+def bench_bigquery_query(args, work_dir, out_dir):
+    """bigQ_query.py query_bigquery with a fake client."""
+    from fake_backends import FakeBigQueryClient
+    import output_writers
+    script = load('bigQ_query.py')
+    script.CONFIG_FILE = write_config(work_dir, 'bigquery')
+    script.QUERY = 'SELECT * FROM benchmark.synthetic'
+    script.OUTPUT_FILE = os.path.join(out_dir, f"result{output_writers.output_extension(args.format)}")
+    script.OUTPUT_FORMAT = args.format
+    script.RESULT_CACHE_DIR = os.path.join(work_dir, 'cache')
+    script.RESULT_CACHE_BYPASS = True
+    script.query_bigquery(FakeBigQueryClient(args.rows, args.width, args.page_size, args.latency))
+    return args.rows
+
+def bench_spanner_export(args, work_dir, out_dir):
+    """Spanner.csv.py execute_queries and write_results_to_csvs on one synthetic query."""
+    from fake_backends import FakeSpannerDatabase
+    script = load('Spanner.csv.py')
+    script.OUTPUT_DIR = out_dir
+    script.OUTPUT_FORMAT = args.format
+    database = FakeSpannerDatabase(args.rows, args.width, args.latency)
+    results = script.execute_queries(database, {}, ['SELECT * FROM synthetic'])
+    script.write_results_to_csvs(results)
+    return args.rows
+
+def bench_spanner_query(args, work_dir, out_dir):
+    """spanner_query.py query_spanner with a fake database."""
+    from fake_backends import FakeSpannerDatabase
+    import output_writers
+    script = load('spanner_query.py')
+    script.CONFIG_FILE = write_config(work_dir, 'spanner')
+    script.QUERY = 'SELECT * FROM synthetic'
+    script.OUTPUT_FILE = os.path.join(out_dir, f"result{output_writers.output_extension(args.format)}")
+    script.OUTPUT_FORMAT = args.format
+    script.RESULT_CACHE_DIR = os.path.join(work_dir, 'cache')
+    script.RESULT_CACHE_BYPASS = True
+    script.query_spanner(FakeSpannerDatabase(args.rows, args.width, args.latency))
+    return args.rows
+
+def bench_bigquery_dml(args, work_dir, out_dir):
+    """bigQ_dml_exec.py run_dml_file, including the dry-run pre-flight."""
+    from fake_backends import FakeBigQueryClient
+    script = load('bigQ_dml_exec.py')
+    script.JOURNAL_FILE = os.path.join(work_dir, 'journal.db')
+    failures = script.run_dml_file(FakeBigQueryClient(0, args.width, args.page_size, args.latency),
+                                   'benchmark', 'benchmark', write_dml_file(work_dir, args.statements))
+    if failures:
+        raise RuntimeError(f"{failures} statement(s) failed")
+    return args.statements
+
+def bench_spanner_dml(args, work_dir, out_dir):
+    """spanner_partDML_exec.py run_dml_file as parallel partitioned DML."""
+    from fake_backends import FakeSpannerDatabase
+    script = load('spanner_partDML_exec.py')
+    script.JOURNAL_FILE = os.path.join(work_dir, 'journal.db')
+    results = script.run_dml_file(FakeSpannerDatabase(0, args.width, args.latency),
+                                  write_dml_file(work_dir, args.statements))
+    failures = sum(1 for result in results if result[3] is not None)
+    if failures:
+        raise RuntimeError(f"{failures} statement(s) failed")
+    return args.statements
+
+# Benchmark cases: name -> (function, unit of the throughput)
+CASES = {
+    'bigquery-export': (bench_bigquery_export, 'rows'),
+    'bigquery-storage-export': (bench_bigquery_storage_export, 'rows'),
+    'bigquery-query': (bench_bigquery_query, 'rows'),
+    'spanner-export': (bench_spanner_export, 'rows'),
+    'spanner-query': (bench_spanner_query, 'rows'),
+    'bigquery-dml': (bench_bigquery_dml, 'statements'),
+    'spanner-dml': (bench_spanner_dml, 'statements'),
+}
+
+def case_params(args, name):
+    """Return the parameters a case's result depends on; baselines only apply to equal parameters."""
+    if CASES[name][1] == 'statements':
+        return {'statements': args.statements, 'latency': args.latency}
+    return {'rows': args.rows, 'width': args.width, 'page_size': args.page_size,
+            'latency': args.latency, 'format': args.format}
+
+def peak_rss_mib():
+    """Return the peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def run_case_in_process(name, args, result_file):
+    """Run one case in this (fresh) interpreter and write its measurements as JSON to result_file."""
+    sys.path[:0] = [REPO_DIR, BENCHMARK_DIR]
+    func, unit = CASES[name]
+    with tempfile.TemporaryDirectory() as work_dir:
+        out_dir = os.path.join(work_dir, 'output')
+        os.makedirs(out_dir)
+        # Scripts that configure file logging create their log files in work_dir
+        os.chdir(work_dir)
+        start = time.perf_counter()
+        items = func(args, work_dir, out_dir)
+        elapsed = time.perf_counter() - start
+        result = {
+            'items': items,
+            'unit': unit,
+            'seconds': elapsed,
+            'items_per_sec': items / elapsed if elapsed > 0 else 0.0,
+            'peak_rss_mib': peak_rss_mib(),
+            'output_bytes': output_size(out_dir),
+        }
+    with open(result_file, 'w') as f:
+        json.dump(result, f)
+
+def run_case(name, args):
+    """Run one case in a fresh interpreter, so peak RSS covers that case only."""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_file = f.name
+    try:
+        command = [args.python, os.path.abspath(__file__), '--run-case', name, '--result-file', result_file,
+                   '--rows', str(args.rows), '--width', str(args.width), '--page-size', str(args.page_size),
+                   '--statements', str(args.statements), '--latency', str(args.latency), '--format', args.format]
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            error = process.stderr.decode(errors='replace').strip().splitlines()
+            raise RuntimeError(error[-1] if error else f"exit status {process.returncode}")
+        with open(result_file, 'r') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_file)
+
+def compare(result, baseline, tolerance):
+    """Return the regressions of a result against its baseline, as messages."""
+    regressions = []
+    if result['items_per_sec'] < baseline['items_per_sec'] * (1 - tolerance):
+        regressions.append(f"throughput {result['items_per_sec']:,.0f} < baseline {baseline['items_per_sec']:,.0f}")
+    if result['peak_rss_mib'] > baseline['peak_rss_mib'] * (1 + tolerance):
+        regressions.append(f"peak RSS {result['peak_rss_mib']:.1f} MiB > baseline {baseline['peak_rss_mib']:.1f} MiB")
+    if abs(result['output_bytes'] - baseline['output_bytes']) > baseline['output_bytes'] * tolerance:
+        regressions.append(f"output {result['output_bytes']} bytes vs baseline {baseline['output_bytes']}")
+    return regressions
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('cases', {})
+
+def save_baselines(path, baselines):
+    with open(path, 'w') as f:
+        json.dump({'cases': baselines}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Measure throughput, peak RSS and output size of the report "
+                                                 "scripts against fake BigQuery and Spanner backends.")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help="Cases to run")
+    parser.add_argument('--rows', type=int, default=200000, help="Rows returned by each query")
+    parser.add_argument('--width', type=int, default=10, help="Columns per row")
+    parser.add_argument('--page-size', type=int, default=10000, help="Rows per BigQuery result page")
+    parser.add_argument('--statements', type=int, default=2000, help="Statements per DML file")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds each fake job or DML call takes")
+    parser.add_argument('--format', default='csv', help="Output format of the query and export cases")
+    parser.add_argument('--python', default=sys.executable, help="Interpreter to measure")
+    parser.add_argument('--baselines', default=DEFAULT_BASELINES, help="Baseline results file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative regression against the baselines")
+    parser.add_argument('--update-baselines', action='store_true', help="Store this run's results as baselines")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.run_case:
+        run_case_in_process(args.run_case, args, args.result_file)
+        return 0
+
+    baselines = load_baselines(args.baselines)
+    failed = False
+    print(f"{'Case':<23}  {'Throughput':>14}  {'Unit':<10}  {'Peak RSS MiB':>12}  {'Output bytes':>12}  Baseline")
+    for name in args.cases:
+        try:
+            result = run_case(name, args)
+        except RuntimeError as e:
+            print(f"{name:<23}  failed: {e}")
+            failed = True
+            continue
+        result['params'] = case_params(args, name)
+        baseline = baselines.get(name)
+        if args.update_baselines:
+            baselines[name] = result
+            verdict = 'updated'
+        elif baseline is None:
+            verdict = 'no baseline'
+        elif baseline.get('params') != result['params']:
+            verdict = 'not compared (different parameters)'
+        else:
+            regressions = compare(result, baseline, args.tolerance)
+            verdict = 'REGRESSION: ' + '; '.join(regressions) if regressions else 'ok'
+            failed = failed or bool(regressions)
+        print(f"{name:<23}  {result['items_per_sec']:>14,.0f}  {result['unit'] + '/s':<10}  "
+              f"{result['peak_rss_mib']:>12.1f}  {result['output_bytes']:>12}  {verdict}")
+
+    if args.update_baselines:
+        save_baselines(args.baselines, baselines)
+        print(f"Baselines written to {args.baselines}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,46 @@
-import configparser
 import os
-import pandas as pd
 import subprocess
+import time
 from google.cloud import bigquery
 from google.api_core import exceptions
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import chain
+import bq_dry_run
+import bq_storage
+import config_loader
+import output_writers
+import result_cache
+import sql_reader
+import telemetry
+import watermark
 
 # Configuration variables
 CONFIG_FILE_PATH = 'config.ini'  # Path to the config file
 SQL_FILE_PATH = '/path/to/your/select_statements.sql'  # Path to the SQL file
-OUTPUT_DIR = '/home/user/project/output'  # Directory for CSV files
+OUTPUT_DIR = '/home/user/project/output'  # Directory for output files
+OUTPUT_FORMAT = 'csv'  # Options: 'csv', 'csv.gz', 'csv.zst' or 'parquet'
 EMAIL_RECIPIENT = 'recipient@example.com'  # Email recipient
 EMAIL_SENDER = 'sender@example.com'  # Email sender (set to '' to omit -r)
 EMAIL_SUBJECT = 'BigQuery SELECT Results'  # Email subject
+CONCURRENT_MODE = True  # Submit all statements up front instead of one at a time
+MAX_CONCURRENT_QUERIES = 4  # Maximum number of query jobs running at once
+PAGE_SIZE = 10000  # Rows fetched per result page when streaming results
+ECHO_ROWS = 0  # Rows per statement echoed to the console (0 disables echoing)
+USE_STORAGE_API = False  # Download results as Arrow over the BigQuery Storage Read API
+STORAGE_API_MAX_STREAMS = 4  # Parallel Storage API read streams per result
+RESULT_CACHE_DIR = result_cache.DEFAULT_CACHE_DIR  # Shared on-disk result cache
+RESULT_CACHE_TTL = 300  # Seconds a cached result stays valid ("-- cache_ttl: N" overrides)
+RESULT_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used entries are evicted above this size
+RESULT_CACHE_BYPASS = False  # Always query BigQuery and do not store results
+DRY_RUN_PREFLIGHT = True  # Dry-run every statement and report estimated bytes before executing anything
+MAXIMUM_BYTES_BILLED = 0  # Bytes budget per statement, checked by dry run and set on every job (0 = no limit)
+MAXIMUM_BYTES_PER_RUN = 0  # Estimated bytes budget for all statements of a run (0 = no limit)
+OVER_BUDGET_ACTION = 'refuse'  # 'refuse' aborts the run before anything executes, 'skip' drops those statements
+TELEMETRY_FILE = 'telemetry.jsonl'  # JSON record per statement is appended here ('' logs records only)
+WATERMARK_STATE_FILE = watermark.DEFAULT_STATE_FILE  # Last exported position of "-- watermark: column TYPE" statements
+WATERMARK_OUTPUT = 'delta'  # New rows of incremental statements: 'delta' writes a dated file, 'append' adds to one file
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,47 +49,113 @@ logger = logging.getLogger(__name__)
 def load_config(config_file):
     """Load configuration from config.ini file."""
     try:
-        config = configparser.ConfigParser()
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Config file {config_file} not found")
-        
-        config.read(config_file)
-        return {
-            'project_id': config['bigquery']['project_id'],
-            'credentials_path': config['bigquery']['credentials_path']
-        }
+        return config_loader.load_config(config_file, 'bigquery')
     except Exception as e:
         logger.error(f"Error loading config file: {e}")
         raise
 
 def read_sql_file(file_path):
-    """Read SQL statements from a file."""
+    """
+    Return an iterator over the SQL statements of a file.
+    
+    The file is read lazily, so execution starts before a large file has been read.
+    """
     try:
-        with open(file_path, 'r') as file:
-            # Split statements by semicolon, remove empty statements
-            sql_statements = [stmt.strip() for stmt in file.read().split(';') if stmt.strip()]
-        return sql_statements
+        with open(file_path, 'r'):
+            pass  # Fail early if the file cannot be opened
+        # Split on semicolons outside strings, comments and scripting blocks
+        return sql_reader.iter_statements(file_path)
     except Exception as e:
         logger.error(f"Error reading SQL file {file_path}: {e}")
         raise
 
-def save_to_csv(result_rows, query_index):
-    """Save query results to a CSV file with date in filename."""
+def new_output_filename(query_index, mark=None):
+    """
+    Return a dated output file name for a statement, creating the output directory.
+    
+    Incremental statements (mark set) in 'append' WATERMARK_OUTPUT mode always
+    get the same file, named after the statement.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)  # Create directory if it doesn't exist
+    extension = output_writers.output_extension(OUTPUT_FORMAT)
+    if mark is not None and WATERMARK_OUTPUT == 'append':
+        return os.path.join(OUTPUT_DIR, watermark.output_filename(mark.key, extension))
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')  # Format: YYYYMMDD_HHMMSS
+    return os.path.join(OUTPUT_DIR, f"query_result_{query_index}_{timestamp}{extension}")
+
+def save_results(results, query_index, echo_rows=ECHO_ROWS, mark=None):
+    """
+    Stream query results to an OUTPUT_FORMAT file with date in filename, one page at a time.
+    
+    Only the current page (and, for Parquet, the current row group) is held in
+    memory, so peak memory does not depend on the number of rows returned.
+    The file is created when the first row arrives.
+    
+    Args:
+        results: RowIterator returned by QueryJob.result()
+        query_index (int): Statement number used in the file name
+        echo_rows (int): Number of leading rows to print to the console
+        mark (Watermark): Tracks the watermark of an incremental statement's rows
+        
+    Returns:
+        tuple: Output file name (None for an empty result set), number of rows written
+    """
+    filename = None
+    writer = None
+    try:
+        for page in results.pages:
+            for row in page:
+                if writer is None:
+                    filename = new_output_filename(query_index, mark)
+                    columns = [field.name for field in results.schema]
+                    arrow_schema = None
+                    if OUTPUT_FORMAT == 'parquet':
+                        arrow_schema = output_writers.arrow_schema_from_bigquery(results.schema)
+                    if mark is not None:
+                        mark.bind(columns)
+                    writer = output_writers.RowWriter(filename, OUTPUT_FORMAT, columns, arrow_schema,
+                                                      append=mark is not None and WATERMARK_OUTPUT == 'append')
+                if writer.rows_written < echo_rows:
+                    print(dict(row.items()))
+                values = row.values()
+                if mark is not None:
+                    mark.observe(values)
+                writer.write_row(values)
+        
+        if writer is None:
+            logger.info(f"Statement {query_index}: no rows to save (empty result set or non-SELECT statement)")
+            return None, 0
+        
+        writer.close()
+        logger.info(f"Saved {writer.rows_written} rows to {filename}")
+        return filename, writer.rows_written
+    except Exception as e:
+        if writer is not None:
+            writer.close()
+        logger.error(f"Error saving results: {e}")
+        raise
+
+def save_arrow_results(schema, batches, query_index):
+    """
+    Write Arrow record batches from the Storage API to an OUTPUT_FORMAT file with date in filename.
+    
+    Returns:
+        tuple: Output file name (None for an empty result set), number of rows written
+    """
     try:
-        if not result_rows:
-            logger.info("No rows to save to CSV")
-            return None
-        
-        # Create DataFrame and save to CSV
-        df = pd.DataFrame(result_rows)
-        os.makedirs(OUTPUT_DIR, exist_ok=True)  # Create directory if it doesn't exist
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')  # Format: YYYYMMDD_HHMMSS
-        csv_filename = os.path.join(OUTPUT_DIR, f"query_result_{query_index}_{timestamp}.csv")
-        df.to_csv(csv_filename, index=False)
-        logger.info(f"Saved results to {csv_filename}")
-        return csv_filename
+        batches = (batch for batch in batches if batch.num_rows)
+        first_batch = next(batches, None)
+        if first_batch is None:
+            logger.info(f"Statement {query_index}: no rows to save (empty result set)")
+            return None, 0
+        
+        filename = new_output_filename(query_index)
+        rows_written = output_writers.write_arrow_batches(chain([first_batch], batches), schema,
+                                                          filename, OUTPUT_FORMAT)
+        logger.info(f"Saved {rows_written} rows to {filename} (Storage API)")
+        return filename, rows_written
     except Exception as e:
-        logger.error(f"Error saving to CSV: {e}")
+        logger.error(f"Error saving results: {e}")
         raise
 
 def send_email(csv_files, recipient, sender, subject):
@@ -99,39 +192,151 @@ def send_email(csv_files, recipient, sender, subject):
         logger.error(f"Error sending email: {e}")
         raise
 
-def execute_select_statements(client, sql_statements):
-    """Execute SQL statements in BigQuery, save to CSV, and print results."""
+def run_preflight(client, sql_statements, watermarks=None):
+    """
+    Dry-run the statements and enforce the byte budgets when DRY_RUN_PREFLIGHT is set.
+    
+    With a WatermarkStore, incremental statements are estimated as they will
+    run, reading only the rows past their stored watermark. Approved
+    statements keep their index in the file, so output file names and log
+    indexes do not shift when over-budget statements are skipped.
+    
+    Returns:
+        iterable: (statement index, statement) pairs approved for execution;
+            without DRY_RUN_PREFLIGHT the statements are passed through lazily
+    """
+    if not DRY_RUN_PREFLIGHT:
+        return enumerate(sql_statements, 1)
+    # The per-run budget covers the whole file, so every statement is read before any runs
+    sql_statements = list(sql_statements)
+    dry_run_statements = []
+    for stmt in sql_statements:
+        mark = watermarks.prepare(stmt, client.project) if watermarks is not None else None
+        dry_run_statements.append(mark.sql if mark is not None else stmt)
+    preflight = bq_dry_run.preflight(client, dry_run_statements, MAXIMUM_BYTES_BILLED,
+                                     MAXIMUM_BYTES_PER_RUN, OVER_BUDGET_ACTION)
+    skipped = {e.index for e in preflight.skipped}
+    return [(idx, stmt) for idx, stmt in enumerate(sql_statements, 1) if idx not in skipped]
+
+def run_select_statement(client, stmt, idx, read_client=None, cache=None, recorder=None, queued_at=None,
+                         watermarks=None):
+    """
+    Execute a single SQL statement, stream its results to a file and return the file name.
+    
+    Timing, job statistics and the output file are recorded in recorder;
+    queued_at is the time.monotonic() at which the statement was submitted.
+    With a WatermarkStore, a statement declaring "-- watermark: column TYPE"
+    only reads the rows past the position stored by its last run, writes them
+    as WATERMARK_OUTPUT says and then advances the position. Incremental
+    results depend on that position, so they bypass the result cache.
+    """
+    recorder = recorder or telemetry.Recorder('bigQ.csv')
+    with recorder.track(idx, stmt, queued_at) as record:
+        mark = watermarks.prepare(stmt, client.project) if watermarks is not None else None
+        if mark is not None:
+            watermark.check_output_mode(WATERMARK_OUTPUT, OUTPUT_FORMAT)
+        entry = None
+        if cache is not None and mark is None:
+            entry = cache.lookup(stmt, client.project, fmt=OUTPUT_FORMAT)
+            if entry.hit:
+                logger.info(f"Statement {idx} served from result cache")
+                record.status = 'cached'
+                record.output_file = cache.restore(entry, new_output_filename(idx))
+                return record.output_file
+        
+        logger.info(f"Executing statement {idx}: {stmt[:100]}...")  # Log first 100 chars
+        query_job = client.query(mark.sql if mark is not None else stmt,
+                                 job_config=bq_dry_run.job_config(MAXIMUM_BYTES_BILLED))
+        results = query_job.result(page_size=PAGE_SIZE)  # Wait for the query to complete
+        record.add_bigquery_job(query_job)
+        
+        # Use the Storage API fast path when enabled, otherwise page through tabledata.list;
+        # Arrow files cannot be appended to, so appended incremental rows always take the row path
+        if mark is not None and WATERMARK_OUTPUT == 'append':
+            read_client = None
+        arrow_results = bq_storage.read_query_results(read_client, query_job, STORAGE_API_MAX_STREAMS)
+        if arrow_results:
+            schema, batches = arrow_results
+            if mark is not None:
+                batches = mark.observe_batches(batches)
+            csv_file, record.rows = save_arrow_results(schema, batches, idx)
+        else:
+            csv_file, record.rows = save_results(results, idx, mark=mark)
+        record.output_file = csv_file
+        if entry is not None:
+            cache.store(entry, csv_file)
+        if mark is not None:
+            mark.commit()
+        
+    logger.info(f"Statement {idx} executed successfully")
+    return csv_file
+
+def execute_select_statements(client, sql_statements, read_client=None, cache=None, recorder=None,
+                              watermarks=None):
+    """Execute (statement index, statement) pairs in BigQuery one at a time and save the results to CSV."""
     csv_files = []
-    for idx, stmt in enumerate(sql_statements, 1):
+    for idx, stmt in sql_statements:
         try:
-            logger.info(f"Executing statement {idx}: {stmt[:100]}...")  # Log first 100 chars
-            query_job = client.query(stmt)
-            results = query_job.result()  # Wait for the query to complete
-            
-            # Convert results to a list to allow multiple iterations
-            result_rows = [dict(row.items()) for row in results]
-            
-            # Check if the query has results
-            if result_rows:
-                logger.info("Query results:")
-                # Print results to console
-                for row_dict in result_rows:
-                    print(row_dict)
-                
-                # Save results to CSV
-                csv_file = save_to_csv(result_rows, idx)
-                if csv_file:
-                    csv_files.append(csv_file)
-            else:
-                logger.info("No results to display (empty result set or non-SELECT statement)")
-                
-            logger.info(f"Statement {idx} executed successfully")
+            csv_file = run_select_statement(client, stmt, idx, read_client, cache, recorder, watermarks=watermarks)
+            if csv_file:
+                csv_files.append(csv_file)
         except exceptions.GoogleAPIError as e:
             logger.error(f"Error executing statement {idx}: {e}")
             raise
     
     return csv_files
 
+def execute_select_statements_concurrently(client, sql_statements, max_concurrent=MAX_CONCURRENT_QUERIES,
+                                           read_client=None, cache=None, recorder=None, watermarks=None):
+    """
+    Execute (statement index, statement) pairs in BigQuery with up to max_concurrent jobs running at once.
+    
+    Results are collected as each job finishes, but the returned CSV files keep
+    statement order. A failing statement does not stop the others.
+    
+    Returns:
+        tuple: list of CSV files in statement order, dict of statement index -> exception
+    """
+    # Every statement is submitted up front, so they are all held anyway; the failure summary needs them
+    sql_statements = list(sql_statements)
+    csv_by_index = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        futures = {
+            executor.submit(run_select_statement, client, stmt, idx, read_client, cache, recorder,
+                            time.monotonic(), watermarks): idx
+            for idx, stmt in sql_statements
+        }
+        logger.info(f"Submitted {len(futures)} statements (max {max_concurrent} concurrent)")
+        
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                csv_file = future.result()
+            except Exception as e:
+                logger.error(f"Error executing statement {idx}: {e}")
+                failures[idx] = e
+                continue
+            if csv_file:
+                csv_by_index[idx] = csv_file
+    
+    log_failure_summary(sql_statements, failures)
+    csv_files = [csv_by_index[idx] for idx in sorted(csv_by_index)]
+    return csv_files, failures
+
+def log_failure_summary(sql_statements, failures):
+    """Log a summary of which of the (statement index, statement) pairs failed and why."""
+    total = len(sql_statements)
+    if not failures:
+        logger.info(f"All {total} statements executed successfully")
+        return
+    
+    logger.error(f"{len(failures)} of {total} statements failed:")
+    statements = dict(sql_statements)
+    for idx in sorted(failures):
+        stmt = statements[idx]
+        logger.error(f"  Statement {idx}: {stmt[:100]}... -> {failures[idx]}")
+
 def main():
     try:
         # Log current working directory
@@ -150,14 +355,34 @@ def main():
         # Set up BigQuery client
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config['credentials_path']
         client = bigquery.Client(project=config['project_id'])
+        read_client = bq_storage.create_read_client() if USE_STORAGE_API else None
+        cache = result_cache.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES,
+                                         RESULT_CACHE_TTL, RESULT_CACHE_BYPASS)
+        watermarks = watermark.WatermarkStore(WATERMARK_STATE_FILE)
         
         # Read and execute SELECT statements
-        sql_statements = read_sql_file(sql_file)
-        csv_files = execute_select_statements(client, sql_statements)
+        sql_statements = run_preflight(client, read_sql_file(sql_file), watermarks)
+        failures = {}
+        recorder = telemetry.Recorder('bigQ.csv', TELEMETRY_FILE)
+        try:
+            if CONCURRENT_MODE:
+                csv_files, failures = execute_select_statements_concurrently(
+                    client, sql_statements, read_client=read_client, cache=cache, recorder=recorder,
+                    watermarks=watermarks
+                )
+            else:
+                csv_files = execute_select_statements(client, sql_statements, read_client, cache, recorder,
+                                                      watermarks)
+        finally:
+            recorder.log_summary()
+        cache.log_summary()
         
         # Send email with CSV attachments
         send_email(csv_files, EMAIL_RECIPIENT, EMAIL_SENDER, EMAIL_SUBJECT)
         
+        if failures:
+            raise RuntimeError(f"{len(failures)} statement(s) failed")
+        
         logger.info("All operations completed successfully")
         
     except Exception as e:
@@ -1,12 +1,28 @@
-import configparser
 import os
+import statistics
 from google.cloud import bigquery
 from google.api_core import exceptions
 import logging
+import bq_dry_run
+import config_loader
+import run_journal
+import sql_reader
+import statement_dag
+import telemetry
 
 # Configuration variables
 CONFIG_FILE_PATH = 'config.ini'  # Path to the config file
 SQL_FILE_PATH = '/path/to/your/sql_statements.sql'  # Path to the SQL file
+DRY_RUN_PREFLIGHT = True  # Dry-run every statement and report estimated bytes before executing anything
+MAXIMUM_BYTES_BILLED = 0  # Bytes budget per statement, checked by dry run and set on every job (0 = no limit)
+MAXIMUM_BYTES_PER_RUN = 0  # Estimated bytes budget for all statements of a run (0 = no limit)
+OVER_BUDGET_ACTION = 'refuse'  # 'refuse' aborts the run before anything executes, 'skip' drops those statements
+TELEMETRY_FILE = 'telemetry.jsonl'  # JSON record per statement is appended here ('' logs records only)
+JOURNAL_FILE = run_journal.DEFAULT_JOURNAL_FILE  # Per-statement status of each run, for RESUME ('' disables)
+RESUME = False  # Skip the statements an unfinished earlier run of SQL_FILE_PATH completed
+SCHEDULE_MODE = 'serial'  # 'serial' runs statements in file order, 'dag' runs independent statements concurrently
+MAX_CONCURRENT_STATEMENTS = 4  # Statements running at once in dag mode
+DRY_PLAN = False  # Print the statement DAG and its critical path instead of executing anything
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,42 +31,108 @@ logger = logging.getLogger(__name__)
 def load_config(config_file):
     """Load configuration from config.ini file."""
     try:
-        config = configparser.ConfigParser()
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Config file {config_file} not found")
-        
-        config.read(config_file)
-        return {
-            'project_id': config['bigquery']['project_id'],
-            'credentials_path': config['bigquery']['credentials_path'],
-            'sql_file': config['bigquery']['sql_file']
-        }
+        return config_loader.load_config(config_file, 'bigquery')
     except Exception as e:
         logger.error(f"Error loading config file: {e}")
         raise
 
 def read_sql_file(file_path):
-    """Read SQL statements from a file."""
+    """
+    Return an iterator over the SQL statements of a file.
+    
+    The file is read lazily, so execution starts before a large file has been read.
+    """
     try:
-        with open(file_path, 'r') as file:
-            # Split statements by semicolon, remove empty statements
-            sql_statements = [stmt.strip() for stmt in file.read().split(';') if stmt.strip()]
-        return sql_statements
+        with open(file_path, 'r'):
+            pass  # Fail early if the file cannot be opened
+        # Split on semicolons outside strings, comments and scripting blocks
+        return sql_reader.iter_statements(file_path)
     except Exception as e:
         logger.error(f"Error reading SQL file {file_path}: {e}")
         raise
 
-def execute_sql_statements(client, sql_statements):
-    """Execute SQL statements in BigQuery."""
-    for stmt in sql_statements:
-        try:
-            logger.info(f"Executing statement: {stmt[:100]}...")  # Log first 100 chars
-            query_job = client.query(stmt)
-            query_job.result()  # Wait for the query to complete
-            logger.info("Statement executed successfully")
-        except exceptions.GoogleAPIError as e:
+def run_preflight(client, sql_statements):
+    """
+    Dry-run the statements and enforce the byte budgets when DRY_RUN_PREFLIGHT is set.
+    
+    Returns:
+        list: Statements approved for execution
+    """
+    if not DRY_RUN_PREFLIGHT:
+        return sql_statements
+    preflight = bq_dry_run.preflight(client, sql_statements, MAXIMUM_BYTES_BILLED,
+                                     MAXIMUM_BYTES_PER_RUN, OVER_BUDGET_ACTION)
+    return preflight.approved
+
+def build_dag(sql_statements):
+    """
+    Return the StatementDag of the statements, weighted by their last wall time in TELEMETRY_FILE.
+    
+    Statements without history count as the median of the known wall times (1s if none is known).
+    
+    Returns:
+        tuple: (StatementDag, number of statements with a known wall time)
+    """
+    statements = list(sql_statements)
+    history = telemetry.load_wall_times(TELEMETRY_FILE)
+    known = {idx: history[telemetry.statement_hash(stmt)] for idx, stmt in enumerate(statements, 1)
+             if telemetry.statement_hash(stmt) in history}
+    default = statistics.median(known.values()) if known else 1.0
+    costs = {idx: known.get(idx, default) for idx in range(1, len(statements) + 1)}
+    return statement_dag.StatementDag(statements, costs), len(known)
+
+def print_plan(sql_statements):
+    """Print the dependency graph of the statements and its critical path without executing anything."""
+    dag, known = build_dag(sql_statements)
+    for line in dag.plan_lines():
+        print(line)
+    print(f"Durations: last wall time of {known} of {len(dag.nodes)} statement(s) in "
+          f"{TELEMETRY_FILE or 'no telemetry file'}; other statements are estimated")
+
+def execute_statement(client, idx, stmt, recorder, journal=None, queued_at=None):
+    """Execute one SQL statement, recording its telemetry in recorder and its status in journal."""
+    entry = journal.start(stmt) if journal is not None else None
+    try:
+        logger.info(f"Executing statement: {stmt[:100]}...")  # Log first 100 chars
+        with recorder.track(idx, stmt, queued_at) as record:
+            query_job = client.query(stmt, job_config=bq_dry_run.job_config(MAXIMUM_BYTES_BILLED))
+            results = query_job.result()  # Wait for the query to complete
+            record.add_bigquery_job(query_job)
+            if record.rows is None:
+                record.rows = getattr(results, 'total_rows', None)
+        logger.info("Statement executed successfully")
+    except Exception as e:
+        if entry is not None:
+            journal.finish(entry, error=e)
+        if isinstance(e, exceptions.GoogleAPIError):
             logger.error(f"Error executing statement: {e}")
-            raise
+        raise
+    if entry is not None:
+        journal.finish(entry, record.rows)
+
+def execute_sql_statements(client, sql_statements, recorder=None, journal=None):
+    """
+    Execute SQL statements in BigQuery, recording telemetry for each one in recorder and its status in journal.
+    
+    In the 'serial' SCHEDULE_MODE statements run in file order. In 'dag'
+    mode the file is analyzed into a dependency graph and statements whose
+    inputs are ready run concurrently, up to MAX_CONCURRENT_STATEMENTS,
+    keeping every read-after-write, write-after-write and write-after-read
+    order of the file. Either way the first failure stops the run.
+    """
+    recorder = recorder or telemetry.Recorder('bigQ.exec')
+    if SCHEDULE_MODE == 'dag':
+        dag, _ = build_dag(sql_statements)
+        path = dag.critical_path()
+        logger.info(f"Statement DAG: {len(dag.nodes)} statement(s), critical path of {len(path)}, "
+                    f"up to {dag.width()} at once, running {MAX_CONCURRENT_STATEMENTS} at a time")
+        statement_dag.execute(dag, lambda idx, stmt, queued_at: execute_statement(
+            client, idx, stmt, recorder, journal, queued_at), MAX_CONCURRENT_STATEMENTS)
+    elif SCHEDULE_MODE == 'serial':
+        for idx, stmt in enumerate(sql_statements, 1):
+            execute_statement(client, idx, stmt, recorder, journal)
+    else:
+        raise ValueError(f"Unknown schedule mode '{SCHEDULE_MODE}'. Use 'serial' or 'dag'.")
 
 def main():
     try:
@@ -60,13 +142,30 @@ def main():
         # Use SQL_FILE_PATH variable, fall back to config if not set
         sql_file = SQL_FILE_PATH if SQL_FILE_PATH else config['sql_file']
         
+        # The plan only analyzes the file, so it needs no BigQuery client
+        if DRY_PLAN:
+            print_plan(read_sql_file(sql_file))
+            return
+        
         # Set up BigQuery client
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config['credentials_path']
         client = bigquery.Client(project=config['project_id'])
         
-        # Read and execute SQL statements
+        # Read and execute SQL statements, skipping those a resumed run already completed
+        journal = run_journal.open_journal(JOURNAL_FILE, sql_file, f"bigquery:{client.project}", RESUME)
         sql_statements = read_sql_file(sql_file)
-        execute_sql_statements(client, sql_statements)
+        if journal is not None:
+            sql_statements = journal.pending(sql_statements)
+        sql_statements = run_preflight(client, sql_statements)
+        recorder = telemetry.Recorder('bigQ.exec', TELEMETRY_FILE)
+        succeeded = False
+        try:
+            execute_sql_statements(client, sql_statements, recorder, journal)
+            succeeded = True
+        finally:
+            recorder.log_summary()
+            if journal is not None:
+                journal.close(succeeded)
         
         logger.info("All SQL statements executed successfully")
         
@@ -1,9 +1,38 @@
+import itertools
 import logging
-import configparser
-import os
+import time
+from collections import deque
 from google.cloud import bigquery
-from google.api_core.exceptions import GoogleAPIError
-from google.oauth2 import service_account
+from google.api_core.exceptions import GoogleAPIError, InternalServerError, ServiceUnavailable, TooManyRequests
+import bq_dml_template
+import bq_dry_run
+import config_loader
+import dml_scheduler
+import run_journal
+import sql_reader
+import telemetry
+
+# Execution settings
+PARALLEL_MODE = True  # Run statements against different tables concurrently
+MAX_CONCURRENT_JOBS = 8  # Maximum number of DML jobs running at once
+MAX_ATTEMPTS = 6  # Attempts per statement for retryable errors
+RETRY_BASE_DELAY = 1.0  # Seconds; doubled after every retryable failure (with jitter)
+RETRY_MAX_DELAY = 64.0  # Upper bound in seconds for a single backoff delay
+SPLIT_ON_NEWLINE = True  # One statement per line; set False for ;-terminated multi-line statements
+DRY_RUN_PREFLIGHT = True  # Dry-run every statement and report estimated bytes before executing anything
+MAXIMUM_BYTES_BILLED = 0  # Bytes budget per statement, checked by dry run and set on every job (0 = no limit)
+MAXIMUM_BYTES_PER_RUN = 0  # Estimated bytes budget for all statements of a run (0 = no limit)
+OVER_BUDGET_ACTION = 'refuse'  # 'refuse' aborts the run before anything executes, 'skip' drops those statements
+
+# Template mode: one set-based job per batch of parameter rows
+TEMPLATE_BATCH_ROWS = 5000  # Maximum rows passed in @rows to a single job
+TEMPLATE_BATCH_BYTES = 8 * 1024 ** 2  # Approximate request size per job; BigQuery rejects requests over 10 MB
+TELEMETRY_FILE = 'telemetry.jsonl'  # JSON record per statement is appended here ('' logs records only)
+JOURNAL_FILE = run_journal.DEFAULT_JOURNAL_FILE  # Per-statement status of each run, for --resume ('' disables)
+
+# Error reasons and messages that are worth retrying
+RETRYABLE_REASONS = {'rateLimitExceeded', 'jobRateLimitExceeded', 'backendError', 'internalError'}
+RETRYABLE_MESSAGES = ('due to concurrent update', 'Could not serialize access')
 
 # Configure logging
 logging.basicConfig(
@@ -23,19 +52,10 @@ def load_config(config_file):
         tuple: project_id, dataset_id, credentials
     """
     try:
-        config = configparser.ConfigParser()
-        config.read(config_file)
-        
-        project_id = config['BigQuery']['project_id']
-        dataset_id = config['BigQuery']['dataset_id']
-        auth_json_path = config['BigQuery']['auth_json_path']
-        
-        # Set credentials from auth JSON file
-        if not os.path.exists(auth_json_path):
-            raise FileNotFoundError(f"Authentication JSON file not found at: {auth_json_path}")
-        credentials = service_account.Credentials.from_service_account_file(auth_json_path)
+        settings = config_loader.load_config(config_file, 'bigquery')
+        credentials = config_loader.load_credentials(settings)
         
-        return project_id, dataset_id, credentials
+        return settings['project_id'], settings['dataset_id'], credentials
     
     except KeyError as e:
         logging.error(f"Missing configuration key: {str(e)}")
@@ -44,13 +64,293 @@ def load_config(config_file):
         logging.error(f"Error reading config file '{config_file}': {str(e)}")
         raise
 
-def execute_dml_from_file(config_file, input_file):
+def is_retryable_error(error):
+    """Return True for rate-limit, backend and concurrent DML conflict errors."""
+    if isinstance(error, (TooManyRequests, ServiceUnavailable, InternalServerError)):
+        return True
+    reasons = {err.get('reason') for err in getattr(error, 'errors', None) or [] if isinstance(err, dict)}
+    if reasons & RETRYABLE_REASONS:
+        return True
+    return any(message in str(error) for message in RETRYABLE_MESSAGES)
+
+def prepare_statement(project_id, dataset_id, statement):
+    """Return a statement as sent to BigQuery, with the @dataset@ placeholder resolved."""
+    # Ensure dataset reference in queries
+    return statement.replace('@dataset@', f"{project_id}.{dataset_id}")
+
+def ordering_key(project_id, dataset_id, statement):
+    """
+    Return the table a statement writes to as project.dataset.table, the key that orders statements.
+    
+    The key is taken from the statement as sent to BigQuery, so @dataset@.t,
+    dataset.t and project.dataset.t all name the same table. Statements
+    without a single target table get None and run as barriers.
+    """
+    table = dml_scheduler.target_table(prepare_statement(project_id, dataset_id, statement))
+    if table is not None and table.count('.') == 1:
+        table = f"{project_id.lower()}.{table}"
+    return table
+
+def run_dml_statement(client, project_id, dataset_id, statement, record=None):
+    """
+    Execute one DML statement, retrying retryable errors with exponential backoff.
+    
+    The job statistics of the successful attempt are copied into record.
+    
+    Returns:
+        int: Number of affected rows
+    """
+    query = prepare_statement(project_id, dataset_id, statement)
+    job_config = bq_dry_run.job_config(MAXIMUM_BYTES_BILLED)
+    
+    def run():
+        query_job = client.query(query, job_config=job_config)
+        query_job.result()  # Wait for the query to complete
+        if record is not None:
+            record.add_bigquery_job(query_job)
+        return query_job.num_dml_affected_rows
+    
+    return dml_scheduler.call_with_backoff(run, is_retryable_error, MAX_ATTEMPTS,
+                                           RETRY_BASE_DELAY, RETRY_MAX_DELAY, description=statement[:100])
+
+def run_recorded_statement(recorder, index, client, project_id, dataset_id, statement, queued_at=None, journal=None):
+    """Execute one DML statement with run_dml_statement, recording its telemetry and its journal entry."""
+    entry = journal.start(statement) if journal is not None else None
+    try:
+        with recorder.track(index, statement, queued_at) as record:
+            row_ct = run_dml_statement(client, project_id, dataset_id, statement, record)
+    except Exception as e:
+        if entry is not None:
+            journal.finish(entry, error=e)
+        raise
+    if entry is not None:
+        journal.finish(entry, row_ct)
+    return row_ct
+
+def log_result(statement, row_ct=None, error=None):
+    """Log and print the outcome of one statement."""
+    if error is None:
+        logging.info(f"Successfully executed: '{statement}' - {row_ct} record(s) affected")
+        print(f"Executed: '{statement}' - {row_ct} record(s) affected")
+    else:
+        logging.error(f"Failed to execute '{statement}': {str(error)}")
+        print(f"Error executing '{statement}': {str(error)}")
+
+def execute_statements_parallel(client, project_id, dataset_id, dml_statements, max_concurrent=MAX_CONCURRENT_JOBS,
+                                recorder=None, journal=None):
+    """
+    Execute DML statements with up to max_concurrent jobs running at once.
+    
+    Statements that write to the same table run one after another in file
+    order; statements against different tables run concurrently. Statements
+    are consumed lazily and results are logged in file order as soon as they
+    are known, so a generator over a huge file is never held in memory.
+    
+    Returns:
+        tuple: Number of statements, number of failed statements
+    """
+    recorder = recorder or telemetry.Recorder('bigQ_dml_exec')
+    count = 0
+    failures = 0
+    pending = deque()
+    
+    def report(statement, future):
+        try:
+            log_result(statement, future.result())
+            return 0
+        except GoogleAPIError as e:
+            log_result(statement, error=e)
+            return 1
+    
+    with dml_scheduler.KeyedExecutor(max_concurrent) as executor:
+        for statement in dml_statements:
+            count += 1
+            key = ordering_key(project_id, dataset_id, statement)
+            pending.append((statement, executor.submit(key, run_recorded_statement, recorder, count, client,
+                                                       project_id, dataset_id, statement, time.monotonic(),
+                                                       journal)))
+            while pending and pending[0][1].done():
+                failures += report(*pending.popleft())
+        while pending:
+            failures += report(*pending.popleft())
+    return count, failures
+
+def run_dml_file(client, project_id, dataset_id, input_file, resume=False):
+    """
+    Execute the DML statements of an input file with an existing BigQuery client.
+    
+    The status of every statement is kept in the run journal (JOURNAL_FILE)
+    of the file and dataset, so an interrupted or partly failed run can be
+    resumed.
+    
+    Args:
+        client: BigQuery client
+        project_id (str): Project that replaces the @dataset@ placeholder
+        dataset_id (str): Dataset that replaces the @dataset@ placeholder
+        input_file (str): Path to input file containing DML statements
+        resume (bool): Skip the statements an unfinished earlier run completed
+        
+    Returns:
+        int: Number of failed statements
+    """
+    journal = run_journal.open_journal(JOURNAL_FILE, input_file, f"bigquery:{project_id}.{dataset_id}", resume)
+    
+    # Read DML statements lazily from file
+    dml_statements = sql_reader.iter_statements(input_file, SPLIT_ON_NEWLINE)
+    if journal is not None:
+        dml_statements = journal.pending(dml_statements)
+    
+    # Pre-flight needs every statement up front, so the file is read completely first
+    if DRY_RUN_PREFLIGHT:
+        statements = list(dml_statements)
+        preflight = bq_dry_run.preflight(
+            client, [prepare_statement(project_id, dataset_id, s) for s in statements],
+            MAXIMUM_BYTES_BILLED, MAXIMUM_BYTES_PER_RUN, OVER_BUDGET_ACTION
+        )
+        print(f"Dry run: {bq_dry_run.format_bytes(preflight.total_bytes)} estimated for {len(statements)} statement(s)")
+        skipped = {e.index for e in preflight.skipped}
+        dml_statements = [s for idx, s in enumerate(statements, 1) if idx not in skipped]
+    
+    recorder = telemetry.Recorder('bigQ_dml_exec', TELEMETRY_FILE)
+    start = time.monotonic()
+    if PARALLEL_MODE:
+        count, failures = execute_statements_parallel(client, project_id, dataset_id, dml_statements,
+                                                      MAX_CONCURRENT_JOBS, recorder, journal)
+    else:
+        # Execute each DML statement
+        count = 0
+        failures = 0
+        for statement in dml_statements:
+            count += 1
+            try:
+                log_result(statement, run_recorded_statement(recorder, count, client, project_id, dataset_id,
+                                                             statement, journal=journal))
+            except GoogleAPIError as e:
+                log_result(statement, error=e)
+                failures += 1
+    
+    elapsed = time.monotonic() - start
+    if journal is not None:
+        journal.close(failures == 0)
+        if journal.skipped:
+            print(f"Skipped {journal.skipped} statement(s) completed by the resumed run")
+    logging.info(f"Finished {count} statement(s) in {elapsed:.1f}s, {failures} failed")
+    print(f"Finished {count} statement(s) in {elapsed:.1f}s, {failures} failed")
+    recorder.log_summary(echo=True)
+    return failures
+
+def run_template_batch(client, query, parameter, description, record=None):
+    """
+    Execute the template for one batch of rows, retrying retryable errors.
+    
+    The job statistics of the successful attempt are copied into record.
+    
+    Returns:
+        int: Number of affected rows
+    """
+    job_config = bq_dry_run.job_config(MAXIMUM_BYTES_BILLED, query_parameters=[parameter])
+    
+    def run():
+        query_job = client.query(query, job_config=job_config)
+        query_job.result()  # Wait for the query to complete
+        if record is not None:
+            record.add_bigquery_job(query_job)
+        return query_job.num_dml_affected_rows
+    
+    return dml_scheduler.call_with_backoff(run, is_retryable_error, MAX_ATTEMPTS,
+                                           RETRY_BASE_DELAY, RETRY_MAX_DELAY, description=description)
+
+def run_template_file(client, project_id, dataset_id, template_file, rows_file):
+    """
+    Execute a DML template once per batch of parameter rows instead of once per row.
+    
+    The template is a single statement that reads the rows from the @rows
+    ARRAY<STRUCT> parameter, for example
+    
+        -- param: order_id INT64
+        MERGE `@dataset@.orders` t
+        USING UNNEST(@rows) s ON t.order_id = s.order_id
+        WHEN MATCHED THEN UPDATE SET status = s.status
+    
+    The struct fields are the columns of the CSV or JSONL rows file. Rows are
+    read lazily and sent TEMPLATE_BATCH_ROWS at a time, one job per batch, in
+    file order. A failed batch is logged with its row range and the run goes
+    on with the next batch.
+    
+    Args:
+        client: BigQuery client
+        project_id (str): Project that replaces the @dataset@ placeholder
+        dataset_id (str): Dataset that replaces the @dataset@ placeholder
+        template_file (str): Path to the DML template
+        rows_file (str): Path to the .csv or .jsonl file of parameter rows
+        
+    Returns:
+        int: Number of failed batches
+    """
+    template = bq_dml_template.read_template(template_file)
+    query = prepare_statement(project_id, dataset_id, template.sql)
+    batches = bq_dml_template.iter_batches(bq_dml_template.iter_rows(rows_file),
+                                           TEMPLATE_BATCH_ROWS, TEMPLATE_BATCH_BYTES)
+    first_batch = next(batches, None)
+    if first_batch is None:
+        logging.info(f"No rows in {rows_file}, nothing to execute")
+        print(f"No rows in {rows_file}, nothing to execute")
+        return 0
+    types = bq_dml_template.field_types(template, first_batch[1][0])
+    logging.info(f"Template {template_file}: @{bq_dml_template.ROWS_PARAMETER} fields "
+                 f"{', '.join(f'{name} {type_}' for name, type_ in types.items())}")
+    
+    # The dry run of the first batch stands for every batch: the bytes scanned
+    # depend on the tables read, not on the number of rows in @rows
+    if DRY_RUN_PREFLIGHT:
+        preflight = bq_dry_run.preflight(
+            client, [query], MAXIMUM_BYTES_BILLED, MAXIMUM_BYTES_PER_RUN, OVER_BUDGET_ACTION,
+            query_parameters=[bq_dml_template.build_parameter(first_batch[1], types)]
+        )
+        print(f"Dry run: {bq_dry_run.format_bytes(preflight.total_bytes)} estimated per batch")
+        if not preflight.approved:
+            return 0
+    
+    recorder = telemetry.Recorder('bigQ_dml_exec', TELEMETRY_FILE)
+    start = time.monotonic()
+    batch_count = 0
+    row_count = 0
+    affected = 0
+    failures = 0
+    for first_row, rows in itertools.chain([first_batch], batches):
+        batch_count += 1
+        row_count += len(rows)
+        row_range = f"rows {first_row}-{first_row + len(rows) - 1}"
+        try:
+            with recorder.track(batch_count, f"{row_range}: {template.sql}") as record:
+                parameter = bq_dml_template.build_parameter(rows, types)
+                row_ct = run_template_batch(client, query, parameter, f"batch {batch_count} ({row_range})", record)
+            affected += row_ct or 0
+            logging.info(f"Batch {batch_count} ({row_range}): {row_ct} record(s) affected")
+            print(f"Batch {batch_count} ({row_range}): {row_ct} record(s) affected")
+        except (GoogleAPIError, ValueError) as e:
+            failures += 1
+            logging.error(f"Batch {batch_count} ({row_range}) failed: {str(e)}")
+            print(f"Error executing batch {batch_count} ({row_range}): {str(e)}")
+    
+    elapsed = time.monotonic() - start
+    logging.info(f"Finished {row_count} row(s) in {batch_count} batch(es) in {elapsed:.1f}s, "
+                 f"{affected} record(s) affected, {failures} batch(es) failed")
+    print(f"Finished {row_count} row(s) in {batch_count} batch(es) in {elapsed:.1f}s, "
+          f"{affected} record(s) affected, {failures} batch(es) failed")
+    recorder.log_summary(echo=True)
+    return failures
+
+def execute_dml_from_file(config_file, input_file, rows_file=None, resume=False):
     """
     Execute DML commands from an input file and log results.
     
     Args:
         config_file (str): Path to configuration file
-        input_file (str): Path to input file containing DML statements
+        input_file (str): Path to input file containing DML statements, or
+            the DML template when rows_file is given
+        rows_file (str): Path to a .csv or .jsonl file of template parameter rows
+        resume (bool): Skip the statements an unfinished earlier run completed
     """
     try:
         # Load configuration
@@ -59,27 +359,19 @@ def execute_dml_from_file(config_file, input_file):
         # Initialize BigQuery client with credentials
         client = bigquery.Client(project=project_id, credentials=credentials)
         
-        # Read DML statements from file
-        with open(input_file, 'r') as file:
-            dml_statements = [line.strip() for line in file if line.strip() and not line.startswith('#')]
-        
-        # Execute each DML statement
-        for statement in dml_statements:
-            try:
-                # Ensure dataset reference in queries
-                query = statement.replace('@dataset@', f"{project_id}.{dataset_id}")
-                query_job = client.query(query)
-                query_job.result()  # Wait for the query to complete
-                row_ct = query_job.num_dml_affected_rows
-                logging.info(f"Successfully executed: '{statement}' - {row_ct} record(s) affected")
-                print(f"Executed: '{statement}' - {row_ct} record(s) affected")
-            except GoogleAPIError as e:
-                logging.error(f"Failed to execute '{statement}': {str(e)}")
-                print(f"Error executing '{statement}': {str(e)}")
+        if rows_file:
+            if resume:
+                raise ValueError("Template runs cannot be resumed")
+            run_template_file(client, project_id, dataset_id, input_file, rows_file)
+        else:
+            run_dml_file(client, project_id, dataset_id, input_file, resume)
                 
     except FileNotFoundError as e:
-        logging.error(f"Input file '{input_file}' not found")
-        print(f"Error: Input file '{input_file}' not found")
+        logging.error(f"Input file '{e.filename or input_file}' not found")
+        print(f"Error: Input file '{e.filename or input_file}' not found")
+    except bq_dry_run.BudgetExceededError as e:
+        logging.error(f"Run refused: {str(e)}")
+        print(f"Run refused: {str(e)}")
     except GoogleAPIError as e:
         logging.error(f"BigQuery client error: {str(e)}")
         print(f"Error initializing BigQuery client: {str(e)}")
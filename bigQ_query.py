@@ -1,60 +1,114 @@
-import configparser
 import sys
 from google.cloud import bigquery
-from google.oauth2 import service_account
-import pandas as pd
-from tabulate import tabulate
+import bq_dry_run
+import bq_storage
+import config_loader
+import output_writers
+import result_cache
 
 # Hardcoded arguments
 CONFIG_FILE = "../config/config.ini"
 QUERY = "SELECT * FROM your_dataset.your_table LIMIT 10"  # Replace with your dataset and table
 OUTPUT_FILE = "../output/bigquery_output.txt"
-OUTPUT_FORMAT = "txt"  # Options: "csv", "html", or "txt"
+OUTPUT_FORMAT = "txt"  # Options: "csv", "csv.gz", "csv.zst", "parquet", "html", or "txt"
+USE_STORAGE_API = False  # Download results as Arrow over the BigQuery Storage Read API
+STORAGE_API_MAX_STREAMS = 4  # Parallel Storage API read streams
+RESULT_CACHE_DIR = result_cache.DEFAULT_CACHE_DIR  # Shared on-disk result cache
+RESULT_CACHE_TTL = 300  # Seconds a cached result stays valid ("-- cache_ttl: N" overrides)
+RESULT_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used entries are evicted above this size
+RESULT_CACHE_BYPASS = False  # Always query BigQuery and do not store results
+DRY_RUN_PREFLIGHT = True  # Dry-run the query and report its estimated bytes before executing it
+MAXIMUM_BYTES_BILLED = 0  # Bytes budget of the query, checked by dry run and set on the job (0 = no limit)
 
 def read_config(config_file):
     """Read connection details from a .ini config file."""
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    if 'BigQuery' not in config:
-        raise ValueError("Config file missing [BigQuery] section")
-    return {
-        'project_id': config['BigQuery'].get('project_id'),
-        'service_account_file': config['BigQuery'].get('service_account_file')
-    }
+    return config_loader.load_config(config_file, 'bigquery')
 
-def query_bigquery():
+def query_bigquery(client=None):
+    """
+    Run QUERY and save its results to OUTPUT_FILE in OUTPUT_FORMAT.
+    
+    Args:
+        client: BigQuery client to use instead of one built from the credentials
+            in CONFIG_FILE, e.g. a long-lived client or a benchmark fake
+    """
     try:
         # Read configuration
         config = read_config(CONFIG_FILE)
+        output_format = OUTPUT_FORMAT.lower()
 
-        # Load service account credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            config['service_account_file']
-        )
+        # Serve the output from the result cache when a fresh copy exists
+        cache = result_cache.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES,
+                                         RESULT_CACHE_TTL, RESULT_CACHE_BYPASS)
+        target = config['project_id']
+        entry = cache.lookup(QUERY, target, fmt=output_format)
+        if entry.hit:
+            cache.restore(entry, OUTPUT_FILE)
+            print(f"Result cache hit: results restored to {OUTPUT_FILE}")
+            return
+        print("Result cache miss: querying BigQuery")
 
-        # Initialize BigQuery client
-        client = bigquery.Client(project=config['project_id'], credentials=credentials)
+        credentials = None
+        if client is None:
+            # Load service account credentials
+            credentials = config_loader.load_credentials(config)
+
+            # Initialize BigQuery client
+            client = bigquery.Client(project=config['project_id'], credentials=credentials)
+
+        # Refuse an over-budget query before it runs
+        if DRY_RUN_PREFLIGHT:
+            estimate = bq_dry_run.dry_run(client, QUERY)
+            print(f"Dry run: {bq_dry_run.format_bytes(estimate)} estimated")
+            if MAXIMUM_BYTES_BILLED and (estimate or 0) > MAXIMUM_BYTES_BILLED:
+                raise bq_dry_run.BudgetExceededError(
+                    f"estimated {bq_dry_run.format_bytes(estimate)} exceeds "
+                    f"{bq_dry_run.format_bytes(MAXIMUM_BYTES_BILLED)}; query not executed"
+                )
 
         # Execute query
-        query_job = client.query(QUERY)
+        query_job = client.query(QUERY, job_config=bq_dry_run.job_config(MAXIMUM_BYTES_BILLED))
         results = query_job.result()
 
+        read_client = bq_storage.create_read_client(credentials) if USE_STORAGE_API else None
+        arrow_results = bq_storage.read_query_results(read_client, query_job, STORAGE_API_MAX_STREAMS)
+
+        # File formats are streamed to disk, straight from Arrow batches on the Storage API path
+        if output_format in output_writers.FORMAT_EXTENSIONS:
+            if arrow_results:
+                schema, batches = arrow_results
+                row_count = output_writers.write_arrow_batches(batches, schema, OUTPUT_FILE, output_format)
+            else:
+                columns = [field.name for field in results.schema]
+                arrow_schema = None
+                if output_format == 'parquet':
+                    arrow_schema = output_writers.arrow_schema_from_bigquery(results.schema)
+                with output_writers.RowWriter(OUTPUT_FILE, output_format, columns, arrow_schema) as writer:
+                    writer.write_rows(row.values() for row in results)
+                row_count = writer.rows_written
+            print(f"Results saved to {OUTPUT_FILE} as {output_format} ({row_count} rows)")
+            cache.store(entry, OUTPUT_FILE)
+            return
+
         # Convert to DataFrame
-        df = results.to_dataframe()
+        if arrow_results:
+            schema, batches = arrow_results
+            df = bq_storage.batches_to_dataframe(batches, schema)
+        else:
+            df = results.to_dataframe()
 
         # Save output
-        if OUTPUT_FORMAT.lower() == 'csv':
-            df.to_csv(OUTPUT_FILE, index=False)
-            print(f"Results saved to {OUTPUT_FILE} as CSV")
-        elif OUTPUT_FORMAT.lower() == 'html':
+        if output_format == 'html':
             df.to_html(OUTPUT_FILE, index=False, border=1, classes='table table-striped')
             print(f"Results saved to {OUTPUT_FILE} as HTML")
-        elif OUTPUT_FORMAT.lower() == 'txt':
+        elif output_format == 'txt':
+            from tabulate import tabulate
             with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
                 f.write(tabulate(df, headers='keys', tablefmt='plain', showindex=False))
             print(f"Results saved to {OUTPUT_FILE} as formatted text")
         else:
-            raise ValueError("Unsupported output format. Use 'csv', 'html', or 'txt'.")
+            raise ValueError("Unsupported output format. Use 'csv', 'csv.gz', 'csv.zst', 'parquet', 'html', or 'txt'.")
+        cache.store(entry, OUTPUT_FILE)
 
     except Exception as e:
         print(f"Error executing BigQuery query: {e}")
@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import re
+from decimal import Decimal
+from google.cloud import bigquery
+import sql_reader
+
+# Query parameter that carries a batch of rows, e.g. "USING UNNEST(@rows) AS s"
+ROWS_PARAMETER = 'rows'
+# Rows file formats by extension
+CSV_EXTENSIONS = ('.csv',)
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson', '.json')
+
+# Field type declaration in a template, e.g. "-- param: order_id INT64"
+_PARAM_DIRECTIVE = re.compile(r'--\s*param\s*[:=]\s*(\w+)\s+(\w+)', re.IGNORECASE)
+# Legacy type names accepted in declarations
+_TYPE_ALIASES = {'INTEGER': 'INT64', 'FLOAT': 'FLOAT64', 'BOOLEAN': 'BOOL'}
+# Conversion of a raw CSV/JSON value to each parameter type; types not listed are sent as strings
+_CONVERTERS = {
+    'INT64': int,
+    'FLOAT64': float,
+    'NUMERIC': lambda value: Decimal(str(value)),
+    'BIGNUMERIC': lambda value: Decimal(str(value)),
+    'BOOL': lambda value: value if isinstance(value, bool) else str(value).strip().lower() in ('true', '1', 'yes', 'y'),
+    'JSON': lambda value: value if isinstance(value, str) else json.dumps(value),
+}
+# Approximate JSON overhead of one struct field in the request, on top of name and value
+_FIELD_OVERHEAD_BYTES = 64
+
+class Template:
+    """A set-based DML template and the struct field types declared in it."""
+
+    def __init__(self, sql, declared_types):
+        self.sql = sql
+        self.declared_types = declared_types
+
+def read_template(template_file):
+    """
+    Read a DML template: one statement that reads its rows from the @rows array parameter.
+
+    Field types are declared with "-- param: name TYPE" comments; fields that
+    are not declared get a type from the rows file (see field_types).
+
+    Raises:
+        ValueError: If the file does not hold exactly one statement using @rows
+    """
+    statements = list(sql_reader.iter_statements(template_file))
+    if len(statements) != 1:
+        raise ValueError(f"Template {template_file} must contain exactly one statement, found {len(statements)}")
+    sql = statements[0]
+    if not re.search(rf'@{ROWS_PARAMETER}\b', sql):
+        raise ValueError(f"Template {template_file} does not reference @{ROWS_PARAMETER}, "
+                         f"e.g. MERGE target USING UNNEST(@{ROWS_PARAMETER}) AS s ON ...")
+    declared_types = {}
+    for name, type_ in _PARAM_DIRECTIVE.findall(sql):
+        type_ = type_.upper()
+        declared_types[name] = _TYPE_ALIASES.get(type_, type_)
+    return Template(sql, declared_types)
+
+def iter_rows(rows_file):
+    """
+    Yield the parameter rows of a CSV (with header) or JSONL file as dicts, reading it lazily.
+
+    CSV values are strings; JSONL values keep their JSON types.
+    """
+    extension = os.path.splitext(rows_file)[1].lower()
+    if extension in CSV_EXTENSIONS:
+        with open(rows_file, 'r', newline='') as f:
+            yield from csv.DictReader(f)
+    elif extension in JSONL_EXTENSIONS:
+        with open(rows_file, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f"{rows_file} line {line_number}: expected a JSON object")
+                yield row
+    else:
+        raise ValueError(f"Unsupported rows file '{rows_file}': use .csv or .jsonl")
+
+def infer_type(value):
+    """Return the BigQuery type of a JSON value (STRING for strings and nulls)."""
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, int):
+        return 'INT64'
+    if isinstance(value, float):
+        return 'FLOAT64'
+    if isinstance(value, (dict, list)):
+        return 'JSON'
+    return 'STRING'
+
+def field_types(template, first_row):
+    """
+    Return the ordered field name -> type mapping of the @rows struct.
+
+    Fields are the columns of the rows file. Declared types win; other
+    fields are typed from their value in the first row.
+    """
+    return {name: template.declared_types.get(name) or infer_type(value) for name, value in first_row.items()}
+
+def convert_value(value, type_):
+    """Convert a raw row value to the parameter type; empty non-STRING values become NULL."""
+    if value is None or (value == '' and type_ != 'STRING'):
+        return None
+    converter = _CONVERTERS.get(type_)
+    return converter(value) if converter else value
+
+def build_parameter(rows, types):
+    """Return the @rows ARRAY<STRUCT> query parameter for a batch of rows."""
+    structs = []
+    for row in rows:
+        missing = set(types) - set(row)
+        if missing:
+            raise ValueError(f"Row {row} has no value for {', '.join(sorted(missing))}")
+        structs.append(bigquery.StructQueryParameter(
+            None, *[bigquery.ScalarQueryParameter(name, type_, convert_value(row[name], type_))
+                    for name, type_ in types.items()]
+        ))
+    return bigquery.ArrayQueryParameter(ROWS_PARAMETER, 'STRUCT', structs)
+
+def row_size(row):
+    """Approximate number of request bytes a row adds to the @rows parameter."""
+    return sum(len(str(name)) + len(str(value)) + _FIELD_OVERHEAD_BYTES for name, value in row.items())
+
+def iter_batches(rows, max_rows, max_bytes):
+    """
+    Group rows into batches of at most max_rows rows and about max_bytes request bytes.
+
+    Yields:
+        tuple: Number of the first row in the batch (1-based), list of rows
+    """
+    batch = []
+    batch_bytes = 0
+    first = 1
+    for number, row in enumerate(rows, 1):
+        size = row_size(row)
+        if batch and (len(batch) >= max_rows or batch_bytes + size > max_bytes):
+            yield first, batch
+            batch = []
+            batch_bytes = 0
+            first = number
+        batch.append(row)
+        batch_bytes += size
+    if batch:
+        yield first, batch
@@ -0,0 +1,147 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import bigquery
+from telemetry import format_bytes
+
+# Dry runs issued at once during pre-flight
+DEFAULT_DRY_RUN_WORKERS = 8
+# What to do with statements over budget
+OVER_BUDGET_ACTIONS = ('refuse', 'skip')
+
+logger = logging.getLogger(__name__)
+
+class BudgetExceededError(RuntimeError):
+    """Raised when pre-flight finds statements over budget and the action is 'refuse'."""
+
+def job_config(maximum_bytes_billed=0, **kwargs):
+    """
+    Return a QueryJobConfig that makes BigQuery fail a job billing more than maximum_bytes_billed.
+
+    A limit of 0 leaves the job unlimited. Extra keyword arguments are passed to QueryJobConfig.
+    """
+    if maximum_bytes_billed:
+        kwargs['maximum_bytes_billed'] = maximum_bytes_billed
+    return bigquery.QueryJobConfig(**kwargs)
+
+def dry_run(client, sql, query_parameters=None):
+    """
+    Dry-run a statement and return the number of bytes it would process.
+
+    query_parameters are passed on for statements that use named parameters.
+
+    Returns:
+        int or None: Estimated bytes processed (None if BigQuery returned no estimate)
+    """
+    config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False, query_parameters=query_parameters or [])
+    query_job = client.query(sql, job_config=config)
+    return query_job.total_bytes_processed
+
+class Estimate:
+    """Dry-run outcome of one statement."""
+
+    def __init__(self, index, statement, bytes_processed=None, error=None):
+        self.index = index
+        self.statement = statement
+        self.bytes_processed = bytes_processed
+        self.error = error
+        self.over_budget = None  # Reason the statement exceeds a budget, if any
+
+class Preflight:
+    """
+    Result of dry-running every statement of a run.
+
+    approved holds the statements to execute, in file order; skipped holds the
+    Estimates of statements dropped for being over budget.
+    """
+
+    def __init__(self, estimates):
+        self.estimates = estimates
+        self.approved = []
+        self.skipped = []
+
+    @property
+    def total_bytes(self):
+        """Estimated bytes processed by all statements with an estimate."""
+        return sum(e.bytes_processed or 0 for e in self.estimates)
+
+    @property
+    def approved_bytes(self):
+        """Estimated bytes processed by the approved statements."""
+        skipped = {e.index for e in self.skipped}
+        return sum(e.bytes_processed or 0 for e in self.estimates if e.index not in skipped)
+
+    def log_report(self):
+        """Log the estimate of every statement and the totals."""
+        for e in self.estimates:
+            if e.error is not None:
+                detail = f"no estimate ({e.error})"
+            else:
+                detail = format_bytes(e.bytes_processed)
+            if e.over_budget:
+                detail += f" - over budget: {e.over_budget}"
+            logger.info(f"Dry run statement {e.index}: {detail} - {e.statement[:100]}")
+        logger.info(f"Dry run total: {format_bytes(self.total_bytes)} for {len(self.estimates)} statement(s), "
+                    f"{format_bytes(self.approved_bytes)} for {len(self.estimates) - len(self.skipped)} approved")
+
+def preflight(client, statements, max_bytes_per_statement=0, max_bytes_per_run=0, action='refuse',
+              workers=DEFAULT_DRY_RUN_WORKERS, query_parameters=None):
+    """
+    Dry-run every statement before anything executes and enforce byte budgets.
+
+    A statement is over budget if its estimate exceeds max_bytes_per_statement,
+    or if adding it would take the run (in file order) past max_bytes_per_run.
+    A limit of 0 disables that check. Statements whose dry run fails, for
+    example because they read a table created by an earlier statement, are
+    reported without an estimate and are not held back; the per-job
+    maximum_bytes_billed still protects them at execution time.
+
+    Args:
+        client: BigQuery client
+        statements (iterable): SQL statements, as sent to BigQuery
+        max_bytes_per_statement (int): Byte budget of a single statement
+        max_bytes_per_run (int): Byte budget of all statements together
+        action (str): 'refuse' raises BudgetExceededError if anything is over
+            budget; 'skip' leaves those statements out of Preflight.approved
+        workers (int): Dry runs issued in parallel
+        query_parameters (list): Query parameters used by every statement
+
+    Returns:
+        Preflight: Estimates and the approved statements
+    """
+    if action not in OVER_BUDGET_ACTIONS:
+        raise ValueError(f"Unknown over-budget action '{action}'. Use one of: {', '.join(OVER_BUDGET_ACTIONS)}")
+    statements = list(statements)
+
+    def estimate(item):
+        index, statement = item
+        try:
+            return Estimate(index, statement, dry_run(client, statement, query_parameters))
+        except Exception as e:
+            return Estimate(index, statement, error=e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        estimates = list(executor.map(estimate, enumerate(statements, 1)))
+
+    result = Preflight(estimates)
+    run_bytes = 0
+    for e in estimates:
+        bytes_processed = e.bytes_processed or 0
+        if max_bytes_per_statement and bytes_processed > max_bytes_per_statement:
+            e.over_budget = f"statement limit {format_bytes(max_bytes_per_statement)}"
+        elif max_bytes_per_run and run_bytes + bytes_processed > max_bytes_per_run:
+            e.over_budget = f"run limit {format_bytes(max_bytes_per_run)}"
+        if e.over_budget:
+            result.skipped.append(e)
+        else:
+            run_bytes += bytes_processed
+            result.approved.append(e.statement)
+    result.log_report()
+
+    if result.skipped and action == 'refuse':
+        raise BudgetExceededError(
+            f"{len(result.skipped)} statement(s) over budget "
+            f"(first: statement {result.skipped[0].index}, {result.skipped[0].over_budget}); nothing was executed"
+        )
+    for e in result.skipped:
+        logger.warning(f"Skipping statement {e.index} ({format_bytes(e.bytes_processed)}, {e.over_budget})")
+    return result
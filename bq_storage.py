@@ -0,0 +1,151 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Storage API fast path is optional
+    pyarrow = None
+
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # Storage API fast path is optional
+    bigquery_storage = None
+
+# Default number of parallel read streams requested per table
+DEFAULT_MAX_STREAMS = 4
+# Maximum number of downloaded record batches buffered ahead of the writer
+DEFAULT_QUEUE_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+_STREAM_DONE = object()
+
+def storage_api_available():
+    """Return True when both the Storage Read API client and pyarrow are installed."""
+    return bigquery_storage is not None and pyarrow is not None
+
+def create_read_client(credentials=None):
+    """Create a BigQuery Storage Read API client, or return None if it is not installed."""
+    if not storage_api_available():
+        logger.warning("google-cloud-bigquery-storage or pyarrow not installed, Storage API disabled")
+        return None
+    return bigquery_storage.BigQueryReadClient(credentials=credentials)
+
+def table_path(table_ref):
+    """Return the Storage API resource path for a BigQuery TableReference."""
+    return f"projects/{table_ref.project}/datasets/{table_ref.dataset_id}/tables/{table_ref.table_id}"
+
+def open_read_session(read_client, table_ref, max_streams=DEFAULT_MAX_STREAMS, preserve_order=False):
+    """
+    Create an Arrow read session on a table.
+
+    Args:
+        read_client: BigQueryReadClient (or a compatible fake)
+        table_ref: TableReference of the table to read, e.g. QueryJob.destination
+        max_streams (int): Maximum number of parallel streams to request
+        preserve_order (bool): Read through a single stream so row order is kept
+
+    Returns:
+        ReadSession: Session whose streams can be passed to iter_record_batches
+    """
+    if bigquery_storage is not None:
+        requested_session = bigquery_storage.types.ReadSession(
+            table=table_path(table_ref),
+            data_format=bigquery_storage.types.DataFormat.ARROW
+        )
+    else:
+        requested_session = {'table': table_path(table_ref), 'data_format': 'ARROW'}
+
+    session = read_client.create_read_session(
+        parent=f"projects/{table_ref.project}",
+        read_session=requested_session,
+        max_stream_count=1 if preserve_order else max_streams
+    )
+    logger.info(f"Opened Storage API read session on {table_path(table_ref)} with {len(session.streams)} stream(s)")
+    return session
+
+def session_schema(session):
+    """Return the pyarrow schema of a read session."""
+    return pyarrow.ipc.read_schema(pyarrow.py_buffer(session.arrow_schema.serialized_schema))
+
+def iter_record_batches(read_client, session, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Yield Arrow record batches from every stream of a read session.
+
+    Streams are downloaded in parallel threads and handed over through a
+    bounded queue, so at most queue_size batches are buffered at any time.
+    Batches from different streams are interleaved in arrival order.
+    """
+    streams = list(session.streams)
+    if not streams:
+        return
+
+    batches = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def read_stream(stream):
+        try:
+            reader = read_client.read_rows(stream.name)
+            for page in reader.rows(session).pages:
+                if stop.is_set():
+                    return
+                put(page.to_arrow())
+        except Exception as e:
+            put(e)
+        finally:
+            put(_STREAM_DONE)
+
+    with ThreadPoolExecutor(max_workers=len(streams)) as executor:
+        for stream in streams:
+            executor.submit(read_stream, stream)
+        try:
+            remaining = len(streams)
+            while remaining:
+                item = batches.get()
+                if item is _STREAM_DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+def batches_to_dataframe(batches, schema):
+    """Build a pandas DataFrame from Arrow record batches."""
+    return pyarrow.Table.from_batches(batches, schema=schema).to_pandas()
+
+def read_query_results(read_client, query_job, max_streams=DEFAULT_MAX_STREAMS):
+    """
+    Open a Storage API read session on a finished query's destination table.
+
+    Returns None when the fast path cannot be used (no client, no destination
+    table, or the API rejected the session) so callers can fall back to the
+    REST row iterator.
+
+    Returns:
+        tuple or None: (pyarrow schema, iterator of record batches)
+    """
+    if read_client is None or query_job.destination is None:
+        return None
+
+    # A single stream keeps the row order produced by ORDER BY
+    preserve_order = 'ORDER BY' in ' '.join(query_job.query.upper().split())
+    try:
+        session = open_read_session(read_client, query_job.destination, max_streams, preserve_order)
+    except Exception as e:
+        logger.warning(f"Storage API unavailable, falling back to REST download: {e}")
+        return None
+    return session_schema(session), iter_record_batches(read_client, session)
@@ -0,0 +1,115 @@
+import configparser
+import importlib.util
+import os
+
+# Accepted section names per backend (matched case-insensitively)
+SECTION_NAMES = {
+    'bigquery': ('BigQuery', 'bigquery'),
+    'spanner': ('Spanner', 'spanner'),
+}
+# Normalized key -> accepted spellings used by the existing config files
+KEY_ALIASES = {
+    'credentials_path': ('credentials_path', 'auth_json_path', 'service_account_file'),
+}
+# Keys read per backend; keys in REQUIRED_KEYS must be present
+BACKEND_KEYS = {
+    'bigquery': ('project_id', 'dataset_id', 'credentials_path', 'sql_file'),
+    'spanner': ('project_id', 'instance_id', 'database_id', 'credentials_path'),
+}
+REQUIRED_KEYS = {
+    'bigquery': ('project_id', 'credentials_path'),
+    'spanner': ('instance_id', 'database_id', 'credentials_path'),
+}
+# Environment variable pointing a backend's client at a local emulator; when
+# it is set, credentials_path is optional and anonymous credentials are used
+EMULATOR_HOST_VARS = {
+    'spanner': 'SPANNER_EMULATOR_HOST',
+}
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def find_section(config, backend):
+    """Return the config section of a backend, accepting [BigQuery] or [bigquery] and so on."""
+    names = {name.lower() for name in SECTION_NAMES[backend]}
+    for section in config.sections():
+        if section.lower() in names:
+            return config[section]
+    raise KeyError(f"Config file missing [{SECTION_NAMES[backend][0]}] section")
+
+def load_config(config_file, backend):
+    """
+    Load the connection settings of one backend from a .ini config file.
+
+    Args:
+        config_file (str): Path to the configuration file
+        backend (str): 'bigquery' or 'spanner'
+
+    Returns:
+        dict: Settings under their normalized names (see BACKEND_KEYS); optional
+            keys that are not set are None
+    """
+    if not os.path.exists(config_file):
+        raise FileNotFoundError(f"Config file {config_file} not found")
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    section = find_section(config, backend)
+
+    settings = {}
+    for key in BACKEND_KEYS[backend]:
+        settings[key] = next((section[alias] for alias in KEY_ALIASES.get(key, (key,)) if section.get(alias)), None)
+    emulator = os.environ.get(EMULATOR_HOST_VARS.get(backend, ''))
+    for key in REQUIRED_KEYS[backend]:
+        if not settings[key] and not (emulator and key == 'credentials_path'):
+            raise KeyError(f"Config section [{section.name}] missing '{key}'")
+    return settings
+
+def load_credentials(settings):
+    """
+    Load the service account credentials named by a settings dict from load_config.
+
+    Settings without credentials_path (only accepted when an emulator is
+    configured) get anonymous credentials.
+    """
+    path = settings['credentials_path']
+    if not path:
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+    from google.oauth2 import service_account
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Authentication JSON file not found at: {path}")
+    return service_account.Credentials.from_service_account_file(path)
+
+def load_script(filename, module_name=None):
+    """Load a report script by file name (names may contain dots) as a fresh module object."""
+    module_name = module_name or os.path.splitext(filename)[0].replace('.', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def set_constants(module, values, source='settings'):
+    """
+    Override a script's upper-case constants from string values, converting
+    each value to the type of the constant it replaces.
+
+    Args:
+        module: Script module from load_script
+        values (dict): Lower- or upper-case constant name -> string value
+        source (str): Where the values came from, used in error messages
+    """
+    for key, raw in values.items():
+        name = key.upper()
+        if not hasattr(module, name):
+            raise ValueError(f"{source}: unknown setting '{key}' for {module.__name__}")
+        current = getattr(module, name)
+        if isinstance(current, bool):
+            if raw.lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+                raise ValueError(f"{source}: '{key}' must be a boolean, got '{raw}'")
+            value = configparser.ConfigParser.BOOLEAN_STATES[raw.lower()]
+        elif isinstance(current, int):
+            value = int(raw)
+        elif isinstance(current, float):
+            value = float(raw)
+        else:
+            value = raw
+        setattr(module, name, value)
@@ -0,0 +1,155 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Table name: dotted path of identifiers or @dataset@ placeholders, whole or each part quoted with backticks;
+# a wildcard name such as events_* is not a single target
+_TABLE = r'((?:`[^`]+`|[\w@$-]+)(?:\.(?:`[^`]+`|[\w@$-]+))*)(?![\w@$*.`-])'
+# Whitespace and comments in front of a statement
+_LEADING_COMMENTS = re.compile(r'(?:\s+|--[^\n]*|#[^\n]*|/\*.*?\*/)*', re.DOTALL)
+_TARGET_PATTERNS = [
+    re.compile(r'^\s*INSERT\s+(?:INTO\s+)?' + _TABLE, re.IGNORECASE),
+    re.compile(r'^\s*UPDATE\s+' + _TABLE, re.IGNORECASE),
+    re.compile(r'^\s*DELETE\s+(?:FROM\s+)?' + _TABLE, re.IGNORECASE),
+    re.compile(r'^\s*MERGE\s+(?:INTO\s+)?' + _TABLE, re.IGNORECASE),
+    re.compile(r'^\s*TRUNCATE\s+TABLE\s+' + _TABLE, re.IGNORECASE),
+    re.compile(r'^\s*(?:CREATE(?:\s+OR\s+REPLACE)?(?:\s+TEMP(?:ORARY)?)?|DROP|ALTER)\s+'
+               r'(?:EXTERNAL\s+TABLE|SNAPSHOT\s+TABLE|MATERIALIZED\s+VIEW|TABLE|VIEW)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?'
+               + _TABLE, re.IGNORECASE),
+]
+# ALTER TABLE ... RENAME TO also writes a second table, so it has no single target
+_RENAME = re.compile(r'\bRENAME\s+TO\b', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+def target_table(statement):
+    """
+    Return the normalized name of the table a DML or DDL statement writes to.
+
+    DML, TRUNCATE and CREATE/DROP/ALTER TABLE or VIEW are recognized.
+    Backticks are removed, so `p.d.t`, `p`.`d`.`t` and p.d.t give the same
+    name. Returns None when the target cannot be determined (scripts, CALL,
+    ALTER TABLE ... RENAME TO, ...).
+    """
+    statement = statement[_LEADING_COMMENTS.match(statement).end():]
+    if _RENAME.search(statement):
+        return None
+    for pattern in _TARGET_PATTERNS:
+        match = pattern.match(statement)
+        if match:
+            return match.group(1).replace('`', '').lower()
+    return None
+
+def call_with_backoff(fn, is_retryable, max_attempts=5, base_delay=1.0, max_delay=64.0, description=''):
+    """
+    Call fn(), retrying retryable errors with exponential backoff and full jitter.
+
+    The delay before retry n is drawn uniformly from [0, min(max_delay, base_delay * 2**(n-1))].
+    Non-retryable errors, and the error of the last attempt, are raised.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logger.warning(f"Retryable error{' on ' + description if description else ''} "
+                           f"(attempt {attempt}/{max_attempts}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+class KeyedExecutor:
+    """
+    Bounded thread pool that keeps tasks with the same key in submission order.
+
+    Tasks with different keys run concurrently on up to max_workers threads.
+    A task is only started after the previous task with the same key has
+    finished. A task with key None is a barrier: it starts once every
+    earlier task has finished and runs alone, so statements whose target is
+    unknown are ordered against everything. submit() blocks once max_pending
+    tasks are queued or running, so a producer reading a huge input file
+    never runs far ahead of execution.
+    """
+
+    def __init__(self, max_workers, max_pending=None):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self._lock = threading.Condition()
+        self._chains = {}  # key -> deque of waiting (fn, args, future)
+        self._held = deque()  # (key, fn, args, future) submitted at or after a barrier that has not finished
+        self._barrier_running = False
+        self._outstanding = 0
+
+    def submit(self, key, fn, *args):
+        """Schedule fn(*args) after all earlier tasks with the same key (all earlier tasks if key is None)."""
+        self._slots.acquire()
+        future = Future()
+        with self._lock:
+            self._outstanding += 1
+            self._held.append((key, fn, args, future))
+            ready = self._release_held()
+        for task in ready:
+            self._start(*task)
+        return future
+
+    def _release_held(self):
+        # Move held tasks into their chains up to the next barrier, which is
+        # released once nothing else runs; returns the tasks to start
+        ready = []
+        while self._held and not self._barrier_running:
+            key, fn, args, future = self._held[0]
+            if key is None:
+                if self._chains:
+                    break
+                self._barrier_running = True
+                ready.append(self._held.popleft())
+            elif key in self._chains:
+                self._chains[key].append(self._held.popleft()[1:])
+            else:
+                self._chains[key] = deque()
+                ready.append(self._held.popleft())
+        return ready
+
+    def _start(self, key, fn, args, future):
+        pool_future = self._pool.submit(fn, *args)
+        pool_future.add_done_callback(lambda done: self._finished(key, done, future))
+
+    def _finished(self, key, pool_future, future):
+        error = pool_future.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(pool_future.result())
+        with self._lock:
+            if key is None:
+                self._barrier_running = False
+                ready = []
+            else:
+                chain = self._chains[key]
+                ready = [(key, *chain.popleft())] if chain else []
+                if not ready:
+                    del self._chains[key]
+            ready += self._release_held()
+        for task in ready:
+            self._start(*task)
+        self._slots.release()
+        with self._lock:
+            self._outstanding -= 1
+            self._lock.notify_all()
+
+    def shutdown(self):
+        """Wait for every submitted task to finish, then stop the worker threads."""
+        with self._lock:
+            while self._outstanding:
+                self._lock.wait()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
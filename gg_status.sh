@@ -15,12 +15,27 @@ LIST2=(
     "server6"
 )
 
-# File to store previous RBA values
-RBA_FILE="/tmp/gg_rba_values.txt"
+# Position store: one <process>.last file per process holding its latest
+# "epoch position", plus a per-server history.log trimmed to the retention window
+POSITION_DIR="/var/tmp/gg_positions"
+HISTORY_RETENTION_HOURS=48
 
 # HTML report location
 HTML_REPORT="/var/www/html/gg_status.html"
 
+# Hosts are collected in parallel; a host that does not answer within
+# HOST_TIMEOUT seconds is shown as an error instead of stalling the report
+MAX_PARALLEL=16
+HOST_TIMEOUT=40
+SSH_OPTS="-o BatchMode=yes -o ConnectTimeout=10"
+
+# Prometheus textfile for the node_exporter textfile collector (empty to disable)
+METRICS_FILE="/var/lib/node_exporter/textfile_collector/gg_status.prom"
+
+# Scratch directory for per-host results
+WORK_DIR=$(mktemp -d /tmp/gg_status.XXXXXX)
+trap 'rm -rf "${WORK_DIR}"' EXIT
+
 # Function to generate HTML header
 generate_html_header() {
     cat > ${HTML_REPORT} << EOF
@@ -130,171 +145,287 @@ end_server_table() {
     echo "</table></td>" >> ${HTML_REPORT}
 }
 
-# Function to extract lag value
-get_lag_value() {
-    local line="$1"
-    echo "$line" | awk '{
-        if (NF >= 4) {
-            print $4
-        }
-    }'
+# Function to generate an error row for a host that could not be collected
+generate_error_row() {
+    local message="$1"
+    echo "<tr><td colspan=\"5\" class=\"status-red\">ERROR: ${message}</td></tr>"
 }
 
-# Function to extract checkpoint lag
-get_checkpoint_lag() {
-    local line="$1"
-    echo "$line" | awk '{
-        if (NF >= 5) {
-            print $5
+# Function to parse the output of one batched ggsci session in a single pass.
+# Input: "info all" followed by "info extract *" and "info replicat *".
+# Output: one TYPE|STATUS|NAME|LAG|CHKPT_LAG|POSITION line per process, in
+# "info all" order. POSITION is the SCN for extracts reading redo, otherwise
+# the RBA of the trail file being read.
+parse_ggsci_output() {
+    awk '
+        # Drop the prompt that ggsci prints in front of each command output
+        { sub(/^GGSCI \([^)]*\) [0-9]+> */, "") }
+
+        # "info all" row: PROGRAM STATUS GROUP LAG CHKPT_LAG
+        ($1 == "EXTRACT" || $1 == "REPLICAT") && $2 ~ /^(RUNNING|STOPPED|ABENDED|STARTING|STOPPING)$/ {
+            order[++count] = $3
+            type[$3] = $1
+            status[$3] = $2
+            lag[$3] = (NF >= 4) ? $4 : ""
+            chkpt[$3] = (NF >= 5) ? $5 : ""
+            current = ""
+            next
         }
-    }'
+
+        # "info extract/replicat" block header: PROGRAM GROUP Last Started ... Status STATUS
+        ($1 == "EXTRACT" || $1 == "REPLICAT") && / Status / {
+            current = $2
+            next
+        }
+
+        current != "" && / SCN / && match($0, /\([0-9]+\)/) {
+            scn[current] = substr($0, RSTART + 1, RLENGTH - 2)
+        }
+
+        current != "" && / RBA / {
+            rba[current] = $NF
+        }
+
+        END {
+            for (i = 1; i <= count; i++) {
+                name = order[i]
+                position = (type[name] == "EXTRACT" && scn[name] != "") ? scn[name] : rba[name]
+                printf "%s|%s|%s|%s|%s|%s\n", type[name], status[name], name, lag[name], chkpt[name], position
+            }
+        }
+    ' "$1"
 }
 
-# Function to get RBA/SCN for a process
-get_process_position() {
-    local process_name="$1"
-    local process_type="$2"
-    local position_output="$3"
-    local position=""
-    
-    if [[ "$process_type" == "EXTRACT" ]]; then
-        # First try to get SCN format (for regular extracts)
-        position=$(echo "$position_output" | grep "SCN" | grep -o "([0-9]*)" | tr -d '()')
+# Function to fetch raw ggsci output from a server
+fetch_gg_status() {
+    local server=$1
+    timeout ${HOST_TIMEOUT} ssh ${SSH_OPTS} ${server} "
+        # Source profile
+        . ~/.profile
         
-        # If SCN not found, try RBA format (for pumps)
-        if [[ -z "$position" ]]; then
-            position=$(echo "$position_output" | grep "RBA" | awk '{print $NF}')
-        fi
-    else
-        # For replicat, get number after "RBA"
-        position=$(echo "$position_output" | grep "RBA" | awk '{print $NF}')
+        cd \$OGG_HOME || exit 1
+        
+        # One ggsci session for the process list and every process position
+        ./ggsci << EOF
+info all
+info extract *
+info replicat *
+EOF
+    "
+}
+
+# Function to convert an HH:MM:SS lag to seconds (prints nothing if not in that form)
+lag_to_seconds() {
+    if [[ "$1" =~ ^([0-9]+):([0-9][0-9]):([0-9][0-9])$ ]]; then
+        echo $(( 10#${BASH_REMATCH[1]} * 3600 + 10#${BASH_REMATCH[2]} * 60 + 10#${BASH_REMATCH[3]} ))
     fi
-    
-    echo "$position"
 }
 
-# Function to check GoldenGate status and generate HTML
-check_gg_status() {
+# Function to read the last stored position of a process ("epoch position", empty if none)
+read_last_position() {
+    local server=$1
+    local process_name=$2
+    local last_file="${POSITION_DIR}/${server}/${process_name}.last"
+    [ -f "$last_file" ] && cat "$last_file"
+}
+
+# Function to store the current positions of a server's processes
+# Usage: save_positions server epoch "PROC:POSITION ..."
+save_positions() {
     local server=$1
-    declare -A current_positions
-    declare -A prev_positions
-    declare -A process_types
-    local reading_processes=0
-    local reading_positions=0
+    local epoch=$2
+    local positions=$3
+    local server_dir="${POSITION_DIR}/${server}"
+    local pair proc pos
+    
+    mkdir -p "$server_dir" || return 1
+    for pair in $positions; do
+        proc=${pair%%:*}
+        pos=${pair#*:}
+        # Write then rename, so concurrent readers never see a partial file
+        echo "${epoch} ${pos}" > "${server_dir}/${proc}.last.$$"
+        mv -f "${server_dir}/${proc}.last.$$" "${server_dir}/${proc}.last"
+    done
     
-    # Get previous positions
-    if [ -f ${RBA_FILE} ]; then
-        while IFS='|' read -r timestamp srv data; do
-            if [ "$srv" = "$server" ]; then
-                for pair in $data; do
-                    proc=$(echo "$pair" | cut -d: -f1)
-                    pos=$(echo "$pair" | cut -d: -f2)
-                    if [ ! -z "$proc" ] && [ ! -z "$pos" ]; then
-                        prev_positions[$proc]=$pos
-                    fi
-                done
-            fi
-        done < ${RBA_FILE}
+    # Append to the history and drop entries older than the retention window,
+    # under a lock shared with any other collector writing this server
+    (
+        flock -w 10 9 || exit 1
+        echo "${epoch}|${positions}" >> "${server_dir}/history.log"
+        awk -F'|' -v cutoff=$(( epoch - HISTORY_RETENTION_HOURS * 3600 )) '$1 >= cutoff' \
+            "${server_dir}/history.log" > "${server_dir}/history.log.$$" &&
+            mv -f "${server_dir}/history.log.$$" "${server_dir}/history.log"
+    ) 9> "${server_dir}/.lock"
+}
+
+# Function to print the metric samples of one process
+# Usage: write_process_metrics labels status lag_seconds chkpt_lag_seconds position "prev_epoch prev_position" now
+write_process_metrics() {
+    local labels=$1
+    local status=$2
+    local lag_seconds=$3
+    local checkpoint_lag_seconds=$4
+    local position=$5
+    local previous=$6
+    local now=$7
+    local prev_epoch=${previous%% *}
+    local prev_position=${previous#* }
+    
+    echo "gg_process_up{${labels}} $([ "$status" = "RUNNING" ] && echo 1 || echo 0)"
+    echo "gg_process_status{${labels},status=\"${status}\"} 1"
+    [ -n "$lag_seconds" ] && echo "gg_process_lag_seconds{${labels}} ${lag_seconds}"
+    [ -n "$checkpoint_lag_seconds" ] && echo "gg_process_checkpoint_lag_seconds{${labels}} ${checkpoint_lag_seconds}"
+    [[ "$position" =~ ^[0-9]+$ ]] || return 0
+    echo "gg_process_position{${labels}} ${position}"
+    
+    # Rate since the previous run; skipped when the position went backwards
+    # (an RBA restarts at the beginning of each new trail file)
+    if [[ "$prev_position" =~ ^[0-9]+$ ]] && [ -n "$prev_epoch" ] && (( now > prev_epoch && position >= prev_position )); then
+        awk -v delta=$(( position - prev_position )) -v secs=$(( now - prev_epoch )) -v labels="$labels" \
+            'BEGIN { printf "gg_process_position_rate{%s} %.3f\n", labels, delta / secs }'
     fi
+}
 
-    ssh ${server} "
-        # Source profile
-        . ~/.profile
+# Function to write the Prometheus textfile from the per-host metric samples
+write_metrics_file() {
+    local metric_type metric_name help
+    local tmp_file="${METRICS_FILE}.$$"
+    
+    {
+        while IFS='|' read -r metric_type metric_name help; do
+            echo "# HELP ${metric_name} ${help}"
+            echo "# TYPE ${metric_name} ${metric_type}"
+            cat "${WORK_DIR}"/*.prom 2>/dev/null | grep "^${metric_name}{"
+        done << EOF
+gauge|gg_collector_up|1 if the host's GoldenGate status was collected
+gauge|gg_process_up|1 if the process is RUNNING
+gauge|gg_process_status|Process status reported by ggsci (always 1, see the status label)
+gauge|gg_process_lag_seconds|Lag at checkpoint in seconds
+gauge|gg_process_checkpoint_lag_seconds|Time since the last checkpoint in seconds
+gauge|gg_process_position|Current SCN (integrated extract) or trail RBA
+gauge|gg_process_position_rate|SCN or RBA advance per second since the previous run
+EOF
+    } > "$tmp_file" && mv -f "$tmp_file" "$METRICS_FILE"
+}
+
+# Function to check GoldenGate status and generate HTML rows from fetched output
+check_gg_status() {
+    local server=$1
+    local raw_file=$2
+    local metrics_file=$3
+    local now=$(date +%s)
+    local positions_data=""
+    local process_type status process_name lag checkpoint_lag position
+    local previous prev_position movement movement_class
+    local lag_seconds checkpoint_lag_seconds labels
+
+    while IFS='|' read -r process_type status process_name lag checkpoint_lag position; do
+        if [ ! -z "$position" ]; then
+            positions_data+="${process_name}:${position} "
+        fi
         
-        cd \$OGG_HOME || exit 1
+        lag_seconds=$(lag_to_seconds "$lag")
+        checkpoint_lag_seconds=$(lag_to_seconds "$checkpoint_lag")
+        lag_minutes=$(( (${lag_seconds:-0} + 30) / 60 ))
         
-        # Get list of processes first
-        process_list=\$(./ggsci << EOF
-        info all
-EOF
-        )
+        status_class="status-green"
+        if [ "$status" != "RUNNING" ]; then
+            status_class="status-red"
+        elif [ "$lag_minutes" -gt 10 ]; then
+            status_class="status-orange"
+        fi
         
-        echo \"---BEGIN_PROCESS_LIST---\"
-        echo \"\$process_list\"
-        echo \"---BEGIN_POSITIONS---\"
+        # Compare with the position stored by the previous run
+        previous=$(read_last_position "$server" "$process_name")
+        prev_position=${previous#* }
+        movement_class=$status_class
+        if [ -z "$position" ]; then
+            movement="Unknown"
+        elif [ -z "$previous" ]; then
+            movement="New"
+        elif [ "$position" != "$prev_position" ]; then
+            movement="Moving"
+        else
+            movement="Stalled"
+            [ "$status" = "RUNNING" ] && movement_class="status-orange"
+        fi
         
-               # Get position for each process
-        echo \"\$process_list\" | while read -r line; do
-            if echo \"\$line\" | grep -q \"^EXTRACT\\|^REPLICAT\"; then
-                process_type=\$(echo \"\$line\" | awk '{print \$1}')
-                process_name=\$(echo \"\$line\" | awk '{print \$3}')
-                
-                position_output=\$(./ggsci << EOF
-                info \${process_type} \${process_name}
-EOF
-                )
-                echo \"---PROCESS_\${process_name}---\"
-                echo \"\$position_output\"
-            fi
-        done
-    " | while IFS= read -r line; do
-        case "$line" in
-            "---BEGIN_PROCESS_LIST---")
-                reading_processes=1
-                reading_positions=0
-                ;;
-            "---BEGIN_POSITIONS---")
-                reading_processes=0
-                reading_positions=1
-                current_process=""
-                position_output=""
-                ;;
-            *)
-                if echo "$line" | grep -q "^---PROCESS_.*---"; then
-                    if [ ! -z "$current_process" ] && [ ! -z "$position_output" ]; then
-                        current_positions[$current_process]=$(get_process_position "$current_process" "${process_types[$current_process]}" "$position_output")
-                    fi
-                    current_process=$(echo "$line" | sed 's/^---PROCESS_\(.*\)---$/\1/')
-                    position_output=""
-                elif [ "$reading_processes" = "1" ] && echo "$line" | grep -q "^EXTRACT\|^REPLICAT"; then
-                    process_type=$(echo "$line" | awk '{print $1}')
-                    status=$(echo "$line" | awk '{print $2}')
-                    process_name=$(echo "$line" | awk '{print $3}')
-                    lag=$(get_lag_value "$line")
-                    checkpoint_lag=$(get_checkpoint_lag "$line")
-                    
-                    process_types[$process_name]=$process_type
-                    
-                    lag_minutes=0
-                    if echo "$lag" | grep -q "^[0-9][0-9]:[0-9][0-9]:[0-9][0-9]$"; then
-                        hours=$(echo "$lag" | cut -d: -f1)
-                        minutes=$(echo "$lag" | cut -d: -f2)
-                        seconds=$(echo "$lag" | cut -d: -f3)
-                        lag_minutes=$(( (10#$hours * 60) + (10#$minutes) + (10#$seconds >= 30 ? 1 : 0) ))
-                    fi
-                    
-                    status_class="status-green"
-                    if [ "$status" != "RUNNING" ]; then
-                        status_class="status-red"
-                    elif [ "$lag_minutes" -gt 10 ]; then
-                        status_class="status-orange"
-                    fi
-                    
-                    : ${lag:=00:00:00}
-                    : ${checkpoint_lag:=00:00:00}
-                    
-                    echo "<tr>" >> ${HTML_REPORT}
-                    echo "<td class=\"col-process\">${process_name}</td>" >> ${HTML_REPORT}
-                    echo "<td class=\"col-status ${status_class}\">${status}</td>" >> ${HTML_REPORT}
-                    echo "<td class=\"col-lag\">${lag}</td>" >> ${HTML_REPORT}
-                    echo "<td class=\"col-chkpt\">${checkpoint_lag}</td>" >> ${HTML_REPORT}
-                    echo "<td class=\"col-rba ${status_class}\">Moving</td>" >> ${HTML_REPORT}
-                    echo "</tr>" >> ${HTML_REPORT}
-                elif [ "$reading_positions" = "1" ] && [ ! -z "$current_process" ]; then
-                    position_output+="$line"$'\n'
-                fi
-                ;;
-        esac
-    done
+        labels="host=\"${server}\",process=\"${process_name}\",type=\"${process_type,,}\""
+        write_process_metrics "$labels" "$status" "$lag_seconds" "$checkpoint_lag_seconds" \
+            "$position" "$previous" "$now" >> "$metrics_file"
+        
+        : ${lag:=00:00:00}
+        : ${checkpoint_lag:=00:00:00}
+        
+        echo "<tr>"
+        echo "<td class=\"col-process\">${process_name}</td>"
+        echo "<td class=\"col-status ${status_class}\">${status}</td>"
+        echo "<td class=\"col-lag\">${lag}</td>"
+        echo "<td class=\"col-chkpt\">${checkpoint_lag}</td>"
+        echo "<td class=\"col-rba ${movement_class}\">${movement}</td>"
+        echo "</tr>"
+    done < <(parse_ggsci_output "$raw_file")
+    echo "gg_collector_up{host=\"${server}\"} 1" >> "$metrics_file"
     
-    positions_data=""
-    for proc in "${!current_positions[@]}"; do
-        positions_data+="${proc}:${current_positions[$proc]} "
-    done
-    echo "$(date '+%Y-%m-%d %H:%M:%S')|${server}|${positions_data}" >> ${RBA_FILE}
+    save_positions "$server" "$now" "$positions_data"
+}
+
+# Function to collect one server into ${WORK_DIR}/<server>.html (runs in the background)
+collect_host() {
+    local server=$1
+    local raw_file="${WORK_DIR}/${server}.raw"
+    local rows_file="${WORK_DIR}/${server}.html"
+    local metrics_file="${WORK_DIR}/${server}.prom"
+    local rc
+    
+    fetch_gg_status "$server" > "$raw_file" 2>/dev/null
+    rc=$?
+    if [ $rc -eq 124 ]; then
+        generate_error_row "no response within ${HOST_TIMEOUT}s" > "$rows_file"
+        echo "gg_collector_up{host=\"${server}\"} 0" > "$metrics_file"
+    elif [ $rc -ne 0 ]; then
+        generate_error_row "collection failed (exit code $rc)" > "$rows_file"
+        echo "gg_collector_up{host=\"${server}\"} 0" > "$metrics_file"
+    else
+        check_gg_status "$server" "$raw_file" "$metrics_file" > "${rows_file}.tmp"
+        mv "${rows_file}.tmp" "$rows_file"
+    fi
+}
+
+# Function to add a collected server table to the report
+append_server_table() {
+    local server=$1
+    generate_server_table_header "$server"
+    if [ -f "${WORK_DIR}/${server}.html" ]; then
+        cat "${WORK_DIR}/${server}.html" >> ${HTML_REPORT}
+    else
+        generate_error_row "no result collected" >> ${HTML_REPORT}
+    fi
+    end_server_table
 }
 
 # Main execution
+
+# Parse captured ggsci output only: gg_status.sh --parse <file>
+if [ "$1" = "--parse" ]; then
+    parse_ggsci_output "$2"
+    exit $?
+fi
+
+# Collect every server in parallel, at most MAX_PARALLEL at a time
+declare -A started
+for server in "${LIST1[@]}" "${LIST2[@]}"; do
+    [ -n "${started[$server]}" ] && continue
+    started[$server]=1
+    while (( $(jobs -rp | wc -l) >= MAX_PARALLEL )); do
+        wait -n
+    done
+    collect_host "$server" &
+done
+wait
+
+[ -n "${METRICS_FILE}" ] && write_metrics_file
+
 generate_html_header
 
 # Calculate the maximum number of rows needed
@@ -306,9 +437,7 @@ for ((i=0; i<max_rows; i++)); do
     
     # Left column server (LIST1)
     if ((i < ${#LIST1[@]})); then
-        generate_server_table_header "${LIST1[i]}"
-        check_gg_status "${LIST1[i]}"
-        end_server_table
+        append_server_table "${LIST1[i]}"
     else
         # Empty cell if no more left servers
         echo "<td class=\"outer-td\"></td>" >> ${HTML_REPORT}
@@ -316,9 +445,7 @@ for ((i=0; i<max_rows; i++)); do
     
     # Right column server (LIST2)
     if ((i < ${#LIST2[@]})); then
-        generate_server_table_header "${LIST2[i]}"
-        check_gg_status "${LIST2[i]}"
-        end_server_table
+        append_server_table "${LIST2[i]}"
     else
         # Empty cell if no more right servers
         echo "<td class=\"outer-td\"></td>" >> ${HTML_REPORT}
@@ -334,9 +461,6 @@ cat >> ${HTML_REPORT} << EOF
 </html>
 EOF
 
-# Cleanup old RBA values (keep last 48 hours)
-find ${RBA_FILE} -mtime +2 -delete 2>/dev/null
-
 # Set appropriate permissions for web server
 chmod 644 ${HTML_REPORT}
 
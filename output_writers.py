@@ -0,0 +1,255 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:  # Only needed for Parquet output and Arrow batches
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:  # Only needed for csv.zst output
+    zstandard = None
+
+# Supported file formats and their file name extensions
+FORMAT_EXTENSIONS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+}
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 100000
+
+def output_extension(fmt):
+    """Return the file name extension for an output format."""
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Use one of: {', '.join(FORMAT_EXTENSIONS)}")
+    return FORMAT_EXTENSIONS[fmt]
+
+def _require_pyarrow(fmt):
+    if pyarrow is None:
+        raise ImportError(f"pyarrow is required for '{fmt}' output")
+
+def open_text_output(path, fmt, append=False):
+    """
+    Open a (possibly compressed) CSV file for writing text.
+
+    With append, compressed output is added as a new gzip member or zstd
+    frame, which readers decompress as one continuous file.
+    """
+    mode = 'a' if append else 'w'
+    if fmt == 'csv':
+        return open(path, mode, newline='')
+    if fmt == 'csv.gz':
+        return gzip.open(path, mode + 't', newline='')
+    if fmt == 'csv.zst':
+        if zstandard is None:
+            raise ImportError("zstandard is required for 'csv.zst' output")
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, mode + 'b'))
+        return io.TextIOWrapper(raw, newline='')
+    raise ValueError(f"'{fmt}' is not a CSV format")
+
+def open_text_input(path, fmt):
+    """Open a (possibly compressed) CSV file for reading text."""
+    if fmt == 'csv':
+        return open(path, 'r', newline='')
+    if fmt == 'csv.gz':
+        return gzip.open(path, 'rt', newline='')
+    if fmt == 'csv.zst':
+        if zstandard is None:
+            raise ImportError("zstandard is required for 'csv.zst' input")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        return io.TextIOWrapper(raw, newline='')
+    raise ValueError(f"'{fmt}' is not a CSV format")
+
+def arrow_schema_from_bigquery(schema):
+    """Convert a list of BigQuery SchemaFields to a pyarrow schema."""
+    _require_pyarrow('parquet')
+    return pyarrow.schema([_bigquery_field(field) for field in schema])
+
+def _bigquery_field(field):
+    field_type = field.field_type.upper()
+    if field_type in ('RECORD', 'STRUCT'):
+        arrow_type = pyarrow.struct([_bigquery_field(sub_field) for sub_field in field.fields])
+    else:
+        arrow_type = {
+            'STRING': pyarrow.string(),
+            'BYTES': pyarrow.binary(),
+            'INTEGER': pyarrow.int64(),
+            'INT64': pyarrow.int64(),
+            'FLOAT': pyarrow.float64(),
+            'FLOAT64': pyarrow.float64(),
+            'NUMERIC': pyarrow.decimal128(38, 9),
+            'BIGNUMERIC': pyarrow.decimal256(76, 38),
+            'BOOLEAN': pyarrow.bool_(),
+            'BOOL': pyarrow.bool_(),
+            'TIMESTAMP': pyarrow.timestamp('us', tz='UTC'),
+            'DATE': pyarrow.date32(),
+            'TIME': pyarrow.time64('us'),
+            'DATETIME': pyarrow.timestamp('us'),
+        }.get(field_type, pyarrow.string())  # GEOGRAPHY, JSON, INTERVAL as text
+    if field.mode == 'REPEATED':
+        arrow_type = pyarrow.list_(arrow_type)
+    return pyarrow.field(field.name, arrow_type)
+
+def arrow_schema_from_spanner(fields):
+    """Convert Spanner result set fields (StructType.Field) to a pyarrow schema."""
+    _require_pyarrow('parquet')
+    return pyarrow.schema([pyarrow.field(field.name, _spanner_type(field.type_)) for field in fields])
+
+def _spanner_type(type_):
+    code = type_.code.name
+    if code == 'ARRAY':
+        return pyarrow.list_(_spanner_type(type_.array_element_type))
+    if code == 'STRUCT':
+        return pyarrow.struct([pyarrow.field(field.name, _spanner_type(field.type_))
+                               for field in type_.struct_type.fields])
+    return {
+        'BOOL': pyarrow.bool_(),
+        'INT64': pyarrow.int64(),
+        'FLOAT32': pyarrow.float32(),
+        'FLOAT64': pyarrow.float64(),
+        'NUMERIC': pyarrow.decimal128(38, 9),
+        'TIMESTAMP': pyarrow.timestamp('us', tz='UTC'),
+        'DATE': pyarrow.date32(),
+        'STRING': pyarrow.string(),
+        'BYTES': pyarrow.binary(),
+    }.get(code, pyarrow.string())  # JSON, PROTO, ENUM as text
+
+def _column_array(values, arrow_type):
+    """Build an Arrow array, serialising JSON-like values stored in text columns."""
+    try:
+        return pyarrow.array(values, type=arrow_type)
+    except (pyarrow.ArrowTypeError, pyarrow.ArrowInvalid):
+        if arrow_type != pyarrow.string():
+            raise
+        values = [v if v is None or isinstance(v, str) else json.dumps(v, default=str) for v in values]
+        return pyarrow.array(values, type=arrow_type)
+
+class RowWriter:
+    """
+    Streaming writer for query results in any supported output format.
+
+    CSV formats are written row by row. Parquet rows are buffered and written
+    one row group at a time, so memory is bounded by the row group size.
+    With append, CSV rows are added to an existing file and the header is
+    only written to a new or empty one.
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, path, fmt, columns, arrow_schema=None, row_group_size=PARQUET_ROW_GROUP_SIZE, append=False):
+        output_extension(fmt)
+        if append and fmt == 'parquet':
+            raise ValueError("Parquet files cannot be appended to")
+        self.path = path
+        self.fmt = fmt
+        self.rows_written = 0
+        if fmt == 'parquet':
+            _require_pyarrow(fmt)
+            if arrow_schema is None:
+                arrow_schema = pyarrow.schema([pyarrow.field(name, pyarrow.string()) for name in columns])
+            self._schema = arrow_schema
+            self._row_group_size = row_group_size
+            self._buffer = []
+            self._parquet = pyarrow.parquet.ParquetWriter(path, arrow_schema)
+        else:
+            write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+            self._file = open_text_output(path, fmt, append)
+            self._csv = csv.writer(self._file)
+            if write_header:
+                self._csv.writerow(columns)
+
+    def write_row(self, row):
+        """Write one row (a sequence of column values)."""
+        if self.fmt == 'parquet':
+            self._buffer.append(tuple(row))
+            if len(self._buffer) >= self._row_group_size:
+                self._flush_row_group()
+        else:
+            self._csv.writerow(row)
+        self.rows_written += 1
+
+    def write_rows(self, rows):
+        """Write an iterable of rows."""
+        for row in rows:
+            self.write_row(row)
+
+    def _flush_row_group(self):
+        if not self._buffer:
+            return
+        columns = list(zip(*self._buffer))
+        arrays = [_column_array(list(values), field.type) for values, field in zip(columns, self._schema)]
+        self._parquet.write_table(pyarrow.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer = []
+
+    def close(self):
+        """Flush buffered rows and close the file."""
+        if self.fmt == 'parquet':
+            self._flush_row_group()
+            self._parquet.close()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def write_arrow_batches(batches, schema, path, fmt):
+    """
+    Write Arrow record batches to a file without building Python row objects.
+
+    Returns:
+        int: Number of rows written
+    """
+    output_extension(fmt)
+    _require_pyarrow(fmt)
+    row_count = 0
+    if fmt == 'parquet':
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                row_count += batch.num_rows
+        return row_count
+
+    codec = {'csv.gz': 'gzip', 'csv.zst': 'zstd'}.get(fmt)
+    sink = pyarrow.CompressedOutputStream(path, codec) if codec else path
+    write_options = pyarrow.csv.WriteOptions(include_header=True, quoting_style='needed')
+    with pyarrow.csv.CSVWriter(sink, schema, write_options=write_options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    if codec:
+        sink.close()
+    return row_count
+
+def merge_files(paths, output_path, fmt):
+    """Concatenate files of the same format into output_path, keeping only the first CSV header."""
+    if fmt == 'parquet':
+        _require_pyarrow(fmt)
+        writer = None
+        for path in paths:
+            parquet_file = pyarrow.parquet.ParquetFile(path)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(output_path, parquet_file.schema_arrow)
+            for row_group in range(parquet_file.num_row_groups):
+                writer.write_table(parquet_file.read_row_group(row_group))
+        if writer is not None:
+            writer.close()
+        return
+
+    with open_text_output(output_path, fmt) as out:
+        for n, path in enumerate(paths):
+            with open_text_input(path, fmt) as part:
+                header = part.readline()
+                if n == 0:
+                    out.write(header)
+                shutil.copyfileobj(part, out)
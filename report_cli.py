@@ -0,0 +1,163 @@
+import argparse
+import sys
+import config_loader
+
+# Script implementing each (command, backend) pair; scripts are only imported
+# when their command runs, so e.g. a BigQuery DML run never loads Spanner,
+# pandas or tabulate
+COMMAND_SCRIPTS = {
+    ('query', 'bigquery'): 'bigQ_query.py',
+    ('query', 'spanner'): 'spanner_query.py',
+    ('export', 'bigquery'): 'bigQ.csv.py',
+    ('export', 'spanner'): 'Spanner.csv.py',
+    ('exec', 'bigquery'): 'bigQ.exec.py',
+    ('dml', 'bigquery'): 'bigQ_dml_exec.py',
+    ('dml', 'spanner'): 'spanner_partDML_exec.py',
+    ('pdml', 'spanner'): 'spanner_partDML_exec.py',
+    ('load', 'spanner'): 'spanner_bulk_load.py',
+}
+# Names of the constants each script reads its config file, SQL and output settings from
+SCRIPT_CONSTANTS = {
+    'bigQ_query.py': {'config': 'CONFIG_FILE', 'output': 'OUTPUT_FILE', 'format': 'OUTPUT_FORMAT'},
+    'spanner_query.py': {'config': 'CONFIG_FILE', 'output': 'OUTPUT_FILE', 'format': 'OUTPUT_FORMAT'},
+    'bigQ.csv.py': {'config': 'CONFIG_FILE_PATH', 'sql_file': 'SQL_FILE_PATH', 'output': 'OUTPUT_DIR',
+                    'format': 'OUTPUT_FORMAT', 'email_to': 'EMAIL_RECIPIENT'},
+    'Spanner.csv.py': {'config': 'CONFIG_PATH', 'sql_file': 'SQL_FILE', 'output': 'OUTPUT_DIR',
+                       'format': 'OUTPUT_FORMAT', 'email_to': 'EMAIL_RECIPIENT'},
+    'bigQ.exec.py': {'config': 'CONFIG_FILE_PATH', 'sql_file': 'SQL_FILE_PATH', 'resume': 'RESUME',
+                     'schedule': 'SCHEDULE_MODE', 'max_concurrent': 'MAX_CONCURRENT_STATEMENTS', 'dry_plan': 'DRY_PLAN'},
+}
+# Config file used by the DML scripts when --config is not given
+DML_CONFIG_FILE = 'config.ini'
+
+def load_command(command, backend):
+    """Import the script that implements a command for a backend and return its module."""
+    if (command, backend) not in COMMAND_SCRIPTS:
+        raise ValueError(f"'{command}' is not available for the {backend} backend")
+    return config_loader.load_script(COMMAND_SCRIPTS[(command, backend)])
+
+def parse_settings(pairs):
+    """Turn repeated --set KEY=VALUE options into a dict."""
+    settings = {}
+    for pair in pairs or []:
+        if '=' not in pair:
+            raise ValueError(f"--set expects KEY=VALUE, got '{pair}'")
+        key, value = pair.split('=', 1)
+        settings[key.strip()] = value.strip()
+    return settings
+
+def configure(script, filename, args):
+    """Set a script's constants from the command line options that were given."""
+    names = SCRIPT_CONSTANTS.get(filename, {})
+    for option, name in names.items():
+        value = getattr(args, option, None)
+        if value is not None:
+            setattr(script, name, value)
+    config_loader.set_constants(script, parse_settings(args.set), '--set')
+
+def run_query(script, args):
+    """Run bigQ_query.py or spanner_query.py on the query given on the command line."""
+    if args.sql_file:
+        with open(args.sql_file, 'r') as f:
+            script.QUERY = f.read().strip().rstrip(';')
+    else:
+        script.QUERY = args.sql
+    if args.backend == 'bigquery':
+        script.query_bigquery()
+    else:
+        script.query_spanner()
+
+def run_script_main(script, args):
+    """Run a script's own main() after its constants were configured."""
+    script.main()
+
+def run_dml(script, args):
+    """Run a DML input file through bigQ_dml_exec.py or spanner_partDML_exec.py."""
+    if args.backend == 'spanner':
+        if getattr(args, 'rows', None):
+            raise ValueError("--rows is only available for the bigquery backend")
+        # dml runs statements as batch DML in one transaction, pdml as partitioned DML
+        script.BATCH_MODE = args.command == 'dml'
+        script.execute_dml_from_file(args.config or DML_CONFIG_FILE, args.input_file, args.resume)
+    else:
+        script.execute_dml_from_file(args.config or DML_CONFIG_FILE, args.input_file, args.rows, args.resume)
+
+def run_load(script, args):
+    """Load a CSV or Parquet file into a Spanner table with spanner_bulk_load.py."""
+    script.execute_load(args.config or DML_CONFIG_FILE, args.table, args.input_file, args.resume)
+
+COMMAND_RUNNERS = {
+    'query': run_query,
+    'export': run_script_main,
+    'exec': run_script_main,
+    'dml': run_dml,
+    'pdml': run_dml,
+    'load': run_load,
+}
+
+def build_parser():
+    """Build the argument parser with one subcommand per operation."""
+    parser = argparse.ArgumentParser(description="Run BigQuery and Spanner reports and DML.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, help_text, backends):
+        sub = commands.add_parser(name, help=help_text)
+        if len(backends) == 1:
+            sub.add_argument('--backend', choices=backends, default=backends[0])
+        else:
+            sub.add_argument('--backend', choices=backends, required=True)
+        sub.add_argument('--config', help="Path to the config file")
+        sub.add_argument('--set', action='append', metavar='KEY=VALUE',
+                         help="Override any setting of the underlying script (repeatable)")
+        return sub
+
+    query = add_command('query', "Run one query and save its results", ['bigquery', 'spanner'])
+    sql = query.add_mutually_exclusive_group(required=True)
+    sql.add_argument('--sql', help="Query text")
+    sql.add_argument('--sql-file', help="File containing the query")
+    query.add_argument('--output', help="Output file")
+    query.add_argument('--format', help="csv, csv.gz, csv.zst, parquet, html or txt")
+
+    export = add_command('export', "Export every SELECT of a SQL file and email the files", ['bigquery', 'spanner'])
+    export.add_argument('--sql-file', help="File of ;-separated SELECT statements")
+    export.add_argument('--output', help="Output directory")
+    export.add_argument('--format', help="csv, csv.gz, csv.zst or parquet")
+    export.add_argument('--email-to', help="Email recipient")
+
+    exec_ = add_command('exec', "Execute every statement of a SQL file", ['bigquery'])
+    exec_.add_argument('--sql-file', help="File of ;-separated statements")
+    exec_.add_argument('--resume', action='store_true', default=None,
+                       help="Skip the statements an interrupted or failed run of the file completed")
+    exec_.add_argument('--schedule', choices=['serial', 'dag'],
+                       help="Run statements in file order, or concurrently along their table dependencies")
+    exec_.add_argument('--max-concurrent', type=int, help="Statements running at once with --schedule dag")
+    exec_.add_argument('--dry-plan', action='store_true', default=None,
+                       help="Print the statement dependency graph and its critical path, then exit")
+
+    for name, help_text, backends in (
+            ('dml', "Execute DML statements (BigQuery jobs or Spanner batch DML)", ['bigquery', 'spanner']),
+            ('pdml', "Execute Spanner partitioned DML statements", ['spanner'])):
+        dml = add_command(name, help_text, backends)
+        dml.add_argument('input_file', help="File with one DML statement per line, or a DML template with --rows")
+        if name == 'dml':
+            dml.add_argument('--rows', help="CSV or JSONL file of parameter rows; runs input_file as a "
+                                            "template reading them from @rows, one BigQuery job per batch")
+        dml.add_argument('--resume', action='store_true',
+                         help="Skip the statements an interrupted or failed run of input_file completed")
+
+    load = add_command('load', "Bulk load a CSV or Parquet file into a table as mutation batches", ['spanner'])
+    load.add_argument('input_file', help="CSV (with header, optionally .gz/.zst) or Parquet file")
+    load.add_argument('--table', required=True, help="Target table")
+    load.add_argument('--resume', action='store_true', help="Continue a failed load from its checkpoint")
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    filename = COMMAND_SCRIPTS[(args.command, args.backend)]
+    script = load_command(args.command, args.backend)
+    configure(script, filename, args)
+    COMMAND_RUNNERS[args.command](script, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+import configparser
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from google.cloud import bigquery
+from google.cloud import spanner
+from google.cloud.spanner_v1.pool import PingingPool
+import bq_storage
+import config_loader
+import result_cache
+import run_journal
+import telemetry
+import watermark
+
+# Configuration variables
+SCHEDULE_FILE = 'report_schedule.ini'  # Path to the schedule file (first command line argument overrides)
+MAX_CONCURRENT_JOBS = 4  # Jobs running at once across the whole daemon ([daemon] max_concurrent_jobs)
+SPANNER_POOL_SIZE = 10  # Sessions kept open per Spanner database ([daemon] spanner_pool_size)
+SPANNER_PING_INTERVAL = 300  # Seconds between keep-alive pings of idle Spanner sessions
+POLL_INTERVAL = 1.0  # Seconds between schedule checks
+
+# Schedule file format:
+#
+#   [daemon]
+#   config_file = config.ini        ; connection settings shared by every job
+#   max_concurrent_jobs = 4
+#
+#   [job:daily_sales]
+#   type = bq_export                ; bq_export, bq_exec, bq_dml, spanner_export or spanner_dml
+#   sql_file = daily_sales.sql      ; input_file for the DML types
+#   rows_file = updates.csv         ; bq_dml only: run input_file as a template over these rows
+#   interval = 3600                 ; run every N seconds, or
+#   at = 06:30                      ; run once a day at HH:MM
+#   max_instances = 1               ; concurrent runs of this job; a due run is skipped at the limit
+#   resume = true                   ; bq_exec and DML types: skip statements a failed earlier run completed
+#   output_format = csv.gz          ; any other key overrides the script constant of the same name,
+#   schedule_mode = dag             ; e.g. bq_exec running independent statements concurrently, or
+#   partitioned_mode = true         ; spanner_export through query partitions (concurrent_mode for bq_export)
+#
+# Each job gets its own copy of its script module, so constant overrides do
+# not leak between jobs that use the same script.
+
+# Script and input file key of each job type
+JOB_SCRIPTS = {
+    'bq_export': ('bigQ.csv.py', 'sql_file'),
+    'bq_exec': ('bigQ.exec.py', 'sql_file'),
+    'bq_dml': ('bigQ_dml_exec.py', 'input_file'),
+    'spanner_export': ('Spanner.csv.py', 'sql_file'),
+    'spanner_dml': ('spanner_partDML_exec.py', 'input_file'),
+}
+# Job keys handled by the daemon itself rather than passed to the script
+JOB_KEYS = {'type', 'sql_file', 'input_file', 'rows_file', 'interval', 'at', 'max_instances', 'dataset_id', 'email',
+            'resume'}
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ClientPool:
+    """
+    Long-lived clients shared by every job of the daemon.
+
+    Credentials are loaded once per service account file with
+    config_loader.load_credentials, so Spanner jobs also run against the
+    emulator (SPANNER_EMULATOR_HOST without credentials_path). The BigQuery
+    client keeps one authorized HTTP session for all jobs, and each Spanner database
+    is backed by a PingingPool whose sessions are kept alive by a background
+    thread, so jobs never pay for session creation.
+    """
+
+    def __init__(self, config_file, spanner_pool_size=SPANNER_POOL_SIZE):
+        self.config_file = config_file
+        self.spanner_pool_size = spanner_pool_size
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._settings = {}
+        self._bigquery = None
+        self._bigquery_read = None
+        self._spanner = None
+        self._databases = {}
+        self._session_pools = []
+        self._stop = threading.Event()
+
+    def credentials(self, settings):
+        """Return the credentials of a backend's settings, loading them on first use of their key file."""
+        path = settings['credentials_path']
+        with self._lock:
+            if path not in self._credentials:
+                self._credentials[path] = config_loader.load_credentials(settings)
+            return self._credentials[path]
+
+    def settings(self, backend):
+        """Return the connection settings of a backend, read from the config file on first use."""
+        with self._lock:
+            if backend not in self._settings:
+                self._settings[backend] = config_loader.load_config(self.config_file, backend)
+            return self._settings[backend]
+
+    def bigquery_client(self):
+        """Return the shared BigQuery client."""
+        settings = self.settings('bigquery')
+        credentials = self.credentials(settings)
+        with self._lock:
+            if self._bigquery is None:
+                self._bigquery = bigquery.Client(project=settings['project_id'], credentials=credentials)
+            return self._bigquery
+
+    def bigquery_read_client(self):
+        """Return the shared BigQuery Storage Read API client (None if not installed)."""
+        credentials = self.credentials(self.settings('bigquery'))
+        with self._lock:
+            if self._bigquery_read is None:
+                self._bigquery_read = bq_storage.create_read_client(credentials)
+            return self._bigquery_read
+
+    def spanner_database(self):
+        """Return the configured Spanner database, backed by a pinging session pool."""
+        settings = self.settings('spanner')
+        credentials = self.credentials(settings)
+        key = (settings['instance_id'], settings['database_id'])
+        with self._lock:
+            if self._spanner is None:
+                self._spanner = spanner.Client(project=settings.get('project_id'), credentials=credentials)
+            if key not in self._databases:
+                pool = PingingPool(size=self.spanner_pool_size, ping_interval=SPANNER_PING_INTERVAL)
+                database = self._spanner.instance(key[0]).database(key[1], pool=pool)
+                self._session_pools.append(pool)
+                threading.Thread(target=self._ping, args=(pool,), name=f"ping-{key[1]}", daemon=True).start()
+                self._databases[key] = database
+                logger.info(f"Opened Spanner session pool for {key[0]}/{key[1]} ({self.spanner_pool_size} sessions)")
+            return self._databases[key]
+
+    def _ping(self, pool):
+        while not self._stop.wait(SPANNER_PING_INTERVAL / 2):
+            try:
+                pool.ping()
+            except Exception as e:
+                logger.warning(f"Spanner session pool ping failed: {e}")
+
+    def close(self):
+        """Stop the keep-alive threads and release pooled sessions."""
+        self._stop.set()
+        for session_pool in self._session_pools:
+            session_pool.clear()
+        if self._bigquery is not None:
+            self._bigquery.close()
+
+class Job:
+    """One scheduled job from the schedule file."""
+
+    def __init__(self, section):
+        self.name = section.name.split(':', 1)[1]
+        self.section = section
+        self.type = section['type']
+        if self.type not in JOB_SCRIPTS:
+            raise ValueError(f"[{section.name}] unknown job type '{self.type}'. Use one of: {', '.join(JOB_SCRIPTS)}")
+        script, input_key = JOB_SCRIPTS[self.type]
+        self.input_file = section[input_key]
+        self.interval = section.getint('interval', fallback=0)
+        self.at = section.get('at')
+        if not self.interval and not self.at:
+            raise ValueError(f"[{section.name}] needs an 'interval' or an 'at' time")
+        self.max_instances = section.getint('max_instances', fallback=1)
+        self.running = 0
+        self.module = config_loader.load_script(script, f"job_{self.name}")
+        config_loader.set_constants(self.module, {key: section[key] for key in section if key not in JOB_KEYS},
+                                    f"[{section.name}]")
+        self.cache = None
+        if hasattr(self.module, 'RESULT_CACHE_DIR'):
+            m = self.module
+            self.cache = result_cache.ResultCache(m.RESULT_CACHE_DIR, m.RESULT_CACHE_MAX_BYTES,
+                                                  m.RESULT_CACHE_TTL, m.RESULT_CACHE_BYPASS)
+        self.next_run = self.following_run(datetime.now(), first=True)
+
+    def following_run(self, now, first=False):
+        """Return the next time this job is due after now."""
+        if self.at:
+            hour, minute = (int(part) for part in self.at.split(':'))
+            due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            return due if due > now else due + timedelta(days=1)
+        return now if first else now + timedelta(seconds=self.interval)
+
+def job_recorder(job):
+    """Return a telemetry recorder for one run of a job, writing to its script's TELEMETRY_FILE."""
+    return telemetry.Recorder(job.name, job.module.TELEMETRY_FILE)
+
+def run_bq_export(pool, job):
+    """Run a bigQ.csv.py export with the shared BigQuery clients."""
+    script = job.module
+    client = pool.bigquery_client()
+    read_client = pool.bigquery_read_client() if script.USE_STORAGE_API else None
+    watermarks = watermark.WatermarkStore(script.WATERMARK_STATE_FILE)
+    statements = script.run_preflight(client, script.read_sql_file(job.input_file), watermarks)
+    recorder = job_recorder(job)
+    failures = {}
+    try:
+        if script.CONCURRENT_MODE:
+            csv_files, failures = script.execute_select_statements_concurrently(
+                client, statements, script.MAX_CONCURRENT_QUERIES, read_client, job.cache, recorder, watermarks
+            )
+        else:
+            csv_files = script.execute_select_statements(client, statements, read_client, job.cache, recorder,
+                                                         watermarks)
+    finally:
+        recorder.log_summary()
+    if job.section.getboolean('email', fallback=True):
+        script.send_email(csv_files, script.EMAIL_RECIPIENT, script.EMAIL_SENDER, script.EMAIL_SUBJECT)
+    if failures:
+        raise RuntimeError(f"{len(failures)} statement(s) failed")
+
+def run_bq_exec(pool, job):
+    """Run a bigQ.exec.py statement file with the shared BigQuery client."""
+    script = job.module
+    client = pool.bigquery_client()
+    recorder = job_recorder(job)
+    journal = run_journal.open_journal(script.JOURNAL_FILE, job.input_file, f"bigquery:{client.project}",
+                                       job.section.getboolean('resume', fallback=False))
+    statements = script.read_sql_file(job.input_file)
+    if journal is not None:
+        statements = journal.pending(statements)
+    succeeded = False
+    try:
+        script.execute_sql_statements(client, script.run_preflight(client, statements), recorder, journal)
+        succeeded = True
+    finally:
+        recorder.log_summary()
+        if journal is not None:
+            journal.close(succeeded)
+
+def run_bq_dml(pool, job):
+    """Run a bigQ_dml_exec.py DML file, or a template with rows_file, with the shared BigQuery client."""
+    settings = pool.settings('bigquery')
+    dataset_id = job.section.get('dataset_id', settings.get('dataset_id'))
+    if job.section.get('rows_file'):
+        failures = job.module.run_template_file(pool.bigquery_client(), settings['project_id'], dataset_id,
+                                                job.input_file, job.section['rows_file'])
+        if failures:
+            raise RuntimeError(f"{failures} batch(es) failed")
+        return
+    failures = job.module.run_dml_file(pool.bigquery_client(), settings['project_id'], dataset_id, job.input_file,
+                                       job.section.getboolean('resume', fallback=False))
+    if failures:
+        raise RuntimeError(f"{failures} statement(s) failed")
+
+def run_spanner_export(pool, job):
+    """Run a Spanner.csv.py export on the pooled Spanner database."""
+    script = job.module
+    settings = pool.settings('spanner')
+    queries = script.read_sql_file(job.input_file)
+    recorder = job_recorder(job)
+    try:
+        if script.PARTITIONED_MODE:
+            # Partition worker processes open their own clients from the settings
+            csv_files = script.export_queries_partitioned(settings, queries, recorder, pool.spanner_database())
+        else:
+            csv_files = script.export_queries(pool.spanner_database(), script.get_target(settings), queries,
+                                              job.cache, recorder,
+                                              watermark.WatermarkStore(script.WATERMARK_STATE_FILE),
+                                              script.QUERY_WORKERS)
+    finally:
+        recorder.log_summary()
+    if job.section.getboolean('email', fallback=True):
+        script.send_email(csv_files, script.EMAIL_RECIPIENT, script.EMAIL_SENDER, script.EMAIL_SUBJECT)
+
+def run_spanner_dml(pool, job):
+    """Run a spanner_partDML_exec.py DML file on the pooled Spanner database."""
+    results = job.module.run_dml_file(pool.spanner_database(), job.input_file,
+                                      job.section.getboolean('resume', fallback=False))
+    failures = sum(1 for result in results if result[3] is not None)
+    if failures:
+        raise RuntimeError(f"{failures} statement(s) failed")
+
+JOB_RUNNERS = {
+    'bq_export': run_bq_export,
+    'bq_exec': run_bq_exec,
+    'bq_dml': run_bq_dml,
+    'spanner_export': run_spanner_export,
+    'spanner_dml': run_spanner_dml,
+}
+
+def load_schedule(schedule_file):
+    """
+    Read the schedule file.
+
+    Returns:
+        tuple: daemon settings (SectionProxy), list of Job
+    """
+    if not os.path.exists(schedule_file):
+        raise FileNotFoundError(f"Schedule file {schedule_file} not found")
+    schedule = configparser.ConfigParser()
+    schedule.read(schedule_file)
+    if 'daemon' not in schedule:
+        raise ValueError("Schedule file missing [daemon] section")
+    jobs = [Job(schedule[name]) for name in schedule.sections() if name.startswith('job:')]
+    if not jobs:
+        raise ValueError("Schedule file defines no [job:NAME] sections")
+    return schedule['daemon'], jobs
+
+class Scheduler:
+    """Runs due jobs on a bounded thread pool until stopped."""
+
+    def __init__(self, pool, jobs, max_concurrent_jobs=MAX_CONCURRENT_JOBS):
+        self.pool = pool
+        self.jobs = jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix='job')
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_job(self, job):
+        """Run one job and log its outcome; failures never stop the scheduler."""
+        start = time.monotonic()
+        logger.info(f"Job {job.name} started")
+        try:
+            JOB_RUNNERS[job.type](self.pool, job)
+            logger.info(f"Job {job.name} finished in {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Job {job.name} failed after {time.monotonic() - start:.1f}s: {e}")
+        finally:
+            with self._lock:
+                job.running -= 1
+
+    def submit_due_jobs(self, now):
+        """Submit every job that is due, honouring each job's max_instances."""
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            job.next_run = job.following_run(now)
+            with self._lock:
+                if job.running >= job.max_instances:
+                    logger.warning(f"Job {job.name} skipped: {job.running} run(s) still in progress")
+                    continue
+                job.running += 1
+            self.executor.submit(self.run_job, job)
+
+    def run_forever(self):
+        """Run the schedule until stop() is called, then wait for running jobs."""
+        logger.info(f"Scheduler started with {len(self.jobs)} job(s)")
+        while not self.stop_event.is_set():
+            self.submit_due_jobs(datetime.now())
+            self.stop_event.wait(POLL_INTERVAL)
+        logger.info("Stopping: waiting for running jobs to finish")
+        self.executor.shutdown(wait=True)
+
+    def stop(self, *args):
+        """Stop scheduling new runs (also used as the SIGTERM/SIGINT handler)."""
+        self.stop_event.set()
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else SCHEDULE_FILE
+    settings, jobs = load_schedule(schedule_file)
+
+    # Connection settings are read once for the lifetime of the daemon
+    pool = ClientPool(settings.get('config_file', 'config.ini'),
+                      settings.getint('spanner_pool_size', fallback=SPANNER_POOL_SIZE))
+
+    scheduler = Scheduler(pool, jobs, settings.getint('max_concurrent_jobs', fallback=MAX_CONCURRENT_JOBS))
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    try:
+        scheduler.run_forever()
+    finally:
+        for job in jobs:
+            if job.cache is not None:
+                job.cache.log_summary()
+        pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+# Default location and limits of the shared result cache
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/report_results')
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+# Per-statement TTL override, e.g. "-- cache_ttl: 900" (0 disables caching)
+_TTL_DIRECTIVE = re.compile(r'--\s*cache_ttl\s*[:=]\s*(\d+)', re.IGNORECASE)
+# String literals and quoted identifiers, kept verbatim; a backslash escapes the next character (as in sql_reader)
+_QUOTED = re.compile(
+    r"""'''(?:\\.|[^\\])*?'''|\"\"\"(?:\\.|[^\\])*?\"\"\""""
+    r"""|'(?:\\.|[^\\'])*'|"(?:\\.|[^\\"])*"|`(?:\\.|[^\\`])*`""",
+    re.DOTALL
+)
+_WHITESPACE = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+def normalize_sql(sql):
+    """Collapse whitespace outside string literals and drop a trailing semicolon."""
+    sql = sql.strip().rstrip(';').strip()
+    parts = []
+    pos = 0
+    for match in _QUOTED.finditer(sql):
+        parts.append(_WHITESPACE.sub(' ', sql[pos:match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+    parts.append(_WHITESPACE.sub(' ', sql[pos:]))
+    return ''.join(parts)
+
+def statement_ttl(sql, default_ttl=DEFAULT_TTL_SECONDS):
+    """Return the TTL in seconds for a statement, honouring a "-- cache_ttl: N" comment."""
+    match = _TTL_DIRECTIVE.search(sql)
+    return int(match.group(1)) if match else default_ttl
+
+class CacheEntry:
+    """Result of a cache lookup; hit is True when a fresh cached output exists."""
+
+    def __init__(self, key, ttl, hit=False, filename=None):
+        self.key = key
+        self.ttl = ttl
+        self.hit = hit
+        self.filename = filename
+
+class ResultCache:
+    """
+    On-disk cache of report output files shared by all report scripts.
+
+    Entries are keyed by normalized SQL, target (project/instance/database),
+    query parameters and output format. An SQLite index tracks expiry and last
+    use; when the cache grows past max_bytes the least recently used entries
+    are evicted. With bypass set, every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 default_ttl=DEFAULT_TTL_SECONDS, bypass=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, filename TEXT, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the cache usable from threads
+        return sqlite3.connect(os.path.join(self.cache_dir, 'index.db'), timeout=30)
+
+    @staticmethod
+    def make_key(sql, target, params=None, fmt=None):
+        """Return the cache key for a statement run against a target with parameters."""
+        payload = json.dumps({
+            'sql': normalize_sql(sql),
+            'target': target,
+            'params': params or {},
+            'format': fmt,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def lookup(self, sql, target, params=None, fmt=None):
+        """Look up a statement and return a CacheEntry (hit or miss)."""
+        entry = CacheEntry(self.make_key(sql, target, params, fmt), statement_ttl(sql, self.default_ttl))
+        if self.bypass or entry.ttl <= 0:
+            self._count(hit=False)
+            return entry
+
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT filename, expires_at FROM entries WHERE key = ?", (entry.key,)).fetchone()
+            if row and row[1] > now and (row[0] is None or os.path.exists(self._path(row[0]))):
+                conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, entry.key))
+                entry.hit = True
+                entry.filename = row[0]
+        self._count(hit=entry.hit)
+        return entry
+
+    def restore(self, entry, output_path):
+        """
+        Copy a cached output file to output_path.
+
+        Returns:
+            str or None: output_path, or None if the cached result was empty
+        """
+        if entry.filename is None:
+            return None
+        shutil.copyfile(self._path(entry.filename), output_path)
+        logger.info(f"Result cache hit: restored {output_path}")
+        return output_path
+
+    def store(self, entry, output_path):
+        """Store a freshly written output file (None for an empty result) under entry's key."""
+        if self.bypass or entry.ttl <= 0:
+            return
+        filename = None
+        size = 0
+        if output_path is not None:
+            filename = entry.key + _extension(output_path)
+            temp_path = self._path(f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, self._path(filename))
+            size = os.path.getsize(self._path(filename))
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, filename, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (entry.key, filename, size, now + entry.ttl, now)
+            )
+        self._evict()
+
+    def _evict(self):
+        """Remove expired entries, then least recently used ones until under max_bytes."""
+        with self._connect() as conn:
+            expired = conn.execute("SELECT key, filename FROM entries WHERE expires_at <= ?", (time.time(),)).fetchall()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE expires_at > ?",
+                                 (time.time(),)).fetchone()[0]
+            victims = list(expired)
+            if total > self.max_bytes:
+                for key, filename, size in conn.execute(
+                        "SELECT key, filename, size FROM entries WHERE expires_at > ? ORDER BY last_used",
+                        (time.time(),)):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((key, filename))
+                    total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+        for _, filename in victims:
+            if filename is not None:
+                try:
+                    os.remove(self._path(filename))
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, filename):
+        return os.path.join(self.cache_dir, filename)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def log_summary(self):
+        """Log the number of cache hits and misses of this run."""
+        state = " (bypassed)" if self.bypass else ""
+        logger.info(f"Result cache{state}: {self.hits} hit(s), {self.misses} miss(es)")
+
+def _extension(path):
+    """Return the full extension of a file name, e.g. '.csv.gz'."""
+    name = os.path.basename(path)
+    return name[name.index('.'):] if '.' in name else ''
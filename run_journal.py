@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from telemetry import statement_hash
+
+# Default location of the journal shared by all statement runners
+DEFAULT_JOURNAL_FILE = os.path.expanduser('~/.cache/report_journal.db')
+# Statement and error text kept per journal entry
+PREVIEW_CHARS = 1000
+
+logger = logging.getLogger(__name__)
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+class RunJournal:
+    """
+    Durable record of the statements of one input file run against one target.
+
+    Each statement is identified by its hash and its occurrence among equal
+    statements of the file, so editing other lines does not invalidate it.
+    A statement is marked running before it executes and done (with its
+    affected rows) or failed after; every change is committed to SQLite in
+    WAL mode with full sync, so the journal survives a crash at any point.
+
+    A new run starts with an empty journal. With resume, an unfinished run
+    is continued: statements already done are skipped, failed, interrupted
+    and never-started ones run again. A statement that completed just before
+    a crash, but was not yet marked done, runs again on resume. Resuming a
+    run that finished without failures starts a new run.
+    """
+
+    def __init__(self, path, input_file, target, resume=False):
+        self.path = path
+        self.input_file = os.path.abspath(input_file)
+        self.target = target
+        self.journal_id = hashlib.sha256(f"{self.input_file}\n{target}".encode('utf-8')).hexdigest()[:16]
+        self.skipped = 0
+        self._done = set()
+        self._occurrences = defaultdict(int)
+        self._queued = defaultdict(deque)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            row = conn.execute("SELECT finished, started_at FROM runs WHERE journal = ?", (self.journal_id,)).fetchone()
+            if resume and row and not row[0]:
+                self._done = set(conn.execute(
+                    "SELECT statement_hash, occurrence FROM statements WHERE journal = ? AND status = 'done'",
+                    (self.journal_id,)))
+                logger.info(f"Resuming run of {self.input_file} on {target} started at {row[1]}: "
+                            f"{len(self._done)} statement(s) already done")
+                return
+            if row and not row[0]:
+                logger.warning(f"The previous run of {self.input_file} on {target} did not finish; "
+                               f"starting over (resume skips its completed statements)")
+            elif resume:
+                logger.info(f"No unfinished run of {self.input_file} on {target} to resume; starting a new run")
+            conn.execute("DELETE FROM statements WHERE journal = ?", (self.journal_id,))
+            conn.execute("INSERT OR REPLACE INTO runs (journal, input_file, target, started_at, finished)"
+                         " VALUES (?, ?, ?, ?, 0)", (self.journal_id, self.input_file, target, _now()))
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the journal usable from threads
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " journal TEXT PRIMARY KEY, input_file TEXT NOT NULL, target TEXT NOT NULL,"
+            " started_at TEXT NOT NULL, finished_at TEXT, finished INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS statements ("
+            " journal TEXT NOT NULL, statement_hash TEXT NOT NULL, occurrence INTEGER NOT NULL,"
+            " status TEXT NOT NULL, rows INTEGER, error TEXT, statement TEXT, updated_at TEXT NOT NULL,"
+            " PRIMARY KEY (journal, statement_hash, occurrence))"
+        )
+        return conn
+
+    def pending(self, statements):
+        """Yield the statements that still have to run, in file order, skipping those already done."""
+        for statement in statements:
+            digest = statement_hash(statement)
+            with self._lock:
+                self._occurrences[digest] += 1
+                entry = (digest, self._occurrences[digest])
+                if entry in self._done:
+                    self.skipped += 1
+                    continue
+                self._queued[digest].append(entry[1])
+            yield statement
+
+    def start(self, statement):
+        """
+        Mark the next queued occurrence of a statement as running.
+
+        Equal statements target the same table, so they never run at the
+        same time and are started in file order.
+
+        Returns:
+            tuple: Journal entry to pass to finish
+        """
+        digest = statement_hash(statement)
+        with self._lock:
+            queued = self._queued[digest]
+            entry = (digest, queued.popleft() if queued else self._occurrences[digest])
+        self._write(entry, 'running', statement=statement[:PREVIEW_CHARS])
+        return entry
+
+    def finish(self, entry, rows=None, error=None):
+        """Mark a started statement as done with its affected rows, or as failed with its error."""
+        if error is None:
+            self._write(entry, 'done', rows=rows)
+        else:
+            self._write(entry, 'failed', error=str(error)[:PREVIEW_CHARS])
+
+    def _write(self, entry, status, rows=None, error=None, statement=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO statements (journal, statement_hash, occurrence, status, rows, error, statement,"
+                " updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (journal, statement_hash, occurrence) DO UPDATE SET status = excluded.status,"
+                " rows = excluded.rows, error = excluded.error, updated_at = excluded.updated_at,"
+                " statement = COALESCE(excluded.statement, statement)",
+                (self.journal_id, entry[0], entry[1], status, rows, error, statement, _now())
+            )
+
+    def close(self, succeeded):
+        """Record the end of the run; a run that succeeded is not resumed."""
+        with self._connect() as conn:
+            conn.execute("UPDATE runs SET finished = ?, finished_at = ? WHERE journal = ?",
+                         (1 if succeeded else 0, _now(), self.journal_id))
+        if self.skipped:
+            logger.info(f"Skipped {self.skipped} statement(s) already done in the resumed run")
+
+def open_journal(path, input_file, target, resume=False):
+    """
+    Return the RunJournal of an input file and target, or None if journaling is disabled (path '').
+
+    Raises:
+        ValueError: If resume is requested without a journal
+    """
+    if not path:
+        if resume:
+            raise ValueError("Resuming a run needs a journal file")
+        return None
+    return RunJournal(path, input_file, target, resume)
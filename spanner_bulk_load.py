@@ -0,0 +1,473 @@
+import base64
+import csv
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from google.cloud import spanner
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import (Aborted, DeadlineExceeded, GoogleAPIError, InternalServerError,
+                                        ServiceUnavailable, TooManyRequests)
+import config_loader
+import dml_scheduler
+import output_writers
+
+try:
+    import pyarrow.parquet
+except ImportError:  # Only needed for Parquet input
+    pyarrow = None
+
+# Load settings
+TABLE_NAME = ''  # Target table; [schema.]table
+WRITE_MODE = 'insert_or_update'  # 'insert_or_update' and 'replace' make resumed batches idempotent, 'insert' fails on existing keys
+MAX_MUTATIONS_PER_COMMIT = 80000  # Spanner's per-commit mutation limit
+MUTATION_HEADROOM = 0.5  # Fraction of the limit each batch targets, leaving room for growth of the schema
+MAX_COMMIT_BYTES = 50 * 1024 ** 2  # Approximate batch size cap; Spanner rejects commits over 100 MB
+COMMIT_WORKERS = 8  # Batches committed in parallel (also the session pool size)
+MAX_ATTEMPTS = 5  # Attempts per batch for retryable errors
+RETRY_BASE_DELAY = 1.0  # Seconds; doubled after every retryable failure (with jitter)
+RETRY_MAX_DELAY = 32.0  # Upper bound in seconds for a single backoff delay
+MAX_FAILED_BATCHES = 1  # Stop reading after this many batches failed (0 = load everything possible)
+PROGRESS_INTERVAL = 10  # Seconds between progress lines
+RESUME = False  # Continue from the checkpoint of an earlier run of the same file and table
+PARQUET_READ_ROWS = 10000  # Rows decoded per Parquet read
+
+# Commit write methods of a Spanner batch
+WRITE_MODES = ('insert_or_update', 'insert', 'replace')
+# Errors worth retrying a commit for
+RETRYABLE_ERRORS = (Aborted, DeadlineExceeded, InternalServerError, ServiceUnavailable, TooManyRequests)
+# CSV value that writes the commit timestamp into a TIMESTAMP column
+COMMIT_TIMESTAMP_VALUE = 'spanner.commit_timestamp()'
+
+# Column type as reported by INFORMATION_SCHEMA, e.g. STRING(MAX) or ARRAY<INT64>
+_ARRAY_TYPE = re.compile(r'^ARRAY<(.+)>$', re.IGNORECASE)
+_TYPE_LENGTH = re.compile(r'\(.*\)$')
+
+# Configure logging
+logging.basicConfig(
+    filename='spanner_load.log',
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def load_config(config_file):
+    """
+    Load configuration from config.ini file.
+
+    Args:
+        config_file (str): Path to the configuration file
+
+    Returns:
+        dict: Spanner settings from config_loader.load_config
+    """
+    try:
+        return config_loader.load_config(config_file, 'spanner')
+    except KeyError as e:
+        logging.error(f"Missing configuration key: {str(e)}")
+        raise
+    except Exception as e:
+        logging.error(f"Error reading config file '{config_file}': {str(e)}")
+        raise
+
+def get_database(settings, pool_size=COMMIT_WORKERS):
+    """
+    Return the configured database with a session pool sized for the commit workers.
+
+    With SPANNER_EMULATOR_HOST set (e.g. localhost:9010 after
+    'gcloud emulators spanner start'), the client talks to the local emulator
+    with anonymous credentials.
+    """
+    credentials = config_loader.load_credentials(settings)
+    client = spanner.Client(project=settings['project_id'], credentials=credentials)
+    instance = client.instance(settings['instance_id'])
+    return instance.database(settings['database_id'], pool=spanner.FixedSizePool(size=pool_size))
+
+def split_table_name(table):
+    """Return (schema, table) for a [schema.]table name; the default schema is ''."""
+    schema, _, name = table.rpartition('.')
+    return schema, name
+
+def table_columns(database, table):
+    """
+    Return the writable columns of a table and the columns of its secondary indexes.
+
+    Returns:
+        tuple: dict of column name -> Spanner type (in table order), number of
+            secondary index columns (each is one more mutation per inserted row)
+    """
+    schema, name = split_table_name(table)
+    params = {'schema': schema, 'table': name}
+    param_types = {'schema': spanner.param_types.STRING, 'table': spanner.param_types.STRING}
+    with database.snapshot(multi_use=True) as snapshot:
+        columns = {
+            column: spanner_type for column, spanner_type in snapshot.execute_sql(
+                "SELECT COLUMN_NAME, SPANNER_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+                "WHERE TABLE_SCHEMA = @schema AND TABLE_NAME = @table AND IS_GENERATED = 'NEVER' "
+                "ORDER BY ORDINAL_POSITION",
+                params=params, param_types=param_types
+            )
+        }
+        index_columns = list(snapshot.execute_sql(
+            "SELECT COUNT(*) FROM INFORMATION_SCHEMA.INDEX_COLUMNS "
+            "WHERE TABLE_SCHEMA = @schema AND TABLE_NAME = @table AND INDEX_TYPE = 'INDEX'",
+            params=params, param_types=param_types
+        ))[0][0]
+    if not columns:
+        raise ValueError(f"Table '{table}' not found")
+    return columns, index_columns
+
+def rows_per_batch(column_count, index_columns=0):
+    """Return how many rows fit in one commit under the mutation limit, with headroom."""
+    # Every column written and every secondary index column is one mutation per row
+    per_row = column_count + index_columns
+    return max(1, int(MAX_MUTATIONS_PER_COMMIT * MUTATION_HEADROOM) // per_row)
+
+def _parse_bool(value):
+    lowered = value.strip().lower()
+    if lowered in ('true', 't', '1', 'yes', 'y'):
+        return True
+    if lowered in ('false', 'f', '0', 'no', 'n'):
+        return False
+    raise ValueError(f"invalid BOOL value '{value}'")
+
+def _parse_timestamp(value):
+    if value == COMMIT_TIMESTAMP_VALUE:
+        return spanner.COMMIT_TIMESTAMP
+    value = value.strip().replace(' ', 'T', 1)
+    if value.endswith('Z'):
+        # Keeps nanosecond precision
+        return DatetimeWithNanoseconds.from_rfc3339(value)
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _parse_bytes(value):
+    # The client expects base64 text for BYTES; CSV exports already hold it
+    base64.b64decode(value, validate=True)
+    return value.encode('ascii')
+
+def _parse_json(value):
+    json.loads(value)
+    return value
+
+# Conversion of a CSV string to each scalar column type
+_STRING_PARSERS = {
+    'INT64': int,
+    'FLOAT64': float,
+    'FLOAT32': float,
+    'NUMERIC': Decimal,
+    'BOOL': _parse_bool,
+    'DATE': date.fromisoformat,
+    'TIMESTAMP': _parse_timestamp,
+    'BYTES': _parse_bytes,
+    'JSON': _parse_json,
+}
+
+def column_converter(spanner_type):
+    """
+    Return a function converting a CSV or Parquet value to a column's type.
+
+    Strings are parsed (empty strings are NULL except in STRING columns);
+    values Parquet already decoded are passed through, except raw bytes,
+    which are base64 encoded, and JSON objects, which are serialized.
+    ARRAY columns take a JSON array in CSV files.
+    """
+    array = _ARRAY_TYPE.match(spanner_type)
+    if array:
+        convert_element = column_converter(array.group(1))
+
+        def convert_array(value):
+            if value is None or value == '':
+                return None
+            if isinstance(value, str):
+                value = json.loads(value)
+            return [convert_element(v) for v in value]
+        return convert_array
+
+    base_type = _TYPE_LENGTH.sub('', spanner_type).upper()
+    parse = _STRING_PARSERS.get(base_type)
+
+    def convert(value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            if base_type == 'STRING':
+                return value
+            if value == '':
+                return None
+            return parse(value) if parse else value
+        if base_type == 'BYTES' and isinstance(value, (bytes, bytearray)):
+            return base64.b64encode(value)
+        if base_type == 'JSON' and not isinstance(value, str):
+            return json.dumps(value)
+        return value
+    return convert
+
+def input_format(path):
+    """Return the input format of a file from its extension: csv, csv.gz, csv.zst or parquet."""
+    for fmt, extension in sorted(output_writers.FORMAT_EXTENSIONS.items(), key=lambda item: -len(item[1])):
+        if path.lower().endswith(extension):
+            return fmt
+    raise ValueError(f"Unsupported input file '{path}'. Use one of: "
+                     f"{', '.join(output_writers.FORMAT_EXTENSIONS.values())}")
+
+def read_source(path):
+    """
+    Open a CSV (with header) or Parquet file for streaming.
+
+    Returns:
+        tuple: column names, iterator of row value lists, close function
+    """
+    fmt = input_format(path)
+    if fmt == 'parquet':
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for Parquet input")
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        columns = parquet_file.schema_arrow.names
+
+        def parquet_rows():
+            for record_batch in parquet_file.iter_batches(batch_size=PARQUET_READ_ROWS):
+                yield from zip(*(column.to_pylist() for column in record_batch.columns))
+        return columns, parquet_rows(), parquet_file.close
+
+    f = output_writers.open_text_input(path, fmt)
+    reader = csv.reader(f)
+    columns = next(reader, None)
+    if columns is None:
+        f.close()
+        raise ValueError(f"{path} is empty; a header row with the column names is required")
+    return columns, reader, f.close
+
+def match_columns(source_columns, table_columns, table):
+    """Map source column names to the table's columns (case-insensitively) and return them in source order."""
+    by_name = {column.lower(): column for column in table_columns}
+    unknown = [column for column in source_columns if column.lower() not in by_name]
+    if unknown:
+        raise ValueError(f"Column(s) {', '.join(unknown)} not found in table '{table}' (or generated)")
+    return [by_name[column.lower()] for column in source_columns]
+
+def iter_batches(rows, batch_rows, max_bytes=MAX_COMMIT_BYTES):
+    """
+    Group raw source rows into numbered batches of at most batch_rows rows.
+
+    A batch also ends early once its approximate size reaches max_bytes; the
+    same file always produces the same batches, which is what resuming relies on.
+
+    Yields:
+        tuple: batch number (1-based), list of raw rows
+    """
+    batch = []
+    batch_bytes = 0
+    number = 0
+    for row in rows:
+        batch.append(row)
+        batch_bytes += sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+        if len(batch) >= batch_rows or batch_bytes >= max_bytes:
+            number += 1
+            yield number, batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield number + 1, batch
+
+class Checkpoint:
+    """
+    Committed batches of a load, saved next to the source file.
+
+    Batches commit out of order, so the checkpoint keeps the highest batch
+    number up to which every batch is committed plus the committed batches
+    beyond it. A checkpoint is only reused for the same file (size and
+    modification time), table and batch limits (rows and bytes), since
+    other limits number the batches differently.
+    """
+
+    def __init__(self, path, identity):
+        self.path = path
+        self.identity = identity
+        self.committed_through = 0
+        self.committed = set()
+        self.rows_committed = 0
+
+    @classmethod
+    def for_load(cls, source_file, table, batch_rows, max_bytes, resume):
+        """Return the checkpoint of a load, continuing a saved one when resume is set."""
+        path = f"{source_file}.{table}.checkpoint"
+        stat = os.stat(source_file)
+        checkpoint = cls(path, {'source': os.path.abspath(source_file), 'size': stat.st_size,
+                                'mtime': stat.st_mtime, 'table': table, 'batch_rows': batch_rows,
+                                'max_bytes': max_bytes})
+        if not os.path.exists(path):
+            return checkpoint
+        if not resume:
+            raise ValueError(f"Checkpoint {path} exists from an earlier load; resume it or delete the file")
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        if saved['identity'] != checkpoint.identity:
+            raise ValueError(f"Checkpoint {path} belongs to a different file, table or batch size; delete it to start over")
+        checkpoint.committed_through = saved['committed_through']
+        checkpoint.committed = set(saved['committed'])
+        checkpoint.rows_committed = saved['rows_committed']
+        return checkpoint
+
+    def is_committed(self, number):
+        return number <= self.committed_through or number in self.committed
+
+    def mark_committed(self, number, row_count):
+        self.committed.add(number)
+        self.rows_committed += row_count
+        while self.committed_through + 1 in self.committed:
+            self.committed_through += 1
+            self.committed.discard(self.committed_through)
+
+    def save(self):
+        """Write the checkpoint atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'identity': self.identity, 'committed_through': self.committed_through,
+                       'committed': sorted(self.committed), 'rows_committed': self.rows_committed}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def commit_batch(database, table, columns, values):
+    """Commit one batch of rows as mutations, retrying retryable errors with backoff."""
+    def run():
+        with database.batch() as batch:
+            getattr(batch, WRITE_MODE)(table=table, columns=columns, values=values)
+
+    dml_scheduler.call_with_backoff(run, lambda e: isinstance(e, RETRYABLE_ERRORS), MAX_ATTEMPTS,
+                                    RETRY_BASE_DELAY, RETRY_MAX_DELAY, description=f"commit to {table}")
+
+def run_load(database, table, source_file, resume=None):
+    """
+    Stream a CSV or Parquet file into a table as parallel mutation batches.
+
+    Values are converted to the table's column types in the reading thread;
+    up to COMMIT_WORKERS batches commit at once. After every committed batch
+    the checkpoint is updated, so a load stopped by a failed batch continues
+    with resume=True where it left off, skipping committed batches.
+
+    Args:
+        database: Spanner Database
+        table (str): Target table, [schema.]table
+        source_file (str): CSV (optionally .gz/.zst compressed) or Parquet file
+        resume (bool): Continue from a saved checkpoint (default RESUME)
+
+    Returns:
+        int: Number of failed batches
+    """
+    if WRITE_MODE not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode '{WRITE_MODE}'. Use one of: {', '.join(WRITE_MODES)}")
+    resume = RESUME if resume is None else resume
+
+    types, index_columns = table_columns(database, table)
+    source_columns, rows, close = read_source(source_file)
+    try:
+        columns = match_columns(source_columns, types, table)
+        converters = [column_converter(types[column]) for column in columns]
+        batch_rows = rows_per_batch(len(columns), index_columns)
+        checkpoint = Checkpoint.for_load(source_file, table, batch_rows, MAX_COMMIT_BYTES, resume)
+        if checkpoint.committed_through or checkpoint.committed:
+            logging.info(f"Resuming {source_file}: {checkpoint.rows_committed} row(s) already committed")
+            print(f"Resuming {source_file}: {checkpoint.rows_committed} row(s) already committed")
+        logging.info(f"Loading {source_file} into {table}: {len(columns)} column(s), {batch_rows} row(s) per batch, "
+                     f"{COMMIT_WORKERS} commit worker(s)")
+
+        start = time.monotonic()
+        last_progress = start
+        loaded = 0
+        failed = []
+        pending = deque()
+
+        def report(number, row_count, future):
+            nonlocal loaded
+            try:
+                future.result()
+            except GoogleAPIError as e:
+                failed.append(number)
+                logging.error(f"Batch {number} ({row_count} rows) failed: {str(e)}")
+                print(f"Error committing batch {number} ({row_count} rows): {str(e)}")
+                return
+            loaded += row_count
+            checkpoint.mark_committed(number, row_count)
+            checkpoint.save()
+
+        with dml_scheduler.KeyedExecutor(COMMIT_WORKERS) as executor:
+            for number, raw_rows in iter_batches(rows, batch_rows, MAX_COMMIT_BYTES):
+                if MAX_FAILED_BATCHES and len(failed) >= MAX_FAILED_BATCHES:
+                    break
+                if checkpoint.is_committed(number):
+                    continue
+                try:
+                    values = [[convert(value) for convert, value in zip(converters, row)] for row in raw_rows]
+                except (ValueError, ArithmeticError) as e:
+                    failed.append(number)
+                    logging.error(f"Batch {number}: cannot convert row values: {str(e)}")
+                    print(f"Error converting batch {number}: {str(e)}")
+                    continue
+                # Distinct keys: batches are independent and commit concurrently
+                pending.append((number, len(values), executor.submit(number, commit_batch, database, table,
+                                                                     columns, values)))
+                while pending and pending[0][2].done():
+                    report(*pending.popleft())
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    rate = loaded / (last_progress - start)
+                    logging.info(f"Committed {loaded} row(s), {rate:,.0f} rows/s")
+                    print(f"Committed {loaded} row(s), {rate:,.0f} rows/s")
+            while pending:
+                report(*pending.popleft())
+    finally:
+        close()
+
+    elapsed = time.monotonic() - start
+    rate = loaded / elapsed if elapsed > 0 else 0
+    summary = (f"Loaded {loaded} row(s) into {table} in {elapsed:.1f}s ({rate:,.0f} rows/s), "
+               f"{len(failed)} batch(es) failed")
+    logging.info(summary)
+    print(summary)
+    if failed:
+        print(f"Failed batch(es): {', '.join(str(n) for n in sorted(failed))}. "
+              f"Fix the cause and rerun with resume to load the remaining rows.")
+    else:
+        checkpoint.remove()
+    return len(failed)
+
+def execute_load(config_file, table, source_file, resume=None):
+    """
+    Load a CSV or Parquet file into a Spanner table and log the results.
+
+    Args:
+        config_file (str): Path to configuration file
+        table (str): Target table
+        source_file (str): Path to the CSV or Parquet file
+        resume (bool): Continue from a saved checkpoint
+    """
+    try:
+        settings = load_config(config_file)
+        database = get_database(settings, COMMIT_WORKERS)
+        run_load(database, table, source_file, resume)
+
+    except FileNotFoundError as e:
+        logging.error(f"File '{e.filename or source_file}' not found")
+        print(f"Error: File '{e.filename or source_file}' not found")
+    except ValueError as e:
+        logging.error(str(e))
+        print(f"Error: {str(e)}")
+    except GoogleAPIError as e:
+        logging.error(f"Spanner client error: {str(e)}")
+        print(f"Error initializing Spanner client: {str(e)}")
+    except Exception as e:
+        logging.error(f"Unexpected error: {str(e)}")
+        print(f"Unexpected error: {str(e)}")
+
+if __name__ == "__main__":
+    config_file = "config.ini"
+    source_file = "extract.csv"
+
+    execute_load(config_file, TABLE_NAME, source_file)
@@ -1,9 +1,21 @@
 import logging
-import configparser
-import os
+import time
 from google.cloud import spanner
 from google.api_core.exceptions import GoogleAPIError
-from google.oauth2 import service_account
+import config_loader
+import dml_scheduler
+import run_journal
+import sql_reader
+import telemetry
+
+# Execution settings
+PARALLEL_MODE = True  # Run partitioned DML against different tables concurrently
+MAX_CONCURRENT_STATEMENTS = 4  # Maximum number of partitioned DML statements running at once
+BATCH_MODE = False  # Run statements as batch_update calls in one read-write transaction instead of PDML
+BATCH_SIZE = 100  # Statements per batch_update call in batch mode
+SPLIT_ON_NEWLINE = True  # One statement per line; set False for ;-terminated multi-line statements
+TELEMETRY_FILE = 'telemetry.jsonl'  # JSON record per statement is appended here ('' logs records only)
+JOURNAL_FILE = run_journal.DEFAULT_JOURNAL_FILE  # Per-statement status of each run, for --resume ('' disables)
 
 # Configure logging
 logging.basicConfig(
@@ -23,19 +35,10 @@ def load_config(config_file):
         tuple: instance_id, database_id, credentials
     """
     try:
-        config = configparser.ConfigParser()
-        config.read(config_file)
-        
-        instance_id = config['Spanner']['instance_id']
-        database_id = config['Spanner']['database_id']
-        auth_json_path = config['Spanner']['auth_json_path']
+        settings = config_loader.load_config(config_file, 'spanner')
+        credentials = config_loader.load_credentials(settings)
         
-        # Set credentials from auth JSON file
-        if not os.path.exists(auth_json_path):
-            raise FileNotFoundError(f"Authentication JSON file not found at: {auth_json_path}")
-        credentials = service_account.Credentials.from_service_account_file(auth_json_path)
-        
-        return instance_id, database_id, credentials
+        return settings['instance_id'], settings['database_id'], credentials
     
     except KeyError as e:
         logging.error(f"Missing configuration key: {str(e)}")
@@ -44,13 +47,178 @@ def load_config(config_file):
         logging.error(f"Error reading config file '{config_file}': {str(e)}")
         raise
 
-def execute_dml_from_file(config_file, input_file):
+def run_partitioned_dml(database, statement, recorder=None, index=None, queued_at=None, journal=None):
+    """
+    Execute one statement as partitioned DML, recording its telemetry in recorder and its status in journal.
+    
+    Returns:
+        tuple: (affected row count, wall time in seconds)
+    """
+    recorder = recorder or telemetry.Recorder('spanner_partDML_exec')
+    entry = journal.start(statement) if journal is not None else None
+    try:
+        with recorder.track(index, statement, queued_at) as record:
+            record.rows = database.execute_partitioned_dml(statement)
+    except Exception as e:
+        if entry is not None:
+            journal.finish(entry, error=e)
+        raise
+    if entry is not None:
+        journal.finish(entry, record.rows)
+    return record.rows, record.wall_seconds
+
+def execute_partitioned_parallel(database, dml_statements, max_concurrent=MAX_CONCURRENT_STATEMENTS, recorder=None,
+                                 journal=None):
+    """
+    Execute partitioned DML statements with up to max_concurrent running at once.
+    
+    Statements that write to the same table run one after another in file
+    order; statements against different tables run concurrently.
+    
+    Returns:
+        list: (statement, row count, wall time, error) tuples in file order
+    """
+    results = []
+    with dml_scheduler.KeyedExecutor(max_concurrent) as executor:
+        futures = [
+            # Statements are sent unchanged, so the key comes from the text Spanner executes
+            (statement, executor.submit(dml_scheduler.target_table(statement), run_partitioned_dml, database,
+                                        statement, recorder, idx, time.monotonic(), journal))
+            for idx, statement in enumerate(dml_statements, 1)
+        ]
+        for statement, future in futures:
+            try:
+                row_ct, elapsed = future.result()
+                results.append(log_result(statement, row_ct, elapsed))
+            except GoogleAPIError as e:
+                results.append(log_result(statement, error=e))
+    return results
+
+def execute_batched(database, dml_statements, batch_size=BATCH_SIZE, recorder=None, journal=None):
+    """
+    Execute statements as batch_update calls inside a single read-write transaction.
+    
+    This avoids the per-statement overhead of partitioned DML for small,
+    transactional-safe statements. If any statement fails the whole
+    transaction is rolled back. Wall time is reported per batch_update call,
+    and recorder gets one telemetry record per call, since the statements of
+    a call are not timed individually. In journal, every statement is
+    marked done or failed together with the transaction.
+    
+    Returns:
+        list: (statement, row count, wall time, error) tuples in file order
+    """
+    recorder = recorder or telemetry.Recorder('spanner_partDML_exec')
+    # The transaction function may be retried, so the statements are materialized
+    dml_statements = list(dml_statements)
+    batches = [dml_statements[i:i + batch_size] for i in range(0, len(dml_statements), batch_size)]
+    calls = []  # (batch number, row count, wall time) of the last attempt
+    entries = [journal.start(statement) for statement in dml_statements] if journal is not None else []
+    
+    def run_batches(transaction):
+        outcomes = []
+        calls.clear()
+        for number, batch in enumerate(batches, 1):
+            start = time.monotonic()
+            status, row_counts = transaction.batch_update(batch)
+            elapsed = time.monotonic() - start
+            if status.code != 0:
+                failed = batch[len(row_counts)]
+                raise GoogleAPIError(f"batch_update failed on '{failed}': {status.message}")
+            outcomes.extend(zip(batch, row_counts, [elapsed] * len(batch)))
+            calls.append((number, sum(row_counts), elapsed))
+        return outcomes
+    
+    start = time.monotonic()
+    try:
+        outcomes = database.run_in_transaction(run_batches)
+    except GoogleAPIError as e:
+        logging.error(f"Transaction rolled back: {str(e)}")
+        print(f"Transaction rolled back: {str(e)}")
+        recorder.add(1, f"transaction of {len(dml_statements)} statement(s)", time.monotonic() - start, e)
+        for entry in entries:
+            journal.finish(entry, error=e)
+        return [log_result(statement, error=e) for statement in dml_statements]
+    for number, row_ct, elapsed in calls:
+        batch = batches[number - 1]
+        recorder.add(number, f"batch_update of {len(batch)} statement(s): {batch[0]}", elapsed, rows=row_ct)
+    for entry, (_, row_ct, _) in zip(entries, outcomes):
+        journal.finish(entry, row_ct)
+    return [log_result(statement, row_ct, elapsed) for statement, row_ct, elapsed in outcomes]
+
+def log_result(statement, row_ct=None, elapsed=None, error=None):
+    """Log and print the outcome of one statement and return it as a summary tuple."""
+    if error is None:
+        logging.info(f"Successfully executed: '{statement}' - {row_ct} record(s) affected in {elapsed:.1f}s")
+        print(f"Executed: '{statement}' - {row_ct} record(s) affected in {elapsed:.1f}s")
+    else:
+        logging.error(f"Failed to execute '{statement}': {str(error)}")
+        print(f"Error executing '{statement}': {str(error)}")
+    return statement, row_ct, elapsed, error
+
+def print_summary(results, total_elapsed, recorder):
+    """Print the telemetry summary table (slowest statements first) and the totals."""
+    recorder.log_summary(echo=True)
+    failures = sum(1 for result in results if result[3] is not None)
+    summary = f"Finished {len(results)} statement(s) in {total_elapsed:.1f}s, {failures} failed"
+    logging.info(summary)
+    print(summary)
+
+def run_dml_file(database, input_file, resume=False):
+    """
+    Execute the DML statements of an input file against an existing Spanner database handle.
+    
+    The status of every statement is kept in the run journal (JOURNAL_FILE)
+    of the file and database, so an interrupted or partly failed run can be
+    resumed.
+    
+    Args:
+        database: Spanner Database, e.g. one backed by a warm session pool
+        input_file (str): Path to input file containing DML statements
+        resume (bool): Skip the statements an unfinished earlier run completed
+        
+    Returns:
+        list: (statement, row count, wall time, error) tuples in file order
+            of the statements executed
+    """
+    journal = run_journal.open_journal(JOURNAL_FILE, input_file, f"spanner:{getattr(database, 'name', '')}", resume)
+    
+    # Read DML statements lazily from file
+    dml_statements = sql_reader.iter_statements(input_file, SPLIT_ON_NEWLINE)
+    if journal is not None:
+        dml_statements = journal.pending(dml_statements)
+    
+    recorder = telemetry.Recorder('spanner_partDML_exec', TELEMETRY_FILE)
+    start = time.monotonic()
+    if BATCH_MODE:
+        results = execute_batched(database, dml_statements, BATCH_SIZE, recorder, journal)
+    elif PARALLEL_MODE:
+        results = execute_partitioned_parallel(database, dml_statements, MAX_CONCURRENT_STATEMENTS, recorder, journal)
+    else:
+        # Execute each DML statement
+        results = []
+        for idx, statement in enumerate(dml_statements, 1):
+            try:
+                row_ct, elapsed = run_partitioned_dml(database, statement, recorder, idx, journal=journal)
+                results.append(log_result(statement, row_ct, elapsed))
+            except GoogleAPIError as e:
+                results.append(log_result(statement, error=e))
+    
+    if journal is not None:
+        journal.close(all(result[3] is None for result in results))
+        if journal.skipped:
+            print(f"Skipped {journal.skipped} statement(s) completed by the resumed run")
+    print_summary(results, time.monotonic() - start, recorder)
+    return results
+
+def execute_dml_from_file(config_file, input_file, resume=False):
     """
     Execute DML commands from an input file and log results.
     
     Args:
         config_file (str): Path to configuration file
         input_file (str): Path to input file containing DML statements
+        resume (bool): Skip the statements an unfinished earlier run completed
     """
     try:
         # Load configuration
@@ -61,19 +229,7 @@ def execute_dml_from_file(config_file, input_file):
         instance = spanner_client.instance(instance_id)
         database = instance.database(database_id)
         
-        # Read DML statements from file
-        with open(input_file, 'r') as file:
-            dml_statements = [line.strip() for line in file if line.strip() and not line.startswith('#')]
-        
-        # Execute each DML statement
-        for statement in dml_statements:
-            try:
-                row_ct = database.execute_partitioned_dml(statement)
-                logging.info(f"Successfully executed: '{statement}' - {row_ct} record(s) affected")
-                print(f"Executed: '{statement}' - {row_ct} record(s) affected")
-            except GoogleAPIError as e:
-                logging.error(f"Failed to execute '{statement}': {str(e)}")
-                print(f"Error executing '{statement}': {str(e)}")
+        run_dml_file(database, input_file, resume)
                 
     except FileNotFoundError as e:
         logging.error(f"Input file '{input_file}' not found")
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from google.cloud import spanner
+from google.cloud.spanner_v1.database import BatchSnapshot
+import config_loader
+import output_writers
+
+# Default number of worker processes for partitioned exports
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+logger = logging.getLogger(__name__)
+
+# Database handle of the current worker process, set by _init_worker
+_worker_database = None
+
+def _init_worker(connection):
+    """Create this worker process's own Spanner client from connection settings."""
+    global _worker_database
+    credentials = config_loader.load_credentials(connection)
+    client = spanner.Client(project=connection['project_id'], credentials=credentials)
+    _worker_database = client.instance(connection['instance_id']).database(connection['database_id'])
+
+def _export_partition(snapshot_state, sql, partition, path, fmt):
+    """Run one query partition on the shared batch snapshot and write it to a shard file."""
+    snapshot = BatchSnapshot.from_dict(_worker_database, snapshot_state)
+    result = snapshot.process_query_batch({'partition': partition, 'query': {'sql': sql}})
+    start = time.monotonic()
+    rows = iter(result)
+    first_row = next(rows, None)
+    columns = [field.name for field in result.fields]
+    arrow_schema = output_writers.arrow_schema_from_spanner(result.fields) if fmt == 'parquet' else None
+    with output_writers.RowWriter(path, fmt, columns, arrow_schema) as writer:
+        if first_row is not None:
+            writer.write_row(first_row)
+            writer.write_rows(rows)
+    return path, writer.rows_written, time.monotonic() - start
+
+def shard_path(output_path, shard_number, fmt='csv'):
+    """Return the file name of one shard, e.g. out.csv.gz -> out.part-00001.csv.gz."""
+    extension = output_writers.output_extension(fmt)
+    base = output_path[:-len(extension)] if output_path.endswith(extension) else output_path
+    return f"{base}.part-{shard_number:05d}{extension}"
+
+def merge_shards(shard_paths, output_path, fmt='csv'):
+    """Concatenate shards into output_path, keeping only the first CSV header, and remove them."""
+    output_writers.merge_files(shard_paths, output_path, fmt)
+    for path in shard_paths:
+        os.remove(path)
+    logger.info(f"Merged {len(shard_paths)} shard(s) into {output_path}")
+
+def export_queries(database, connection, exports, workers=DEFAULT_WORKERS, merge=False, fmt='csv', recorder=None,
+                   snapshot_options=None, batch_snapshot=None):
+    """
+    Export queries through Spanner query partitions on one batch read-only snapshot.
+
+    Every partition of every query runs in a process pool and reads at the same
+    timestamp. Each partition is written to its own shard file next to the
+    requested output path.
+
+    Args:
+        database: Spanner Database used to create the batch snapshot
+        connection (dict): Spanner settings from config_loader.load_config,
+            used by each worker to build its own client
+        exports (list): (sql, output_path) tuples
+        workers (int): Number of worker processes
+        merge (bool): Merge each query's shards into its output path
+        fmt (str): Output format, see output_writers.FORMAT_EXTENSIONS
+        recorder: telemetry.Recorder that gets a record per partition,
+            numbered query.partition
+        snapshot_options (dict): read_timestamp or exact_staleness of the
+            batch snapshot (a strong read if not set)
+        batch_snapshot: Already begun BatchSnapshot to read from instead,
+            e.g. from spanner_snapshot.begin_batch_snapshot; it is closed
+            when the export ends
+
+    Returns:
+        list: Output files per query, in the order of exports; a list of
+            shard files for each query unless merge is set
+    """
+    if batch_snapshot is None:
+        batch_snapshot = database.batch_snapshot(**(snapshot_options or {}))
+    try:
+        snapshot_state = batch_snapshot.to_dict()
+        shards = {n: [] for n in range(len(exports))}
+        # spawn instead of fork: forked gRPC channels are not safe to reuse
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(connection,)) as executor:
+            futures = {}
+            for n, (sql, output_path) in enumerate(exports):
+                partition_count = 0
+                for batch in batch_snapshot.generate_query_batches(sql):
+                    partition_count += 1
+                    path = shard_path(output_path, partition_count, fmt)
+                    future = executor.submit(_export_partition, snapshot_state, sql, batch['partition'], path, fmt)
+                    futures[future] = (n, partition_count)
+                logger.info(f"Query {n + 1}: submitted {partition_count} partition(s)")
+
+            total_rows = 0
+            start = time.monotonic()
+            for future in as_completed(futures):
+                n, partition_number = futures[future]
+                path, row_count, elapsed = future.result()
+                shards[n].append(path)
+                if recorder is not None:
+                    recorder.add(f"{n + 1}.{partition_number}", exports[n][0], elapsed, rows=row_count,
+                                 output_file=path)
+                total_rows += row_count
+                rate = row_count / elapsed if elapsed > 0 else 0.0
+                logger.info(f"Wrote {row_count} rows to {path} in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+            elapsed = time.monotonic() - start
+            logger.info(f"Partitioned export finished: {total_rows} rows in {elapsed:.1f}s")
+    finally:
+        batch_snapshot.close()
+
+    output_files = []
+    for n, (_, output_path) in enumerate(exports):
+        shard_paths = sorted(shards[n])
+        if merge:
+            merge_shards(shard_paths, output_path, fmt)
+            output_files.append([output_path])
+        else:
+            output_files.append(shard_paths)
+    return output_files
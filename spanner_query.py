@@ -1,66 +1,132 @@
-import configparser
 import sys
 from google.cloud import spanner
-from google.oauth2 import service_account
-import pandas as pd
-from tabulate import tabulate
+import config_loader
+import output_writers
+import result_cache
+import spanner_partitioned
+import spanner_snapshot
 
 # Hardcoded arguments
 CONFIG_FILE = "../config/config.ini"
 QUERY = "SELECT * FROM your_table LIMIT 10"  # Replace with your table
 OUTPUT_FILE = "../output/spanner_output.txt"
-OUTPUT_FORMAT = "txt"  # Options: "csv", "html", or "txt"
+OUTPUT_FORMAT = "txt"  # Options: "csv", "csv.gz", "csv.zst", "parquet", "html", or "txt"
+PARTITIONED_MODE = False  # Export through query partitions of a batch snapshot (file formats only)
+PARTITION_WORKERS = 4  # Worker processes for partitioned exports
+MERGE_SHARDS = True  # Merge partition shard files into OUTPUT_FILE
+RESULT_CACHE_DIR = result_cache.DEFAULT_CACHE_DIR  # Shared on-disk result cache
+RESULT_CACHE_TTL = 300  # Seconds a cached result stays valid ("-- cache_ttl: N" overrides)
+RESULT_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used entries are evicted above this size
+RESULT_CACHE_BYPASS = False  # Always query Spanner and do not store results
+READ_MODE = "strong"  # "strong", "exact_staleness", "max_staleness" or "read_timestamp"
+STALENESS_SECONDS = 10  # Staleness bound of the exact_staleness and max_staleness read modes
+READ_TIMESTAMP = ""  # RFC 3339 timestamp of the read_timestamp read mode, e.g. "2024-01-31T23:59:59Z"
+WRITE_METADATA = True  # Write OUTPUT_FILE.metadata.json recording the read timestamp
 
 def read_config(config_file):
     """Read connection details from a .ini config file."""
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    if 'Spanner' not in config:
-        raise ValueError("Config file missing [Spanner] section")
-    return {
-        'project_id': config['Spanner'].get('project_id'),
-        'instance_id': config['Spanner'].get('instance_id'),
-        'database_id': config['Spanner'].get('database_id'),
-        'service_account_file': config['Spanner'].get('service_account_file')
-    }
+    return config_loader.load_config(config_file, 'spanner')
 
-def query_spanner():
+def write_metadata(results, options, row_count):
+    """Write the metadata file of OUTPUT_FILE with the read timestamp of the consumed results, if enabled."""
+    if not WRITE_METADATA:
+        return
+    read_timestamp = options.get('read_timestamp') or spanner_snapshot.result_read_timestamp(results)
+    spanner_snapshot.write_metadata(OUTPUT_FILE, read_timestamp, read_mode=READ_MODE, query=QUERY, rows=row_count)
+
+def query_spanner(database=None):
+    """
+    Run QUERY and save its results to OUTPUT_FILE in OUTPUT_FORMAT.
+    
+    Args:
+        database: Spanner Database to use instead of one built from the
+            credentials in CONFIG_FILE, e.g. a benchmark fake
+    """
     try:
         # Read configuration
         config = read_config(CONFIG_FILE)
+        output_format = OUTPUT_FORMAT.lower()
+        options = spanner_snapshot.snapshot_options(READ_MODE, STALENESS_SECONDS, READ_TIMESTAMP)
+
+        # Serve the output from the result cache when a fresh copy exists
+        # Unmerged partition shards are not a single output file, so they are never cached
+        bypass = RESULT_CACHE_BYPASS or (PARTITIONED_MODE and not MERGE_SHARDS)
+        cache = result_cache.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL, bypass)
+        target = {key: config[key] for key in ('project_id', 'instance_id', 'database_id')}
+        # The read mode is part of the key: a stale or pinned read is not the same result as a strong one
+        entry = cache.lookup(QUERY, target, options, fmt=output_format)
+        if entry.hit:
+            cache.restore(entry, OUTPUT_FILE)
+            print(f"Result cache hit: results restored to {OUTPUT_FILE}")
+            return
+        print("Result cache miss: querying Spanner")
+
+        if database is None:
+            # Load service account credentials
+            credentials = config_loader.load_credentials(config)
 
-        # Load service account credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            config['service_account_file']
-        )
+            # Initialize Spanner client
+            client = spanner.Client(project=config['project_id'], credentials=credentials)
+            instance = client.instance(config['instance_id'])
+            database = instance.database(config['database_id'])
 
-        # Initialize Spanner client
-        client = spanner.Client(project=config['project_id'], credentials=credentials)
-        instance = client.instance(config['instance_id'])
-        database = instance.database(config['database_id'])
+        # Partitioned export: each partition is written to its own shard by a worker process
+        if PARTITIONED_MODE:
+            if output_format not in output_writers.FORMAT_EXTENSIONS:
+                raise ValueError(f"Partitioned mode only supports {', '.join(output_writers.FORMAT_EXTENSIONS)} output.")
+            batch_snapshot, read_timestamp = spanner_snapshot.begin_batch_snapshot(database, options)
+            output_files = spanner_partitioned.export_queries(
+                database, config, [(QUERY, OUTPUT_FILE)], PARTITION_WORKERS, MERGE_SHARDS, output_format,
+                batch_snapshot=batch_snapshot
+            )[0]
+            if WRITE_METADATA:
+                for path in output_files:
+                    spanner_snapshot.write_metadata(path, read_timestamp, read_mode=READ_MODE, partitioned=True)
+            print(f"Results saved to {', '.join(output_files)} as {output_format}")
+            cache.store(entry, OUTPUT_FILE)
+            return
 
-        # Execute query
-        with database.snapshot() as snapshot:
+        # Execute query as a single read, which supports every read mode
+        with database.snapshot(**options) as snapshot:
             results = snapshot.execute_sql(QUERY)
+            # Result metadata only arrives with the first response, so pull one row first
+            row_iter = iter(results)
+            first_row = next(row_iter, None)
             columns = [field.name for field in results.fields]
-            rows = [row for row in results]
 
-        # Convert to DataFrame
+            # File formats are streamed to disk as rows arrive
+            if output_format in output_writers.FORMAT_EXTENSIONS:
+                arrow_schema = None
+                if output_format == 'parquet':
+                    arrow_schema = output_writers.arrow_schema_from_spanner(results.fields)
+                with output_writers.RowWriter(OUTPUT_FILE, output_format, columns, arrow_schema) as writer:
+                    if first_row is not None:
+                        writer.write_row(first_row)
+                        writer.write_rows(row_iter)
+                print(f"Results saved to {OUTPUT_FILE} as {output_format} ({writer.rows_written} rows)")
+                write_metadata(results, options, writer.rows_written)
+                cache.store(entry, OUTPUT_FILE)
+                return
+
+            rows = [first_row] + list(row_iter) if first_row is not None else []
+
+        # Convert to DataFrame (pandas and tabulate are only needed for html/txt output)
+        import pandas as pd
         df = pd.DataFrame(rows, columns=columns)
 
         # Save output
-        if OUTPUT_FORMAT.lower() == 'csv':
-            df.to_csv(OUTPUT_FILE, index=False)
-            print(f"Results saved to {OUTPUT_FILE} as CSV")
-        elif OUTPUT_FORMAT.lower() == 'html':
+        if output_format == 'html':
             df.to_html(OUTPUT_FILE, index=False, border=1, classes='table table-striped')
             print(f"Results saved to {OUTPUT_FILE} as HTML")
-        elif OUTPUT_FORMAT.lower() == 'txt':
+        elif output_format == 'txt':
+            from tabulate import tabulate
             with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
                 f.write(tabulate(df, headers='keys', tablefmt='plain', showindex=False))
             print(f"Results saved to {OUTPUT_FILE} as formatted text")
         else:
-            raise ValueError("Unsupported output format. Use 'csv', 'html', or 'txt'.")
+            raise ValueError("Unsupported output format. Use 'csv', 'csv.gz', 'csv.zst', 'parquet', 'html', or 'txt'.")
+        write_metadata(results, options, len(rows))
+        cache.store(entry, OUTPUT_FILE)
 
     except Exception as e:
         print(f"Error executing Spanner query: {e}")
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+# How a run picks its read timestamp
+READ_MODES = ('strong', 'exact_staleness', 'max_staleness', 'read_timestamp')
+# Appended to an output file name for its metadata file
+METADATA_SUFFIX = '.metadata.json'
+
+logger = logging.getLogger(__name__)
+
+def parse_timestamp(text):
+    """Parse an RFC 3339 timestamp such as '2024-01-31T23:59:59Z'; timestamps without a zone are UTC."""
+    value = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def snapshot_options(mode, staleness_seconds=0, read_timestamp=''):
+    """
+    Return the Database.snapshot keyword arguments of a read mode.
+
+    Args:
+        mode (str): 'strong', 'exact_staleness' or 'max_staleness' (both
+            bounded by staleness_seconds), or 'read_timestamp'
+        staleness_seconds (float): Staleness of the staleness modes
+        read_timestamp (str): RFC 3339 timestamp read by 'read_timestamp'
+
+    Raises:
+        ValueError: For an unknown mode or a missing staleness or timestamp
+    """
+    if mode not in READ_MODES:
+        raise ValueError(f"Unknown read mode '{mode}'. Use one of: {', '.join(READ_MODES)}")
+    if mode == 'strong':
+        return {}
+    if mode == 'read_timestamp':
+        if not read_timestamp:
+            raise ValueError("The read_timestamp read mode needs a read timestamp")
+        return {'read_timestamp': parse_timestamp(read_timestamp)}
+    if staleness_seconds <= 0:
+        raise ValueError(f"The {mode} read mode needs a staleness above 0 seconds")
+    return {mode: timedelta(seconds=staleness_seconds)}
+
+def result_read_timestamp(result):
+    """Return the read timestamp Spanner reported for a consumed single-use result set, or None."""
+    metadata = getattr(result, 'metadata', None)
+    transaction = getattr(metadata, 'transaction', None) if metadata is not None else None
+    return getattr(transaction, 'read_timestamp', None) or None
+
+def multi_use_options(options):
+    """
+    Return the snapshot options of a read mode for multi-use and batch snapshots.
+
+    Bounded staleness is only allowed for single reads, so it becomes exact
+    staleness of the same bound.
+    """
+    return {('exact_staleness' if key == 'max_staleness' else key): value for key, value in options.items()}
+
+def begun_read_timestamp(snapshot, options):
+    """Return the read timestamp of a begun multi-use snapshot (the fixed one if configured), or None."""
+    return options.get('read_timestamp') or getattr(snapshot, '_transaction_read_timestamp', None)
+
+@contextmanager
+def shared_snapshot(database, options):
+    """
+    Open one multi-use read-only snapshot for several, possibly parallel, queries.
+
+    The snapshot is begun before it is yielded, so concurrent queries share
+    its transaction instead of racing to begin it; beginning it also returns
+    the read timestamp Spanner chose, so no separate round trip is needed.
+
+    Yields:
+        tuple: Snapshot, read timestamp of every query on it (None if unknown)
+    """
+    with database.snapshot(multi_use=True, **multi_use_options(options)) as snapshot:
+        snapshot.begin()
+        read_timestamp = begun_read_timestamp(snapshot, options)
+        logger.info(f"Shared snapshot reads at {format_timestamp(read_timestamp)}")
+        yield snapshot, read_timestamp
+
+def begin_batch_snapshot(database, options):
+    """
+    Create and begin the batch snapshot of a partitioned export.
+
+    Returns:
+        tuple: BatchSnapshot, read timestamp of every partition (None if unknown)
+    """
+    batch_snapshot = database.batch_snapshot(**multi_use_options(options))
+    batch_snapshot.to_dict()  # Begins the read-only transaction shared by the partitions
+    read_timestamp = begun_read_timestamp(getattr(batch_snapshot, '_snapshot', None), options)
+    logger.info(f"Batch snapshot reads at {format_timestamp(read_timestamp)}")
+    return batch_snapshot, read_timestamp
+
+def format_timestamp(value):
+    """Return a read timestamp as RFC 3339 text (nanoseconds kept), or None."""
+    if value is None:
+        return None
+    if hasattr(value, 'rfc3339'):
+        return value.rfc3339()
+    return value.isoformat()
+
+def write_metadata(output_path, read_timestamp, **fields):
+    """
+    Write output_path + METADATA_SUFFIX describing how an output file was read.
+
+    Returns:
+        str: Metadata file name
+    """
+    path = output_path + METADATA_SUFFIX
+    metadata = {'output_file': os.path.basename(output_path), 'read_timestamp': format_timestamp(read_timestamp)}
+    metadata.update(fields)
+    with open(path, 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+        f.write('\n')
+    return path
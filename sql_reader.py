@@ -0,0 +1,189 @@
+import re
+
+# Tokens that matter for splitting; everything between them (including all
+# other words) is copied as is
+_TOKEN = re.compile(
+    r"""(?P<word>\b(?:BEGIN|TRANSACTION|END|IF|LOOP|WHILE|FOR|REPEAT|CASE|THEN|ELSE|DO)\b)"""
+    r"""|(?P<quote>'''|\"\"\"|['"`])|(?P<comment>--|\#|/\*)|(?P<semicolon>;)""",
+    re.IGNORECASE
+)
+# Statement label, e.g. "outer_loop:" before LOOP
+_LABEL = re.compile(r'\s*\w+\s*:\s*$')
+# End of a quoted string or identifier, skipping backslash escapes
+_QUOTE_END = {
+    "'''": re.compile(r"(?:\\.|[^\\])*?'''", re.DOTALL),
+    '"""': re.compile(r'(?:\\.|[^\\])*?"""', re.DOTALL),
+    "'": re.compile(r"(?:\\.|[^\\'])*'", re.DOTALL),
+    '"': re.compile(r'(?:\\.|[^\\"])*"', re.DOTALL),
+    '`': re.compile(r"(?:\\.|[^\\`])*`", re.DOTALL),
+}
+# Scripting statements whose body contains ;-terminated statements, closed by END [keyword]
+_BLOCK_STATEMENTS = {'IF', 'LOOP', 'WHILE', 'FOR', 'REPEAT', 'CASE'}
+# Block statements whose body starts right after the keyword
+_BODY_FOLLOWS = {'LOOP', 'REPEAT'}
+# Keywords after which a new statement starts inside a block
+_STATEMENT_INTRODUCERS = {'THEN', 'ELSE', 'DO'}
+
+def iter_statements(file_path, split_on_newline=False):
+    """
+    Yield the SQL statements of a file one at a time, reading it lazily.
+
+    See split_statements for how statements are delimited.
+    """
+    with open(file_path, 'r') as file:
+        yield from split_statements(file, split_on_newline)
+
+def split_statements(lines, split_on_newline=False):
+    """
+    Yield statements from an iterable of lines, such as an open file.
+
+    Statements end at a ';' outside string literals, quoted identifiers,
+    comments ('--', '#', '/* */') and BigQuery scripting blocks (BEGIN ... END,
+    IF ... END IF, LOOP ... END LOOP and so on). BEGIN TRANSACTION is a
+    statement of its own, not a block. With split_on_newline, the end of a
+    line outside those constructs also ends a statement, which reads the
+    one-statement-per-line DML files.
+
+    Comments stay in the statement text, so directives such as
+    "-- cache_ttl: 900" before a statement reach the executor. The
+    terminating ';' is not included, and fragments that contain nothing but
+    comments are skipped.
+    """
+    scanner = _StatementScanner(split_on_newline)
+    for line in lines:
+        yield from scanner.feed(line)
+    yield from scanner.finish()
+
+class _StatementScanner:
+    """Incremental statement splitter; state carries over between lines."""
+
+    def __init__(self, split_on_newline):
+        self.split_on_newline = split_on_newline
+        self.parts = []
+        self.has_content = False
+        self.quote = None  # Open quote delimiter
+        self.in_block_comment = False
+        self.depth = 0  # Open scripting blocks
+        self.case_depth = 0  # Open CASE expressions in the current statement
+        self.at_start = True  # Next word is the first word of a statement
+        self.pending_begin = False  # BEGIN seen, block or transaction not yet known
+
+    def feed(self, line):
+        pos = 0
+        end = len(line)
+        while pos < end:
+            if self.quote:
+                match = _QUOTE_END[self.quote].match(line, pos)
+                if match is None:
+                    self.parts.append(line[pos:])
+                    return
+                self.parts.append(line[pos:match.end()])
+                pos = match.end()
+                self.quote = None
+                continue
+
+            if self.in_block_comment:
+                close = line.find('*/', pos)
+                if close < 0:
+                    self.parts.append(line[pos:])
+                    return
+                self.parts.append(line[pos:close + 2])
+                pos = close + 2
+                self.in_block_comment = False
+                continue
+
+            match = _TOKEN.search(line, pos)
+            gap = line[pos:match.start() if match else end]
+            if gap.strip():
+                self.has_content = True
+                self._other_words(gap)
+            self.parts.append(gap)
+            if match is None:
+                break
+            pos = match.end()
+            token = match.group()
+
+            if match.lastgroup == 'word':
+                self.has_content = True
+                self.parts.append(token)
+                self._word(token.upper())
+            elif match.lastgroup == 'quote':
+                self.has_content = True
+                self.parts.append(token)
+                self.quote = token
+            elif match.lastgroup == 'comment':
+                if token == '/*':
+                    self.parts.append(token)
+                    self.in_block_comment = True
+                else:
+                    # Line comment: the rest of the line, keeping the newline for the next pass
+                    pos = end - 1 if line.endswith('\n') else end
+                    self.parts.append(line[match.start():pos])
+            elif self.depth > 0:
+                self.parts.append(token)
+                self._reset_statement_state()
+            else:
+                statement = self._take()
+                if statement is not None:
+                    yield statement
+
+        if self.split_on_newline and line.endswith('\n') and self.depth == 0 and not self.quote \
+                and not self.in_block_comment:
+            statement = self._take()
+            if statement is not None:
+                yield statement
+
+    def finish(self):
+        statement = self._take()
+        if statement is not None:
+            yield statement
+
+    def _other_words(self, text):
+        """Update the state for text between keywords, such as identifiers and operators."""
+        if self.pending_begin:
+            # BEGIN followed by anything but TRANSACTION or ';' opens a block
+            self.pending_begin = False
+            self.depth += 1
+            self.at_start = True
+        if self.at_start and not _LABEL.match(text):
+            self.at_start = False
+
+    def _word(self, word):
+        if self.pending_begin:
+            self.pending_begin = False
+            if word == 'TRANSACTION':
+                return
+            self.depth += 1
+            self.at_start = True
+        if word == 'BEGIN':
+            self.pending_begin = True
+            return
+        if self.at_start:
+            self.at_start = False
+            if word in _BLOCK_STATEMENTS:
+                self.depth += 1
+                self.at_start = word in _BODY_FOLLOWS
+                return
+        if word == 'CASE':
+            self.case_depth += 1
+        elif word == 'END':
+            if self.case_depth > 0:
+                self.case_depth -= 1
+            elif self.depth > 0:
+                self.depth -= 1
+        elif word in _STATEMENT_INTRODUCERS and self.case_depth == 0 and self.depth > 0:
+            self.at_start = True
+
+    def _reset_statement_state(self):
+        self.case_depth = 0
+        self.at_start = True
+        self.pending_begin = False
+
+    def _take(self):
+        """Return the buffered statement (None if it holds only comments) and start a new one."""
+        statement = ''.join(self.parts).strip() if self.has_content else None
+        self.parts = []
+        self.has_content = False
+        self.depth = 0
+        self._reset_statement_state()
+        return statement
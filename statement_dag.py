@@ -0,0 +1,243 @@
+import heapq
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dml_scheduler import target_table
+
+# Table name: dotted path of identifiers (each optionally quoted with backticks), @dataset@ placeholders or a wildcard
+_TABLE = r'((?:`[^`]+`|[\w@$*-]+)(?:\.(?:`[^`]+`|[\w@$*-]+))*)'
+# Comments and string literals, removed before tables are looked up
+_NOISE = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/|'''.*?'''|\"\"\".*?\"\"\"|'(?:\\.|[^\\'])*'|\"(?:\\.|[^\\\"])*\"",
+                    re.DOTALL)
+# FROM in EXTRACT(part FROM value) and IS DISTINCT FROM is not followed by a table
+_NOT_TABLE_FROM = re.compile(r'\bEXTRACT\s*\(\s*\w+(?:\s*\(\s*\w+\s*\))?\s+FROM\b|\bDISTINCT\s+FROM\b', re.IGNORECASE)
+# Start of a table list; a name followed by '(' is a function such as UNNEST
+_READ_CLAUSE = re.compile(r'\b(?:FROM|JOIN|USING)\s+', re.IGNORECASE)
+_READ_ITEM = re.compile(_TABLE + r'(?![\w@$*.`-]|\s*\()(?:\s+(?:AS\s+)?\w+)?\s*(,\s*)?', re.IGNORECASE)
+# Table and model arguments of table functions, e.g. ML.PREDICT(MODEL ds.m, TABLE ds.t)
+_TABLE_ARGUMENT = re.compile(r'[(,]\s*(?:TABLE|MODEL)\s+' + _TABLE, re.IGNORECASE)
+# Source table of CREATE TABLE ... CLONE, COPY or LIKE
+_DDL_SOURCE = re.compile(r'\b(?:CLONE|COPY|LIKE)\s+' + _TABLE, re.IGNORECASE)
+# New name of ALTER TABLE ... RENAME TO
+_RENAME_TARGET = re.compile(r'\bRENAME\s+TO\s+' + _TABLE, re.IGNORECASE)
+# Statements that create, replace or drop a table or view
+_DDL_TARGET = re.compile(
+    r'^\s*(?:CREATE(?:\s+OR\s+REPLACE)?(?:\s+TEMP(?:ORARY)?)?|DROP|ALTER)\s+'
+    r'(?:EXTERNAL\s+TABLE|SNAPSHOT\s+TABLE|MATERIALIZED\s+VIEW|TABLE|VIEW)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?' + _TABLE,
+    re.IGNORECASE
+)
+# First words of the statements whose tables can be analyzed; any other statement is a barrier
+_ANALYZED_STATEMENTS = {'SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'TRUNCATE', 'CREATE', 'DROP', 'ALTER'}
+
+logger = logging.getLogger(__name__)
+
+def table_key(name):
+    """
+    Return the key a table name is compared by: its last name component, lowercased.
+
+    Names written with and without project or dataset then refer to the same
+    table; equally named tables of different datasets are treated as one,
+    which only adds ordering, never removes it.
+    """
+    return name.replace('`', '').split('.')[-1].lower()
+
+def _keys_match(a, b):
+    # A wildcard table such as events_* covers every table with its prefix
+    if a.endswith('*'):
+        return b.startswith(a[:-1])
+    if b.endswith('*'):
+        return a.startswith(b[:-1])
+    return a == b
+
+def statement_tables(statement):
+    """
+    Return the (reads, writes) table key sets of a statement, or None if it cannot be analyzed.
+
+    Writes are the target of DML, TRUNCATE and CREATE/DROP/ALTER TABLE or
+    VIEW, and the new name of ALTER TABLE ... RENAME TO; reads are the
+    tables after FROM, JOIN and USING, the TABLE and MODEL arguments of
+    table functions and the source of CREATE TABLE ... CLONE, COPY or LIKE.
+    CTE names are reported as reads as well. Scripting blocks, procedural
+    statements and CREATE FUNCTION/PROCEDURE/MODEL return None, since their
+    effects are unknown.
+    """
+    text = _NOISE.sub("''", statement)
+    first = text.split(None, 1)[0].upper() if text.strip() else ''
+    if first not in _ANALYZED_STATEMENTS or ';' in text:
+        return None
+    writes = set()
+    target = target_table(text)
+    if target is None:
+        match = _DDL_TARGET.match(text)
+        if match:
+            target = match.group(1)
+        elif first not in ('SELECT', 'WITH'):
+            return None
+    if target is not None:
+        writes.add(table_key(target))
+    if first == 'ALTER':
+        writes.update(table_key(match.group(1)) for match in _RENAME_TARGET.finditer(text))
+    reads = set()
+    if first == 'CREATE':
+        reads.update(table_key(match.group(1)) for match in _DDL_SOURCE.finditer(text))
+    reads.update(table_key(match.group(1)) for match in _TABLE_ARGUMENT.finditer(text))
+    text = _NOT_TABLE_FROM.sub(' ', text)
+    for clause in _READ_CLAUSE.finditer(text):
+        pos = clause.end()
+        while True:
+            match = _READ_ITEM.match(text, pos)
+            if match is None:
+                break
+            reads.add(table_key(match.group(1)))
+            if not match.group(2):
+                break
+            pos = match.end()
+    return reads, writes
+
+class StatementNode:
+    """One statement of a DAG and the earlier statements it has to wait for."""
+
+    def __init__(self, index, statement, tables):
+        self.index = index
+        self.statement = statement
+        self.barrier = tables is None
+        self.reads, self.writes = tables if tables is not None else (set(), set())
+        self.deps = {}  # index of an earlier statement -> set of reasons ('RAW', 'WAW', 'WAR', 'barrier')
+        self.dependents = []
+        self.cost = 1.0
+        self.rank = 0.0  # Cost of the longest path from this statement to the end of the DAG
+        self.level = 0
+
+    def add_dep(self, other, reason):
+        if other is not None and other != self.index:
+            self.deps.setdefault(other, set()).add(reason)
+
+class StatementDag:
+    """
+    Dependency graph of the statements of a SQL file.
+
+    A statement runs after the last earlier writer of every table it reads
+    (read after write) or writes (write after write), and after every
+    earlier reader of a table it writes (write after read). A statement that
+    cannot be analyzed is a barrier: it runs alone, after everything before
+    it and before everything after it. Running the graph in any order that
+    respects these dependencies gives the same result as the file order.
+    """
+
+    def __init__(self, statements, costs=None):
+        self.nodes = [StatementNode(idx, statement, statement_tables(statement))
+                      for idx, statement in enumerate(statements, 1)]
+        last_writer, readers, barrier, since_barrier = {}, {}, None, []
+        for node in self.nodes:
+            if node.barrier:
+                for index in since_barrier or [barrier]:
+                    node.add_dep(index, 'barrier')
+                last_writer, readers, barrier, since_barrier = {}, {}, node.index, []
+                continue
+            node.add_dep(barrier, 'barrier')
+            for table in node.reads:
+                for written, index in last_writer.items():
+                    if _keys_match(table, written):
+                        node.add_dep(index, 'RAW')
+            for table in node.writes:
+                for written, index in last_writer.items():
+                    if _keys_match(table, written):
+                        node.add_dep(index, 'WAW')
+                for read, indexes in readers.items():
+                    if _keys_match(table, read):
+                        for index in indexes:
+                            node.add_dep(index, 'WAR')
+            for table in node.reads:
+                readers.setdefault(table, set()).add(node.index)
+            for table in node.writes:
+                last_writer[table] = node.index
+                readers[table] = set()
+            since_barrier.append(node.index)
+        for node in self.nodes:
+            node.cost = (costs or {}).get(node.index, 1.0)
+            for index in node.deps:
+                self.nodes[index - 1].dependents.append(node.index)
+            node.level = max((self.nodes[index - 1].level + 1 for index in node.deps), default=0)
+        for node in reversed(self.nodes):
+            node.rank = node.cost + max((self.nodes[index - 1].rank for index in node.dependents), default=0.0)
+
+    def critical_path(self):
+        """Return the statement indexes of the most expensive dependency chain, in execution order."""
+        if not self.nodes:
+            return []
+        node = max((n for n in self.nodes if not n.deps), key=lambda n: n.rank)
+        path = [node.index]
+        while node.dependents:
+            node = max((self.nodes[index - 1] for index in node.dependents), key=lambda n: n.rank)
+            path.append(node.index)
+        return path
+
+    def width(self):
+        """Return the largest number of statements on one level, i.e. that can start together."""
+        levels = {}
+        for node in self.nodes:
+            levels[node.level] = levels.get(node.level, 0) + 1
+        return max(levels.values(), default=0)
+
+    def plan_lines(self, cost_unit='s'):
+        """Return a readable description of the DAG, its critical path and the best possible speedup."""
+        edges = sum(len(node.deps) for node in self.nodes)
+        levels = max((node.level for node in self.nodes), default=-1) + 1
+        lines = [f"Statement DAG: {len(self.nodes)} statement(s), {edges} dependencies, {levels} level(s), "
+                 f"up to {self.width()} statement(s) at once"]
+        for node in self.nodes:
+            if node.barrier:
+                tables = "barrier (not analyzed)"
+            else:
+                tables = (f"writes {', '.join(sorted(node.writes)) or '-'}; "
+                          f"reads {', '.join(sorted(node.reads)) or '-'}")
+            after = ', '.join(f"{index} ({'/'.join(sorted(reasons))})" for index, reasons in sorted(node.deps.items()))
+            lines.append(f"{node.index:>5}  level {node.level:<3} {node.cost:>8.1f}{cost_unit}  {tables}"
+                         f"{'; after ' + after if after else ''}  - {' '.join(node.statement.split())[:60]}")
+        path = self.critical_path()
+        path_cost = sum(self.nodes[index - 1].cost for index in path)
+        total = sum(node.cost for node in self.nodes)
+        speedup = total / path_cost if path_cost else 1.0
+        lines.append(f"Critical path: {' -> '.join(str(index) for index in path) or '-'} "
+                     f"({path_cost:.1f}{cost_unit} of {total:.1f}{cost_unit} serial, speedup bound {speedup:.1f}x)")
+        return lines
+
+def execute(dag, fn, max_workers):
+    """
+    Run fn(index, statement, queued_at) for every statement of a DAG on up to max_workers threads.
+
+    A statement starts once all its dependencies have finished; of the
+    statements that are ready, those with the most expensive remaining path
+    start first. After a failure no further statements are started, the
+    running ones are waited for and the first error (in file order) is
+    raised; statements that never started are left for a resumed run.
+    """
+    waiting = {node.index: len(node.deps) for node in dag.nodes}
+    ready = [(-node.rank, node.index, time.monotonic()) for node in dag.nodes if not node.deps]
+    heapq.heapify(ready)
+    errors = {}
+    finished = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while ready or running:
+            while ready and not errors and len(running) < max_workers:
+                _, index, queued_at = heapq.heappop(ready)
+                running[pool.submit(fn, index, dag.nodes[index - 1].statement, queued_at)] = index
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                if future.exception() is not None:
+                    errors[index] = future.exception()
+                    continue
+                finished += 1
+                for dependent in dag.nodes[index - 1].dependents:
+                    waiting[dependent] -= 1
+                    if not waiting[dependent]:
+                        heapq.heappush(ready, (-dag.nodes[dependent - 1].rank, dependent, time.monotonic()))
+    if errors:
+        logger.error(f"{len(errors)} statement(s) failed; {len(dag.nodes) - finished - len(errors)} "
+                     f"statement(s) not started")
+        raise errors[min(errors)]
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Statement text kept in each record (the hash identifies the full statement)
+STATEMENT_PREVIEW_CHARS = 200
+# Slowest statements listed in the summary table (0 lists all)
+SUMMARY_TOP = 20
+# Spanner query statistics not copied into records
+_SKIPPED_QUERY_STATS = {'query_text', 'query_plan'}
+
+logger = logging.getLogger(__name__)
+
+def format_bytes(num_bytes):
+    """Return a byte count in human readable binary units, e.g. '1.5 GiB'."""
+    if num_bytes is None:
+        return 'unknown'
+    size = float(num_bytes)
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'PiB'
+    return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+
+def statement_hash(statement):
+    """Return a short hash of a statement that ignores whitespace, to group runs of the same statement."""
+    return hashlib.sha1(' '.join(statement.split()).encode('utf-8')).hexdigest()[:16]
+
+def load_wall_times(path):
+    """
+    Return the wall time of the last successful run of every statement hash in a telemetry file.
+
+    Missing files and unreadable lines are ignored, so a first run gets an empty dict.
+    """
+    wall_times = {}
+    if not path or not os.path.exists(path):
+        return wall_times
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'ok' and record.get('wall_seconds') is not None:
+                wall_times[record.get('statement_hash')] = record['wall_seconds']
+    return wall_times
+
+class StatementRecord:
+    """
+    Performance data of one executed statement.
+
+    Executors fill in what their backend reports; fields that do not apply
+    stay None. queue_seconds is the time spent waiting for a local worker,
+    pending_seconds the time a BigQuery job waited before it started.
+    """
+
+    def __init__(self, executor, run_id, index, statement, queued_at=None):
+        self.executor = executor
+        self.run_id = run_id
+        self.index = index
+        self.statement = statement[:STATEMENT_PREVIEW_CHARS]
+        self.statement_hash = statement_hash(statement)
+        self.status = 'ok'
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.start = time.monotonic()
+        self.wall_seconds = None
+        self.queue_seconds = self.start - queued_at if queued_at is not None else None
+        self.pending_seconds = None
+        self.rows = None
+        self.bytes_processed = None
+        self.bytes_billed = None
+        self.slot_ms = None
+        self.cache_hit = None
+        self.job_id = None
+        self.query_stats = None
+        self.output_file = None
+        self.output_bytes = None
+        self.error = None
+
+    def add_bigquery_job(self, query_job):
+        """Copy the statistics of a finished BigQuery QueryJob."""
+        self.job_id = getattr(query_job, 'job_id', None)
+        self.bytes_processed = getattr(query_job, 'total_bytes_processed', None)
+        self.bytes_billed = getattr(query_job, 'total_bytes_billed', None)
+        self.slot_ms = getattr(query_job, 'slot_millis', None)
+        self.cache_hit = getattr(query_job, 'cache_hit', None)
+        affected = getattr(query_job, 'num_dml_affected_rows', None)
+        if affected is not None:
+            self.rows = affected
+        created = getattr(query_job, 'created', None)
+        started = getattr(query_job, 'started', None)
+        if created and started:
+            self.pending_seconds = (started - created).total_seconds()
+
+    def add_spanner_stats(self, result):
+        """Copy the query statistics of a fully consumed Spanner result set run in PROFILE mode."""
+        stats = getattr(result, 'stats', None)
+        query_stats = getattr(stats, 'query_stats', None) if stats is not None else None
+        if not query_stats:
+            return
+        self.query_stats = {key: value for key, value in dict(query_stats).items() if key not in _SKIPPED_QUERY_STATS}
+
+    def to_dict(self):
+        fields = dict(vars(self))
+        del fields['start']
+        if fields['error'] is not None:
+            fields['error'] = str(fields['error'])
+        return fields
+
+class Recorder:
+    """
+    Collects a StatementRecord per statement of one run.
+
+    Every finished record is logged as JSON and, when path is set, appended
+    to that JSON Lines file, so records of many runs can be compared later.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, executor='', path=None):
+        self.executor = executor
+        self.path = path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start_statement(self, index, statement, queued_at=None):
+        """Start timing a statement; queued_at is the time.monotonic() it was handed to a worker."""
+        return StatementRecord(self.executor, self.run_id, index, statement, queued_at)
+
+    def finish(self, record, error=None, wall_seconds=None):
+        """Stop timing a statement (unless wall_seconds was measured elsewhere) and emit its record."""
+        record.wall_seconds = wall_seconds if wall_seconds is not None else time.monotonic() - record.start
+        if error is not None:
+            record.status = 'failed'
+            record.error = error
+        if record.output_file and os.path.exists(record.output_file):
+            record.output_bytes = os.path.getsize(record.output_file)
+        line = json.dumps(record.to_dict(), default=str)
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(line + '\n')
+        logger.info(f"Statement telemetry: {line}")
+        return record
+
+    def add(self, index, statement, wall_seconds, error=None, **fields):
+        """Emit a record for a statement timed elsewhere, e.g. in a worker process; fields set record attributes."""
+        record = self.start_statement(index, statement)
+        for name, value in fields.items():
+            setattr(record, name, value)
+        return self.finish(record, error, wall_seconds)
+
+    @contextmanager
+    def track(self, index, statement, queued_at=None):
+        """Time the enclosed block as one statement; an exception marks it failed and is re-raised."""
+        record = self.start_statement(index, statement, queued_at)
+        try:
+            yield record
+        except Exception as e:
+            self.finish(record, e)
+            raise
+        self.finish(record)
+
+    def summary_lines(self, top=SUMMARY_TOP):
+        """Return the summary table, slowest statements first."""
+        with self._lock:
+            records = sorted(self.records, key=lambda r: r.wall_seconds or 0, reverse=True)
+        total_wall = sum(r.wall_seconds or 0 for r in records)
+        lines = [f"{'#':>6}  {'Status':<6}  {'Wall s':>8}  {'Share':>6}  {'Queue s':>7}  {'Rows':>12}  "
+                 f"{'Processed':>10}  {'Slot s':>8}  {'Output':>10}  Statement"]
+        for r in records[:top or None]:
+            share = (r.wall_seconds or 0) / total_wall * 100 if total_wall else 0.0
+            queue = '-' if r.queue_seconds is None else f"{r.queue_seconds:.1f}"
+            rows = '-' if r.rows is None else str(r.rows)
+            processed = '-' if r.bytes_processed is None else format_bytes(r.bytes_processed)
+            slot = '-' if r.slot_ms is None else f"{r.slot_ms / 1000:.1f}"
+            output = '-' if r.output_bytes is None else format_bytes(r.output_bytes)
+            statement = ' '.join(r.statement.split())[:60]
+            lines.append(f"{str(r.index):>6}  {r.status:<6}  {r.wall_seconds or 0:>8.1f}  {share:>5.1f}%  {queue:>7}  "
+                         f"{rows:>12}  {processed:>10}  {slot:>8}  {output:>10}  {statement}")
+        if top and len(records) > top:
+            lines.append(f"... {len(records) - top} faster statement(s) not shown")
+        failed = sum(1 for r in records if r.status == 'failed')
+        totals = (f"{self.executor} run {self.run_id}: {len(records)} statement(s), {failed} failed, "
+                  f"{time.monotonic() - self.start:.1f}s elapsed, {total_wall:.1f}s statement time")
+        if any(r.bytes_processed is not None for r in records):
+            totals += f", {format_bytes(sum(r.bytes_processed or 0 for r in records))} processed"
+        if any(r.slot_ms is not None for r in records):
+            totals += f", {sum(r.slot_ms or 0 for r in records) / 1000:.1f} slot s"
+        lines.append(totals)
+        return lines
+
+    def log_summary(self, echo=False, top=SUMMARY_TOP):
+        """Log the summary table (and print it with echo)."""
+        for line in self.summary_lines(top):
+            logger.info(line)
+            if echo:
+                print(line)
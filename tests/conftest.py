@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts are not a package: import them, and the benchmark fakes, from the repository root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, 'benchmarks')]
@@ -0,0 +1,87 @@
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+
+import bq_storage
+from fake_backends import FakeBigQueryClient, FakeBigQueryReadClient, arrow_schema, column_types, synthetic_row
+
+ROWS = 25
+WIDTH = 5
+BATCH_ROWS = 4
+
+def finished_query(sql, rows=ROWS):
+    return FakeBigQueryClient(rows, WIDTH).query(sql)
+
+def expected_rows(rows=ROWS):
+    return [synthetic_row(n, column_types(WIDTH)) for n in range(rows)]
+
+def read_all(schema, batches):
+    return [list(row.values()) for row in pyarrow.Table.from_batches(list(batches), schema=schema).to_pylist()]
+
+def test_multi_stream_read_returns_every_row():
+    read_client = FakeBigQueryReadClient(ROWS, WIDTH, BATCH_ROWS)
+    query_job = finished_query('SELECT * FROM ds.t')
+
+    schema, batches = bq_storage.read_query_results(read_client, query_job, max_streams=3)
+    rows = read_all(schema, batches)
+
+    parent, table, max_stream_count, session = read_client.sessions[0]
+    assert parent == 'projects/benchmark'
+    assert table == f"projects/benchmark/datasets/_anonymous/tables/{query_job.destination.table_id}"
+    assert max_stream_count == 3
+    assert len(session.streams) == 3
+    assert schema == arrow_schema(WIDTH)
+    assert sorted(rows, key=lambda row: row[0]) == expected_rows()
+
+def test_order_by_reads_one_stream_in_order():
+    read_client = FakeBigQueryReadClient(ROWS, WIDTH, BATCH_ROWS)
+    query_job = finished_query('SELECT *\nFROM ds.t\norder   by col_0')
+
+    schema, batches = bq_storage.read_query_results(read_client, query_job, max_streams=3)
+
+    assert read_client.sessions[0][2] == 1
+    assert len(read_client.sessions[0][3].streams) == 1
+    assert read_all(schema, batches) == expected_rows()
+
+def test_closing_early_stops_stream_readers():
+    read_client = FakeBigQueryReadClient(ROWS, WIDTH, 1)
+    session = bq_storage.open_read_session(read_client, finished_query('SELECT * FROM ds.t').destination, 4)
+
+    batches = bq_storage.iter_record_batches(read_client, session, queue_size=2)
+    first = next(batches)
+    batches.close()  # Returns only once every stream reader has stopped
+
+    assert first.num_rows == 1
+
+def test_no_read_client_falls_back_to_rest():
+    assert bq_storage.read_query_results(None, finished_query('SELECT * FROM ds.t')) is None
+
+def test_no_destination_falls_back_to_rest():
+    read_client = FakeBigQueryReadClient(ROWS, WIDTH, BATCH_ROWS)
+    query_job = finished_query('SELECT * FROM ds.t')
+    query_job.destination = None
+
+    assert bq_storage.read_query_results(read_client, query_job) is None
+    assert read_client.sessions == []
+
+def test_rejected_session_falls_back_to_rest():
+    class RejectingReadClient(FakeBigQueryReadClient):
+        def create_read_session(self, parent, read_session, max_stream_count=0):
+            raise PermissionError("bigquery.readsessions.create denied")
+
+    read_client = RejectingReadClient(ROWS, WIDTH, BATCH_ROWS)
+
+    assert bq_storage.read_query_results(read_client, finished_query('SELECT * FROM ds.t')) is None
+
+def test_stream_error_is_raised():
+    class FailingReadClient(FakeBigQueryReadClient):
+        def read_rows(self, name, offset=0):
+            if name.endswith('/1'):
+                raise ConnectionError("stream reset")
+            return super().read_rows(name, offset)
+
+    read_client = FailingReadClient(ROWS, WIDTH, BATCH_ROWS)
+    schema, batches = bq_storage.read_query_results(read_client, finished_query('SELECT * FROM ds.t'), 2)
+
+    with pytest.raises(ConnectionError):
+        read_all(schema, batches)
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from dml_scheduler import KeyedExecutor, target_table
+
+def test_target_table_of_dml_and_ddl():
+    assert target_table("-- load\nINSERT INTO `p.ds.T` (a) SELECT 1") == 'p.ds.t'
+    assert target_table("MERGE ds.t USING ds.s ON FALSE WHEN NOT MATCHED THEN INSERT ROW") == 'ds.t'
+    assert target_table("TRUNCATE TABLE ds.t") == 'ds.t'
+    assert target_table("CREATE OR REPLACE TEMP TABLE ds.t AS SELECT 1") == 'ds.t'
+    assert target_table("create table if not exists `p`.`ds`.`t` (a INT64)") == 'p.ds.t'
+    assert target_table("DROP MATERIALIZED VIEW IF EXISTS ds.t") == 'ds.t'
+    assert target_table("ALTER TABLE ds.t ADD COLUMN b STRING") == 'ds.t'
+
+def test_statements_without_a_single_target_have_no_key():
+    assert target_table("ALTER TABLE ds.t RENAME TO u") is None
+    assert target_table("CALL ds.proc()") is None
+    assert target_table("DECLARE x INT64") is None
+    assert target_table("DROP TABLE ds.events_*") is None
+
+def _run(submissions, max_workers=4):
+    # Run (key, name) tasks; return the (event, name) log in the order events happened
+    log, lock = [], threading.Lock()
+
+    def task(name):
+        with lock:
+            log.append(('start', name))
+        time.sleep(0.02)
+        with lock:
+            log.append(('end', name))
+
+    with KeyedExecutor(max_workers) as executor:
+        futures = [executor.submit(key, task, name) for key, name in submissions]
+    for future in futures:
+        future.result()
+    return log
+
+def test_same_key_runs_in_order_and_other_keys_overlap():
+    log = _run([('a', 'a1'), ('b', 'b1'), ('a', 'a2')])
+    assert log.index(('end', 'a1')) < log.index(('start', 'a2'))
+    assert log.index(('start', 'b1')) < log.index(('end', 'a1'))
+
+def test_unkeyed_task_is_a_barrier():
+    log = _run([('a', 'a1'), ('b', 'b1'), (None, 'x'), ('a', 'a2'), ('c', 'c1'), (None, 'y')])
+    position = {event: idx for idx, event in enumerate(log)}
+    for before in ('a1', 'b1'):
+        assert position[('end', before)] < position[('start', 'x')]
+    for after in ('a2', 'c1'):
+        assert position[('end', 'x')] < position[('start', after)]
+        assert position[('end', after)] < position[('start', 'y')]
+
+def test_failed_task_releases_the_barrier():
+    def fail():
+        raise ValueError("boom")
+
+    with KeyedExecutor(2) as executor:
+        failed = executor.submit('a', fail)
+        after = executor.submit(None, lambda: 'done')
+    assert isinstance(failed.exception(), ValueError)
+    assert after.result() == 'done'
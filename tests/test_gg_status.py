@@ -0,0 +1,41 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+GG_STATUS = os.path.join(os.path.dirname(TESTS_DIR), 'gg_status.sh')
+# Captured "info all" / "info extract *" / "info replicat *" ggsci sessions
+FIXTURE_DIR = os.path.join(TESTS_DIR, 'fixtures', 'ggsci')
+
+pytestmark = pytest.mark.skipif(shutil.which('bash') is None or shutil.which('awk') is None,
+                                reason="gg_status.sh needs bash and awk")
+
+def parse(fixture):
+    """Return the TYPE|STATUS|NAME|LAG|CHKPT|POSITION records gg_status.sh --parse prints for a fixture."""
+    process = subprocess.run(['bash', GG_STATUS, '--parse', os.path.join(FIXTURE_DIR, fixture)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return process.stdout.splitlines()
+
+def test_every_process_in_info_all_order():
+    assert parse('dbhost1_session.txt') == [
+        # Integrated extract: the SCN of its log read checkpoint
+        'EXTRACT|RUNNING|EXTORA|00:00:02|00:00:07|48211974',
+        # Pump reading a trail: the RBA in that trail
+        'EXTRACT|RUNNING|PMPORA|00:00:00|00:00:03|48213377',
+        # Lagging replicat
+        'REPLICAT|RUNNING|REPTGT|01:15:42|00:00:05|9917342',
+        'REPLICAT|ABENDED|REPFIN|00:00:00|02:13:08|1503',
+        # Classic extract reporting both Seqno/RBA and SCN: the SCN wins
+        'EXTRACT|STOPPED|EXTHIST|00:00:00|125:03:17|47100012',
+    ]
+
+def test_output_on_the_prompt_line_and_missing_lag():
+    assert parse('dbhost3_inline_prompt.txt') == [
+        'EXTRACT|STARTING|EXTNEW|||0',
+        'REPLICAT|STOPPED|REPOLD|00:00:00|47:55:10|774421',
+    ]
+
+def test_manager_only_host_has_no_records():
+    assert parse('dbhost2_manager_only.txt') == []
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+from result_cache import ResultCache, normalize_sql
+
+TARGET = {'project_id': 'p', 'instance_id': 'i', 'database_id': 'd'}
+
+def test_whitespace_outside_literals_is_collapsed():
+    assert normalize_sql("  SELECT  a,\n\tb  FROM   t ;\n") == "SELECT a, b FROM t"
+    assert normalize_sql("SELECT 'a  b', `my  col`, \"c  d\" FROM t") == "SELECT 'a  b', `my  col`, \"c  d\" FROM t"
+
+def test_escaped_quotes_do_not_end_a_literal():
+    assert normalize_sql("SELECT 'it\\'s  here'  FROM  t") == "SELECT 'it\\'s  here' FROM t"
+    assert normalize_sql("SELECT \"say \\\"hi  there\\\"\"   x") == "SELECT \"say \\\"hi  there\\\"\" x"
+    assert normalize_sql("SELECT 'a\\\\'   FROM  t") == "SELECT 'a\\\\' FROM t"
+    # Different literals must never share a key
+    assert normalize_sql("SELECT 'x\\'  y'") != normalize_sql("SELECT 'x\\' y'")
+
+def test_triple_quoted_literals_are_kept_verbatim():
+    assert normalize_sql("SELECT '''it's   multi\n  line'''   FROM  t") == "SELECT '''it's   multi\n  line''' FROM t"
+    assert normalize_sql('SELECT """a "  b"""  x') == 'SELECT """a "  b""" x'
+
+def test_snapshot_options_are_part_of_the_key():
+    strong = ResultCache.make_key("SELECT 1", TARGET, {}, 'csv')
+    assert strong == ResultCache.make_key("SELECT  1;", TARGET, None, 'csv')
+    stale = ResultCache.make_key("SELECT 1", TARGET, {'exact_staleness': timedelta(seconds=15)}, 'csv')
+    pinned = ResultCache.make_key("SELECT 1", TARGET,
+                                  {'read_timestamp': datetime(2024, 5, 1, tzinfo=timezone.utc)}, 'csv')
+    assert len({strong, stale, pinned}) == 3
+
+def test_stored_result_is_restored(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), default_ttl=60)
+    output = tmp_path / 'out.csv'
+    output.write_text('a\n1\n')
+
+    entry = cache.lookup("SELECT a FROM t", TARGET, fmt='csv')
+    assert not entry.hit
+    cache.store(entry, str(output))
+
+    entry = cache.lookup("SELECT a\n  FROM t;", TARGET, fmt='csv')
+    assert entry.hit
+    assert cache.restore(entry, str(tmp_path / 'restored.csv')) == str(tmp_path / 'restored.csv')
+    assert (tmp_path / 'restored.csv').read_text() == 'a\n1\n'
+    assert not cache.lookup("SELECT a FROM t", TARGET, fmt='parquet').hit
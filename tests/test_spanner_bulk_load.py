@@ -0,0 +1,135 @@
+import csv
+import os
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+spanner = pytest.importorskip('google.cloud.spanner')
+
+import config_loader
+from google.api_core.exceptions import FailedPrecondition
+from google.auth.credentials import AnonymousCredentials
+
+# The load tests run against the Cloud Spanner emulator: 'gcloud emulators spanner start',
+# then export SPANNER_EMULATOR_HOST=localhost:9010
+EMULATOR_HOST = os.environ.get('SPANNER_EMULATOR_HOST')
+PROJECT = 'test-project'
+INSTANCE = 'test-instance'
+TABLE = 'Items'
+DDL = ("CREATE TABLE Items (Id INT64 NOT NULL, Name STRING(MAX), Price NUMERIC, Active BOOL, "
+       "Created TIMESTAMP, Born DATE, Data BYTES(MAX), Tags ARRAY<STRING(MAX)>) PRIMARY KEY (Id)")
+
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    # A fresh module per test, so constant overrides do not leak; its log file goes to tmp_path
+    monkeypatch.chdir(tmp_path)
+    return config_loader.load_script('spanner_bulk_load.py')
+
+@pytest.fixture
+def database(loader):
+    if not EMULATOR_HOST:
+        pytest.skip("SPANNER_EMULATOR_HOST is not set")
+    client = spanner.Client(project=PROJECT, credentials=AnonymousCredentials())
+    instance = client.instance(INSTANCE, configuration_name=f"projects/{PROJECT}/instanceConfigs/emulator-config",
+                               node_count=1)
+    if not instance.exists():
+        instance.create().result(timeout=60)
+    created = instance.database(f"load-{uuid.uuid4().hex[:8]}", ddl_statements=[DDL])
+    created.create().result(timeout=60)
+    yield loader.get_database({'project_id': PROJECT, 'instance_id': INSTANCE,
+                               'database_id': created.database_id, 'credentials_path': None}, 2)
+    created.drop()
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+def name_rows(count, name_length=10):
+    return [[str(n), f"{n:0{name_length}d}"] for n in range(1, count + 1)]
+
+def table_rows(database, columns='Id, Name'):
+    with database.snapshot() as snapshot:
+        return [list(row) for row in snapshot.execute_sql(f"SELECT {columns} FROM {TABLE} ORDER BY Id")]
+
+def record_commits(loader, monkeypatch, fail_batch_starting_at=None):
+    # Wrap commit_batch; returns the list of committed batches (as lists of Ids)
+    commits = []
+    commit_batch = loader.commit_batch
+
+    def recording_commit(database, table, columns, values):
+        ids = [row[0] for row in values]
+        if ids[0] == fail_batch_starting_at:
+            raise FailedPrecondition("injected failure")
+        commit_batch(database, table, columns, values)
+        commits.append(ids)
+    monkeypatch.setattr(loader, 'commit_batch', recording_commit)
+    return commits
+
+def test_csv_values_are_converted_to_column_types(loader, database, tmp_path):
+    source = write_csv(tmp_path / 'items.csv',
+                       ['Id', 'Name', 'Price', 'Active', 'Created', 'Born', 'Data', 'Tags'],
+                       [['1', 'first', '12.50', 'true', '2024-05-01T10:00:00Z', '2024-05-01', 'aGVsbG8=',
+                         '["a", "b"]'],
+                        ['2', '', '', 'no', '2024-05-02 11:30:00', '', '', '']])
+
+    assert loader.run_load(database, TABLE, source) == 0
+
+    assert table_rows(database, 'Id, Name, Price, Active, Created, Born, Data, Tags') == [
+        [1, 'first', Decimal('12.50'), True, datetime(2024, 5, 1, 10, tzinfo=timezone.utc), date(2024, 5, 1),
+         b'hello', ['a', 'b']],
+        [2, '', None, False, datetime(2024, 5, 2, 11, 30, tzinfo=timezone.utc), None, None, None],
+    ]
+    assert not os.path.exists(f"{source}.{TABLE}.checkpoint")
+
+def test_batches_follow_the_mutation_and_byte_limits(loader, database, tmp_path, monkeypatch):
+    # Two columns at 20 mutations and 50% headroom: 5 rows per batch
+    config_loader.set_constants(loader, {'max_mutations_per_commit': '20'})
+    commits = record_commits(loader, monkeypatch)
+    source = write_csv(tmp_path / 'items.csv', ['Id', 'Name'], name_rows(23))
+
+    assert loader.run_load(database, TABLE, source) == 0
+
+    assert sorted(len(ids) for ids in commits) == [3, 5, 5, 5, 5]
+    assert table_rows(database) == [[int(n), name] for n, name in name_rows(23)]
+
+    # About 100 bytes a row: the byte cap ends every batch after 3 rows
+    config_loader.set_constants(loader, {'max_commit_bytes': '250'})
+    commits.clear()
+    source = write_csv(tmp_path / 'long.csv', ['Id', 'Name'], name_rows(10, name_length=100))
+
+    assert loader.run_load(database, TABLE, source) == 0
+    assert sorted(len(ids) for ids in commits) == [1, 3, 3, 3]
+
+def test_resume_skips_committed_batches(loader, database, tmp_path, monkeypatch):
+    config_loader.set_constants(loader, {'max_mutations_per_commit': '20', 'commit_workers': '1'})
+    source = write_csv(tmp_path / 'items.csv', ['Id', 'Name'], name_rows(23))
+
+    record_commits(loader, monkeypatch, fail_batch_starting_at=11)
+    assert loader.run_load(database, TABLE, source) == 1
+    assert os.path.exists(f"{source}.{TABLE}.checkpoint")
+    with pytest.raises(ValueError, match='resume it or delete'):
+        loader.run_load(database, TABLE, source, resume=False)
+
+    commits = record_commits(loader, monkeypatch)
+    assert loader.run_load(database, TABLE, source, resume=True) == 0
+
+    assert 1 not in {ids[0] for ids in commits} and 6 not in {ids[0] for ids in commits}
+    assert 11 in {ids[0] for ids in commits}
+    assert table_rows(database) == [[int(n), name] for n, name in name_rows(23)]
+    assert not os.path.exists(f"{source}.{TABLE}.checkpoint")
+
+def test_checkpoint_is_not_reused_with_other_batch_limits(loader, tmp_path):
+    source = write_csv(tmp_path / 'items.csv', ['Id', 'Name'], name_rows(3))
+    checkpoint = loader.Checkpoint.for_load(source, TABLE, 5, 1000, resume=False)
+    checkpoint.mark_committed(1, 3)
+    checkpoint.save()
+
+    assert loader.Checkpoint.for_load(source, TABLE, 5, 1000, resume=True).rows_committed == 3
+    for batch_rows, max_bytes in ((4, 1000), (5, 2000)):
+        with pytest.raises(ValueError, match='different file, table or batch size'):
+            loader.Checkpoint.for_load(source, TABLE, batch_rows, max_bytes, resume=True)
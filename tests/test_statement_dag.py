@@ -0,0 +1,89 @@
+import statement_dag
+from statement_dag import StatementDag, statement_tables
+
+def test_select_reads_every_listed_and_joined_table():
+    assert statement_tables(
+        "SELECT * FROM `p.raw.orders` o, ds.dim d, UNNEST(o.items) JOIN ds.cust c ON o.id = c.id "
+        "WHERE EXTRACT(YEAR FROM o.ts) = 2024 AND o.a IS DISTINCT FROM c.a -- FROM ds.ignored"
+    ) == ({'orders', 'cust', 'dim'}, set())
+
+def test_dml_and_ddl_targets_are_writes():
+    assert statement_tables("INSERT INTO ds.fact (a) SELECT a FROM ds.stg") == ({'stg'}, {'fact'})
+    assert statement_tables("CREATE OR REPLACE TABLE ds.stg AS SELECT * FROM raw.x") == ({'x'}, {'stg'})
+    assert statement_tables("DROP TABLE IF EXISTS ds.stg") == (set(), {'stg'})
+
+def test_clone_copy_and_like_read_their_source():
+    assert statement_tables("CREATE TABLE ds.x CLONE ds.y") == ({'y'}, {'x'})
+    assert statement_tables("CREATE OR REPLACE TABLE ds.x COPY `p.ds.y`") == ({'y'}, {'x'})
+    assert statement_tables("CREATE TABLE IF NOT EXISTS ds.x LIKE ds.y") == ({'y'}, {'x'})
+    assert statement_tables("CREATE SNAPSHOT TABLE ds.x CLONE ds.y FOR SYSTEM_TIME AS OF CURRENT_TIMESTAMP()") \
+        == ({'y'}, {'x'})
+
+def test_rename_writes_both_names():
+    assert statement_tables("ALTER TABLE ds.x RENAME TO y") == (set(), {'x', 'y'})
+
+def test_table_and_model_arguments_are_reads():
+    assert statement_tables("SELECT * FROM ML.PREDICT(MODEL ds.m, TABLE ds.in)") == ({'m', 'in'}, set())
+    assert statement_tables("SELECT * FROM ML.PREDICT(MODEL `p.ds.m`, (SELECT * FROM ds.feat))") \
+        == ({'m', 'feat'}, set())
+
+def test_unknown_statements_are_barriers():
+    assert statement_tables("DECLARE x INT64") is None
+    assert statement_tables("CREATE TEMP FUNCTION f() AS (1)") is None
+    assert statement_tables("CREATE MODEL ds.m OPTIONS (model_type = 'linear_reg') AS SELECT * FROM ds.t") is None
+
+def test_dependencies_follow_every_hazard():
+    dag = StatementDag([
+        "CREATE TABLE a AS SELECT * FROM src",  # 1
+        "CREATE TABLE b AS SELECT * FROM other",  # 2
+        "INSERT INTO c SELECT * FROM a JOIN b USING (id)",  # 3: RAW on 1 and 2
+        "DELETE FROM src WHERE TRUE",  # 4: WAR on 1
+        "INSERT INTO events_2024 SELECT 1",  # 5
+        "DROP TABLE events_*",  # 6: WAW on 5
+    ])
+    assert [node.deps for node in dag.nodes] == [
+        {}, {}, {1: {'RAW'}, 2: {'RAW'}}, {1: {'WAR'}}, {}, {5: {'WAW'}},
+    ]
+
+def test_ddl_sources_and_renames_order_later_statements():
+    dag = StatementDag([
+        "CREATE TABLE ds.x CLONE ds.y",  # 1
+        "INSERT INTO ds.y SELECT 1",  # 2: WAR on 1
+        "ALTER TABLE ds.x RENAME TO z",  # 3: WAW on 1
+        "SELECT * FROM ML.PREDICT(MODEL ds.m, TABLE ds.z)",  # 4: RAW on 3
+        "TRUNCATE TABLE ds.z",  # 5: WAW on 3, WAR on 4
+    ])
+    assert [node.deps for node in dag.nodes] == [
+        {}, {1: {'WAR'}}, {1: {'WAW'}}, {3: {'RAW'}}, {3: {'WAW'}, 4: {'WAR'}},
+    ]
+
+def test_barrier_runs_alone():
+    dag = StatementDag(["CREATE TABLE a AS SELECT 1", "CREATE TABLE b AS SELECT 2", "DECLARE v INT64",
+                        "SELECT * FROM c"])
+    assert dag.nodes[2].deps == {1: {'barrier'}, 2: {'barrier'}}
+    assert dag.nodes[3].deps == {3: {'barrier'}}
+
+def test_critical_path_follows_the_most_expensive_chain():
+    dag = StatementDag(["CREATE TABLE a AS SELECT 1", "CREATE TABLE b AS SELECT 2",
+                        "CREATE TABLE c AS SELECT * FROM a", "CREATE TABLE d AS SELECT * FROM b"],
+                       costs={1: 1.0, 2: 5.0, 3: 1.0, 4: 1.0})
+    assert dag.critical_path() == [2, 4]
+
+def test_execute_respects_dependencies_and_stops_after_a_failure():
+    dag = StatementDag(["CREATE TABLE a AS SELECT 1", "CREATE TABLE b AS SELECT * FROM a",
+                        "CREATE TABLE c AS SELECT * FROM b", "CREATE TABLE d AS SELECT 2"])
+    finished = []
+
+    def run(index, statement, queued_at):
+        assert all(dep in finished for dep in dag.nodes[index - 1].deps)
+        if index == 2:
+            raise RuntimeError("boom")
+        finished.append(index)
+
+    try:
+        statement_dag.execute(dag, run, 2)
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("the failure was not raised")
+    assert 3 not in finished
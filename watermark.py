@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from result_cache import normalize_sql
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:  # Only needed to track watermarks of Arrow batches
+    pyarrow = None
+
+# Default location of the watermark state shared by all report scripts
+DEFAULT_STATE_FILE = os.path.expanduser('~/.cache/report_watermarks.db')
+# Ways to write the new rows of an incremental statement
+OUTPUT_MODES = ('delta', 'append')
+
+# Incremental statement declaration, e.g. "-- watermark: updated_at TIMESTAMP" (TIMESTAMP if no type is given)
+_WATERMARK_DIRECTIVE = re.compile(r'--\s*watermark\s*[:=]\s*(\w+)(?:[ \t]+(\w+))?', re.IGNORECASE)
+# Placeholder for the stored watermark in statements that filter on it themselves
+_WATERMARK_PLACEHOLDER = re.compile(r'@watermark\b', re.IGNORECASE)
+# Legacy type names accepted in declarations
+_TYPE_ALIASES = {'INTEGER': 'INT64'}
+# Supported watermark types and the value the placeholder gets before the first run
+_INITIAL_POSITIONS = {
+    'TIMESTAMP': '0001-01-01T00:00:00+00:00',
+    'DATETIME': '0001-01-01T00:00:00',
+    'DATE': '0001-01-01',
+    'INT64': str(-2 ** 63),
+    'NUMERIC': '-99999999999999999999999999999.999999999',
+    'STRING': '',
+}
+
+logger = logging.getLogger(__name__)
+
+def parse_directive(sql):
+    """
+    Return the (column, type) watermark declared in a statement, or None for a full export.
+
+    Raises:
+        ValueError: If the declared type cannot be used as a watermark
+    """
+    match = _WATERMARK_DIRECTIVE.search(sql)
+    if not match:
+        return None
+    type_ = (match.group(2) or 'TIMESTAMP').upper()
+    type_ = _TYPE_ALIASES.get(type_, type_)
+    if type_ not in _INITIAL_POSITIONS:
+        raise ValueError(f"Unsupported watermark type '{type_}'. Use one of: {', '.join(_INITIAL_POSITIONS)}")
+    return match.group(1), type_
+
+def literal(type_, position):
+    """Return a stored watermark position as an SQL literal of its type (valid in BigQuery and Spanner)."""
+    if type_ == 'INT64':
+        return str(int(position))
+    quoted = "'" + position.replace('\\', '\\\\').replace("'", "\\'") + "'"
+    return quoted if type_ == 'STRING' else f"{type_} {quoted}"
+
+def incremental_sql(sql, column, type_, position):
+    """
+    Return the statement that only reads rows past position.
+
+    A statement that references @watermark gets the position substituted (a
+    value below every row on the first run). Any other statement is wrapped
+    in a filter on its watermark column, which both databases push down into
+    the query; without a stored position it runs unchanged.
+    """
+    if _WATERMARK_PLACEHOLDER.search(sql):
+        value = literal(type_, position if position is not None else _INITIAL_POSITIONS[type_])
+        return _WATERMARK_PLACEHOLDER.sub(lambda match: value, sql)
+    if position is None:
+        return sql
+    return f"SELECT * FROM (\n{sql.strip().rstrip(';')}\n) WHERE {column} > {literal(type_, position)}"
+
+def to_position(value):
+    """Return a watermark column value in the text form that is stored and rendered as a literal."""
+    if hasattr(value, 'rfc3339'):  # Spanner DatetimeWithNanoseconds keeps its nanoseconds
+        return value.rfc3339()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def output_filename(key, extension):
+    """Return the name of the file the rows of an incremental statement are appended to."""
+    return f"incremental_{key[:16]}{extension}"
+
+def check_output_mode(mode, fmt):
+    """Raise ValueError for an unknown output mode, or append mode with a format that cannot be appended to."""
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown watermark output mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}")
+    if mode == 'append' and fmt == 'parquet':
+        raise ValueError("Parquet files cannot be appended to; use the 'delta' watermark output mode")
+
+class Watermark:
+    """
+    Incremental export state of one statement in one run.
+
+    sql reads only the rows past the stored position. Rows are passed to
+    observe (after bind) or their Arrow batches through observe_batches; the
+    highest watermark seen is stored by commit, which must only be called
+    once the rows are safely written. If a run fails before commit, the next
+    run reads the same rows again.
+    """
+
+    def __init__(self, store, key, column, type_, position, sql, statement):
+        self.store = store
+        self.key = key
+        self.column = column
+        self.type_ = type_
+        self.position = position
+        self.sql = sql
+        self.statement = statement
+        self.highest = None
+        self._index = None
+
+    def bind(self, columns):
+        """Locate the watermark column among the result column names."""
+        names = [name.lower() for name in columns]
+        if self.column.lower() not in names:
+            raise ValueError(f"Watermark column '{self.column}' is not in the result columns ({', '.join(columns)})")
+        self._index = names.index(self.column.lower())
+
+    def observe(self, row):
+        """Track the watermark value of one result row."""
+        value = row[self._index]
+        if value is not None and (self.highest is None or value > self.highest):
+            self.highest = value
+
+    def observe_batches(self, batches):
+        """Pass Arrow record batches through, tracking the highest watermark value."""
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to track watermarks of Arrow results")
+        for batch in batches:
+            index = batch.schema.get_field_index(self.column)
+            if index < 0:
+                raise ValueError(f"Watermark column '{self.column}' is not in the result columns")
+            value = pyarrow.compute.max(batch.column(index)).as_py()
+            if value is not None and (self.highest is None or value > self.highest):
+                self.highest = value
+            yield batch
+
+    def commit(self):
+        """Store the highest value seen as the new position (unchanged if no rows were read)."""
+        if self.highest is None:
+            logger.info(f"Watermark {self.column}: no new rows after {self.position}")
+            return
+        position = to_position(self.highest)
+        self.store.save(self, position)
+        logger.info(f"Watermark {self.column} advanced from {self.position} to {position}")
+        self.position = position
+
+class WatermarkStore:
+    """
+    SQLite table of the last exported watermark of every incremental statement.
+
+    Statements are keyed by normalized SQL, target and watermark column, so
+    reordering a SQL file does not lose their positions. Delete a row (or the
+    file) to export a statement in full again. The database is only created
+    once an incremental statement is run.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_FILE):
+        self.path = path
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the store usable from threads
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " key TEXT PRIMARY KEY, column_name TEXT NOT NULL, type TEXT NOT NULL,"
+            " position TEXT NOT NULL, statement TEXT, updated_at REAL NOT NULL)"
+        )
+        return conn
+
+    @staticmethod
+    def make_key(sql, target, column):
+        """Return the state key of an incremental statement run against a target."""
+        payload = json.dumps({'sql': normalize_sql(sql), 'target': target, 'column': column.lower()},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def prepare(self, sql, target):
+        """
+        Return the Watermark of an incremental statement, or None if it declares no watermark.
+
+        Raises:
+            ValueError: If the declared watermark type is not supported
+        """
+        directive = parse_directive(sql)
+        if directive is None:
+            return None
+        column, type_ = directive
+        key = self.make_key(sql, target, column)
+        with self._connect() as conn:
+            row = conn.execute("SELECT position FROM watermarks WHERE key = ?", (key,)).fetchone()
+        position = row[0] if row else None
+        if position is None:
+            logger.info(f"Watermark {column}: no stored position, exporting all rows")
+        return Watermark(self, key, column, type_, position, incremental_sql(sql, column, type_, position), sql)
+
+    def save(self, mark, position):
+        """Store the position of a Watermark."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO watermarks (key, column_name, type, position, statement, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (mark.key, mark.column, mark.type_, position, mark.statement[:1000], time.time())
+            )